@@ -24,9 +24,19 @@ class Settings(BaseSettings):
     AZURE_OPENAI_KEY: str
     AZURE_OPENAI_MODEL: str = "gpt-4o-mini"
     AZURE_OPENAI_API_VERSION: str = "2024-02-01"
+    AZURE_OPENAI_TPM: int = 30000  # Tokens-per-minute quota of the deployment
+    AZURE_OPENAI_RPM: Optional[int] = None  # Defaults to 6 RPM per 1000 TPM
     
     # Application Settings
     VECTOR_FIELDS: str = "titleVector,descriptionVector,brandVector"
+    # Fields requested with select=: all that AzureSearchService._format_results reads; fields the
+    # index does not define are dropped at startup (_check_select_fields); empty disables projection
+    SEARCH_SELECT_FIELDS: str = "id,title,description,price,original_price,image_url,brand,category,features,sustainability,rating,reviews"
+    # Vector queries use the HNSW index unless exhaustive kNN is requested; k neighbours per vector field
+    VECTOR_SEARCH_EXHAUSTIVE: bool = False
+    VECTOR_SEARCH_K: int = 50
+    # Reranker: "local" (in-process scoring), "llm" (chat model) or "auto" (LLM only for high reasoning effort)
+    RERANKER_MODE: str = "auto"
     ENABLE_CORS: bool = True
     
     # Server settings
@@ -42,4 +52,9 @@ class Settings(BaseSettings):
     def vector_fields_list(self) -> List[str]:
         return self.VECTOR_FIELDS.split(",")
 
+    @property
+    def search_select_fields_list(self) -> Optional[List[str]]:
+        fields = [f.strip() for f in self.SEARCH_SELECT_FIELDS.split(",") if f.strip()]
+        return fields or None
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,2 @@
+# conftest.py
+# Puts backend/ on sys.path for the tests in backend/tests, as when the app runs from here
@@ -1,11 +1,12 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import logging
 import asyncio
 import time
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from config.settings import settings
 from models.search import (
@@ -17,6 +18,7 @@ from services.openai_service import OpenAIReasoningService
 from services.progress_service import ProgressService
 from services.search_service import SearchService
 from utils.error_handling import setup_exception_handlers
+from utils.metrics import stage_timer, render_metrics, METRICS_CONTENT_TYPE
 from data.personas import load_personas
 from services.mock_services import MockAzureSearchService, MockOpenAIReasoningService
 
@@ -78,14 +80,30 @@ async def initiate_search(request: SearchRequest):
         logger.error(f"Error initiating search: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
 @app.get("/api/search/{search_id}", response_model=SearchResponse)
-async def get_search_results(search_id: str):
+async def get_search_results(search_id: str, if_none_match: Optional[str] = Header(default=None)):
     """
     Get the current results and progress for a search.
+    
+    Responses carry an ETag; a request with a matching If-None-Match gets 304 Not
+    Modified. Completed searches are serialized once.
     """
     logger.info(f"Getting search results for ID: {search_id}")
     try:
-        return await search_service.get_search_results(search_id)
+        with stage_timer("response_serialization"):
+            body, etag = await search_service.get_search_payload(search_id)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Error getting search results: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -109,6 +127,13 @@ async def get_personas():
     logger.info("Getting available user personas")
     return list(personas.values())
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose stage latencies, LLM token counts and cost in the Prometheus text format.
+    """
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """
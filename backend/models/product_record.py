@@ -0,0 +1,74 @@
+# app/models/product_record.py
+from typing import Any, Dict, Iterable, List
+
+from models.search import SearchResult
+
+# Attributes of a record: the fields of SearchResult, in the same order
+RECORD_FIELDS = tuple(SearchResult.model_fields)
+_DEFAULTS = {
+    name: (() if field.default_factory is list else None if field.is_required() else field.default)
+    for name, field in SearchResult.model_fields.items()
+}
+
+
+class ProductRecord:
+    """
+    Product as it moves through the search pipeline, in place of SearchResult.
+
+    A plain object with the SearchResult fields in __slots__: no validation and no
+    per-instance dict. It also reads like the dict form of a SearchResult
+    (`record["title"]`, `record.get("brand")`), so the rerankers and the reasoning
+    service take it as is. Results are validated as SearchResult only at the API
+    boundary (`to_search_results`).
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProductRecord":
+        """
+        Create a record from a formatted search hit; keys that are not SearchResult fields are ignored.
+
+        Args:
+            data: Search hit as returned by AzureSearchService
+
+        Returns:
+            Product record
+        """
+        record = cls.__new__(cls)
+        for name in RECORD_FIELDS:
+            setattr(record, name, data.get(name, _DEFAULTS[name]))
+        return record
+
+    def copy(self) -> "ProductRecord":
+        record = ProductRecord.__new__(ProductRecord)
+        for name in RECORD_FIELDS:
+            setattr(record, name, getattr(self, name))
+        return record
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _DEFAULTS else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _DEFAULTS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in RECORD_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ProductRecord(id={self.id!r}, title={self.title!r})"
+
+
+def to_search_results(records: Iterable[ProductRecord]) -> List[SearchResult]:
+    """
+    Validate pipeline records as API results.
+
+    Args:
+        records: Product records
+
+    Returns:
+        SearchResult models in the same order
+    """
+    return [SearchResult(**record.to_dict()) for record in records]
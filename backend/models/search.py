@@ -1,6 +1,6 @@
 # app/models/search.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from enum import Enum
 
 class SearchProgress(str, Enum):
@@ -52,6 +52,8 @@ class SearchSummary(BaseModel):
     newProductCount: int
     removedProductCount: int
     averageRankImprovement: float
+    kendallTau: Optional[float] = None  # agreement of the two orders over the shared products, -1..1
+    overlapAtK: Dict[int, float] = Field(default_factory=dict)  # share of the standard top k in the AI top k
 
 class ProgressUpdate(BaseModel):
     search_id: str
@@ -66,6 +68,10 @@ class SearchRequest(BaseModel):
     rerankerEnabled: bool = True
     reasoningEnabled: bool = True
     model: str = "gpt-4o-mini"
+    exhaustiveKnn: Optional[bool] = None  # None: VECTOR_SEARCH_EXHAUSTIVE
+    knnK: Optional[int] = Field(default=None, ge=1, le=1000)  # None: VECTOR_SEARCH_K
+    rerankerMode: Optional[Literal["auto", "local", "llm"]] = None  # None: RERANKER_MODE
+    reasoningEffort: Literal["low", "medium", "high"] = "medium"  # "auto" reranks with the LLM only for "high"
 
 class SearchResponse(BaseModel):
     search_id: str
@@ -1,14 +1,17 @@
 # services/azure_search.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.models import VectorizableTextQuery, QueryType
 from functools import lru_cache
 import hashlib
 import json
 from config.settings import settings
 from utils.error_handling import SearchError
+from utils.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
@@ -23,10 +26,35 @@ class AzureSearchService:
                 index_name=settings.AZURE_SEARCH_INDEX_NAME,
                 credential=AzureKeyCredential(settings.AZURE_SEARCH_KEY)
             )
+            self.select_fields = settings.search_select_fields_list
             logger.info("Azure Search client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Azure Search client: {str(e)}")
             raise
+        self._check_select_fields()
+    
+    def _check_select_fields(self) -> None:
+        """
+        Drop the configured select fields that the index schema does not define.
+        
+        Reading the index definition needs an admin key; if it cannot be read, the
+        configured fields are kept and `_search` handles a rejected field.
+        """
+        if not self.select_fields:
+            return
+        try:
+            index = SearchIndexClient(
+                endpoint=settings.AZURE_SEARCH_ENDPOINT,
+                credential=AzureKeyCredential(settings.AZURE_SEARCH_KEY)
+            ).get_index(settings.AZURE_SEARCH_INDEX_NAME, retry_total=0)
+        except Exception as e:
+            logger.info(f"Could not read the index schema to check SEARCH_SELECT_FIELDS: {str(e)}")
+            return
+        defined = {field.name for field in index.fields}
+        undefined = [f for f in self.select_fields if f not in defined]
+        if undefined:
+            logger.warning(f"SEARCH_SELECT_FIELDS not defined by index {index.name}, not requesting them: {undefined}")
+            self.select_fields = [f for f in self.select_fields if f in defined] or None
     
     def _handle_api_error(self, e: Exception, operation: str) -> None:
         """
@@ -54,6 +82,34 @@ class AzureSearchService:
         logger.error(error_message)
         raise SearchError(error_message)
     
+    def _search(self, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Run a search with field projection and materialize the hits.
+        
+        Only the fields read by `_format_results` are requested, so the service does not
+        return every retrievable field (vectors included) for each hit. If the index lacks
+        one of the configured fields the service rejects the select with a 400 that names
+        the field; that field is then no longer requested and the search is repeated. Any
+        other error is raised as is.
+        
+        Args:
+            **kwargs: Arguments for SearchClient.search
+            
+        Returns:
+            List of raw search hits
+        """
+        while self.select_fields:
+            try:
+                return list(self.search_client.search(select=self.select_fields, **kwargs))
+            except HttpResponseError as e:
+                # e.g. "Could not find a property named 'category' on type 'search.document'"
+                rejected = [f for f in self.select_fields if f"'{f}'" in str(e)] if e.status_code == 400 else []
+                if not rejected:
+                    raise
+                logger.warning(f"Search rejected select fields {rejected}, no longer requesting them: {str(e)}")
+                self.select_fields = [f for f in self.select_fields if f not in rejected] or None
+        return list(self.search_client.search(**kwargs))
+    
     async def standard_search(self, query: str, top: int = 50) -> List[Dict[str, Any]]:
         """
         Perform standard text search using Azure AI Search.
@@ -66,7 +122,7 @@ class AzureSearchService:
             List of search results
         """
         try:
-            results = self.search_client.search(
+            results = self._search(
                 search_text=query,
                 query_type=QueryType.SIMPLE,
                 top=top
@@ -77,7 +133,8 @@ class AzureSearchService:
         except Exception as e:
             self._handle_api_error(e, f"Standard search for '{query}'")
     
-    async def vector_search(self, query: str, vector_fields: List[str], top: int = 50) -> List[Dict[str, Any]]:
+    async def vector_search(self, query: str, vector_fields: List[str], top: int = 50,
+                            exhaustive: Optional[bool] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Perform vector search using Azure AI Search.
         
@@ -85,6 +142,8 @@ class AzureSearchService:
             query: The search query string
             vector_fields: List of fields to perform vector search on
             top: Maximum number of results to return
+            exhaustive: Brute-force kNN instead of the HNSW index (default: VECTOR_SEARCH_EXHAUSTIVE)
+            k: Nearest neighbours per vector field (default: VECTOR_SEARCH_K)
             
         Returns:
             List of search results
@@ -94,13 +153,13 @@ class AzureSearchService:
             vector_queries = [
                 VectorizableTextQuery(
                     text=query,
-                    k_nearest_neighbors=50,
+                    k_nearest_neighbors=k or settings.VECTOR_SEARCH_K,
                     fields=field,  # Changed from [field] to just field
-                    exhaustive=True
+                    exhaustive=settings.VECTOR_SEARCH_EXHAUSTIVE if exhaustive is None else exhaustive
                 ) for field in vector_fields
             ]
             
-            results = self.search_client.search(
+            results = self._search(
                 search_text=query,
                 vector_queries=vector_queries,
                 query_type=QueryType.SEMANTIC,
@@ -113,7 +172,8 @@ class AzureSearchService:
         except Exception as e:
             self._handle_api_error(e, f"Vector search for '{query}'")
     
-    async def hybrid_search(self, query: str, vector_fields: List[str], top: int = 50) -> List[Dict[str, Any]]:
+    async def hybrid_search(self, query: str, vector_fields: List[str], top: int = 50,
+                            exhaustive: Optional[bool] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Perform hybrid search (text + vector) using Azure AI Search.
         
@@ -121,16 +181,21 @@ class AzureSearchService:
             query: The search query string
             vector_fields: List of fields to perform vector search on
             top: Maximum number of results to return
+            exhaustive: Brute-force kNN instead of the HNSW index (default: VECTOR_SEARCH_EXHAUSTIVE)
+            k: Nearest neighbours per vector field (default: VECTOR_SEARCH_K)
             
         Returns:
             List of search results
         """
         try:
-            text_results = await self.standard_search(query, top)
-            vector_results = await self.vector_search(query, vector_fields, top)
+            with stage_timer("hybrid_text_leg"):
+                text_results = await self.standard_search(query, top)
+            with stage_timer("hybrid_vector_leg"):
+                vector_results = await self.vector_search(query, vector_fields, top, exhaustive=exhaustive, k=k)
             
             # Combine results using reciprocal rank fusion
-            combined_results = self._reciprocal_rank_fusion([text_results, vector_results])
+            with stage_timer("rank_fusion"):
+                combined_results = self._reciprocal_rank_fusion([text_results, vector_results])
             logger.info(f"Hybrid search for '{query}' returned {len(combined_results)} results")
             return combined_results
         except Exception as e:
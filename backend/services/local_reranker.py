@@ -0,0 +1,137 @@
+# services/local_reranker.py
+from typing import Dict, List, Any, Optional, Sequence
+import logging
+
+import numpy as np
+
+from models.user import UserPersona
+
+logger = logging.getLogger(__name__)
+
+# Weight of the search engine's own order; the persona weights are in [0, 1]
+RELEVANCE_WEIGHT = 1.0
+# Weight of the query/product embedding similarity, when one is passed
+SIMILARITY_WEIGHT = 1.0
+# Bayesian average of ratings: a product counts as having this many extra reviews at the mean rating
+RATING_PRIOR_REVIEWS = 20.0
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    """Scale values to [0, 1] over the candidate set (all zeros if they are equal)."""
+    low, high = values.min(), values.max()
+    if high - low < 1e-12:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+class LocalReranker:
+    """
+    Reranks search results in-process from their own fields, as a fast alternative to
+    the LLM reranker (`OpenAIReasoningService.rerank_results`).
+
+    Each candidate gets a score per signal, scaled to [0, 1] over the candidate set:
+        relevance   position in the search engine's order
+        price       lower price (log scale; unknown prices count as the median) and a bonus for the discount
+        quality     rating shrunk towards the mean by its number of reviews, and review volume
+        brand       brand named in the query, or how many candidates share the brand
+        similarity  optional query/product embedding similarity
+    and the persona's priceWeight, qualityWeight and brandWeight weigh the price,
+    quality and brand signals. Scoring is vectorized over all candidates.
+    """
+
+    def __init__(
+        self,
+        relevance_weight: float = RELEVANCE_WEIGHT,
+        similarity_weight: float = SIMILARITY_WEIGHT,
+        rating_prior_reviews: float = RATING_PRIOR_REVIEWS
+    ):
+        self.relevance_weight = relevance_weight
+        self.similarity_weight = similarity_weight
+        self.rating_prior_reviews = rating_prior_reviews
+
+    def score(
+        self,
+        results: List[Dict[str, Any]],
+        query: str,
+        persona: UserPersona,
+        similarities: Optional[Sequence[float]] = None
+    ) -> np.ndarray:
+        """
+        Score search results for a persona.
+
+        Args:
+            results: Search results (product records or SearchResult dicts) in search engine order
+            query: Search query
+            persona: User persona
+            similarities: Optional embedding similarity of each result to the query
+
+        Returns:
+            Array of scores, one per result (higher is better)
+        """
+        n = len(results)
+        if n == 0:
+            return np.zeros(0)
+        prefs = persona.preferences
+
+        price = np.fromiter((r.get("price") or 0.0 for r in results), dtype=float, count=n)
+        discount = np.fromiter((r.get("discount") or 0 for r in results), dtype=float, count=n)
+        rating = np.fromiter((r.get("rating") or 0.0 for r in results), dtype=float, count=n)
+        reviews = np.fromiter((r.get("reviews") or 0 for r in results), dtype=float, count=n)
+        brands = [(r.get("brand") or "").strip().lower() for r in results]
+
+        relevance = 1.0 - np.arange(n, dtype=float) / n
+
+        # A price of 0 (or below) means the price is unknown: such products get the median
+        # price of the others, so a missing price neither wins nor loses on price
+        log_price = np.log1p(np.maximum(price, 0.0))
+        known = price > 0
+        log_price[~known] = np.median(log_price[known]) if known.any() else 0.0
+        price_score = 0.8 * (1.0 - _minmax(log_price)) + 0.2 * np.clip(discount, 0, 100) / 100
+
+        rated = reviews > 0
+        mean_rating = rating[rated].mean() if rated.any() else 0.0
+        bayesian_rating = (rating * reviews + mean_rating * self.rating_prior_reviews) / (reviews + self.rating_prior_reviews)
+        quality_score = 0.8 * bayesian_rating / 5.0 + 0.2 * _minmax(np.log1p(reviews))
+
+        query_lower = query.lower()
+        counts: Dict[str, int] = {}
+        for brand in brands:
+            if brand:
+                counts[brand] = counts.get(brand, 0) + 1
+        in_query = np.fromiter((bool(b) and b in query_lower for b in brands), dtype=float, count=n)
+        prevalence = np.fromiter((counts.get(b, 0) for b in brands), dtype=float, count=n)
+        brand_score = 0.6 * in_query + 0.4 * _minmax(prevalence)
+
+        scores = (
+            self.relevance_weight * relevance
+            + prefs.priceWeight * price_score
+            + prefs.qualityWeight * quality_score
+            + prefs.brandWeight * brand_score
+        )
+        if similarities is not None:
+            scores += self.similarity_weight * _minmax(np.asarray(similarities, dtype=float))
+        return scores
+
+    def rerank_results(
+        self,
+        results: List[Dict[str, Any]],
+        query: str,
+        persona: UserPersona,
+        similarities: Optional[Sequence[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank search results for a persona.
+
+        Args:
+            results: Search results (product records or SearchResult dicts) in search engine order
+            query: Search query
+            persona: User persona
+            similarities: Optional embedding similarity of each result to the query
+
+        Returns:
+            The results ordered by score; ties keep the search engine order
+        """
+        scores = self.score(results, query, persona, similarities)
+        order = np.argsort(-scores, kind="stable")
+        logger.debug(f"Locally reranked {len(results)} products")
+        return [results[i] for i in order]
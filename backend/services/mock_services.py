@@ -1,5 +1,5 @@
 # mock_services.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import asyncio
 import random
 import json
@@ -31,7 +31,8 @@ class MockAzureSearchService:
         
         return results
     
-    async def vector_search(self, query: str, vector_fields: List[str], top: int = 50) -> List[Dict[str, Any]]:
+    async def vector_search(self, query: str, vector_fields: List[str], top: int = 50,
+                            exhaustive: Optional[bool] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
         """Mock vector search implementation."""
         # For mock implementation, just return slightly different results than standard search
         standard_results = await self.standard_search(query, top)
@@ -45,7 +46,8 @@ class MockAzureSearchService:
         
         return standard_results
     
-    async def hybrid_search(self, query: str, vector_fields: List[str], top: int = 50) -> List[Dict[str, Any]]:
+    async def hybrid_search(self, query: str, vector_fields: List[str], top: int = 50,
+                            exhaustive: Optional[bool] = None, k: Optional[int] = None) -> List[Dict[str, Any]]:
         """Mock hybrid search implementation."""
         await asyncio.sleep(0.7)  # Simulate API delay
         
@@ -7,6 +7,8 @@ from openai import AsyncAzureOpenAI, APIError, RateLimitError
 from config.settings import settings
 from models.user import UserPersona
 from models.search import AIReasoning, AIReasoningFactor
+from utils.metrics import record_llm_usage
+from utils.rate_limiter import get_rate_limiter, estimate_tokens, parse_retry_after, INTERACTIVE, BACKGROUND
 import tenacity
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryCallState
 
@@ -34,6 +36,11 @@ class OpenAIReasoningService:
                 api_version=settings.AZURE_OPENAI_API_VERSION
             )
             self.model = settings.AZURE_OPENAI_MODEL
+            self.rate_limiter = get_rate_limiter(
+                self.model,
+                tokens_per_minute=settings.AZURE_OPENAI_TPM,
+                requests_per_minute=settings.AZURE_OPENAI_RPM
+            )
             logger.info("OpenAI client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {str(e)}")
@@ -43,18 +50,22 @@ class OpenAIReasoningService:
         retry=retry_if_exception_type((RateLimitError, APIError)),
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=2, max=60),
-        after=log_retry_attempt,
+        before_sleep=log_retry_attempt,
         reraise=True
     )
-    async def _call_openai_api(self, messages, temperature=0.7, max_tokens=None, response_format=None):
+    async def _call_openai_api(self, messages, temperature=0.7, max_tokens=None, response_format=None, priority=INTERACTIVE):
         """
         Make a request to the OpenAI API with retry logic.
         
+        Every attempt first waits for TPM/RPM capacity on the deployment's rate limiter,
+        and the rate-limit headers of the response are fed back into it.
+        
         Args:
             messages: The messages to send to the API
             temperature: The temperature to use
             max_tokens: The maximum number of tokens to generate
             response_format: The format to return the response in
+            priority: INTERACTIVE for calls on the search path, BACKGROUND for work that can wait
             
         Returns:
             The API response
@@ -71,7 +82,16 @@ class OpenAIReasoningService:
         if response_format is not None:
             kwargs["response_format"] = response_format
             
-        return await self.client.chat.completions.create(**kwargs)
+        await self.rate_limiter.acquire_async(estimate_tokens(messages, max_tokens), priority=priority)
+        try:
+            raw_response = await self.client.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            self.rate_limiter.on_throttled(parse_retry_after(e.response.headers))
+            raise
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        record_llm_usage(self.model, getattr(response, "usage", None))
+        return response
     
     async def rewrite_query(self, query: str, persona: UserPersona) -> str:
         """
@@ -253,7 +273,8 @@ class OpenAIReasoningService:
             response = await self._call_openai_api(
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                priority=BACKGROUND
             )
             
             try:
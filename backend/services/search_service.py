@@ -2,16 +2,28 @@
 from typing import Dict, List, Any, Tuple
 import logging
 import asyncio
+import hashlib
 from models.search import (
-    SearchRequest, SearchResponse, SearchResult, SearchSummary, SearchProgress
+    SearchRequest, SearchResponse, SearchSummary, SearchProgress
 )
 from models.user import UserPersona
+from models.product_record import ProductRecord, to_search_results
 from services.azure_search import AzureSearchService
 from services.openai_service import OpenAIReasoningService
+from services.local_reranker import LocalReranker
 from services.progress_service import ProgressService
+from utils.metrics import stage_timer, counter
+from utils.rank_diff import compute_rank_diff
+from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+RESPONSE_PAYLOADS = counter(
+    "search_response_payloads_total",
+    "Search result payloads, by whether the serialized body of a completed search was reused.",
+    ("result",)
+)
+
 class SearchService:
     """Main service orchestrating the search process."""
     
@@ -27,11 +39,29 @@ class SearchService:
         self.openai = openai_service
         self.progress = progress_service
         self.personas = personas
+        self.local_reranker = LocalReranker()
         # Store completed search results
         self.completed_searches: Dict[str, SearchResponse] = {}
+        # Serialized body and ETag of completed searches, which no longer change
+        self.completed_payloads: Dict[str, Tuple[bytes, str]] = {}
         # Store in-progress search results
         self.in_progress_searches: Dict[str, Dict[str, Any]] = {}
     
+    def _reranker_mode(self, request: SearchRequest) -> str:
+        """
+        Reranker to use for a request: "local" or "llm".
+        
+        Args:
+            request: Search request (rerankerMode, reasoningEffort)
+            
+        Returns:
+            "llm" for rerankerMode "llm", or "auto" with high reasoning effort; "local" otherwise
+        """
+        mode = request.rerankerMode or settings.RERANKER_MODE
+        if mode == "auto":
+            return "llm" if request.reasoningEffort == "high" else "local"
+        return "llm" if mode == "llm" else "local"
+    
     def get_persona(self, persona_id: str) -> UserPersona:
         """
         Get a specific user persona by ID.
@@ -111,8 +141,8 @@ class SearchService:
             return SearchResponse(
                 search_id=search_id,
                 progress=progress_stage,
-                standardResults=in_progress_data.get("standard_results", []),
-                aiResults=in_progress_data.get("ai_results", []),
+                standardResults=to_search_results(in_progress_data.get("standard_results", [])),
+                aiResults=to_search_results(in_progress_data.get("ai_results", [])),
                 summary=in_progress_data.get("summary")
             )
         
@@ -125,6 +155,32 @@ class SearchService:
             summary=None
         )
     
+    async def get_search_payload(self, search_id: str) -> Tuple[bytes, str]:
+        """
+        Get the current search results as a JSON body with its ETag.
+        
+        The body of a completed search is serialized once and reused; in-progress
+        results are serialized on every call.
+        
+        Args:
+            search_id: Search ID
+            
+        Returns:
+            JSON body (SearchResponse) and strong ETag
+        """
+        payload = self.completed_payloads.get(search_id)
+        if payload is not None:
+            RESPONSE_PAYLOADS.inc(result="cached")
+            return payload
+        
+        response = await self.get_search_results(search_id)
+        body = response.model_dump_json().encode("utf-8")
+        payload = (body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+        if search_id in self.completed_searches and response.progress == SearchProgress.COMPLETE:
+            self.completed_payloads[search_id] = payload
+        RESPONSE_PAYLOADS.inc(result="serialized")
+        return payload
+    
     async def _process_search(self, search_id: str, request: SearchRequest) -> None:
         """
         Process the search request in the background.
@@ -145,8 +201,9 @@ class SearchService:
                 percentage=10
             )
             
-            standard_results = await self.azure_search.standard_search(request.query)
-            standard_search_results = [SearchResult(**result) for result in standard_results]
+            with stage_timer("standard_search"):
+                standard_results = await self.azure_search.standard_search(request.query)
+            standard_search_results = [ProductRecord.from_dict(result) for result in standard_results]
             
             # Store standard results in in-progress data
             self.in_progress_searches[search_id]["standard_results"] = standard_search_results
@@ -173,11 +230,12 @@ class SearchService:
                 self.in_progress_searches[search_id]["summary"] = summary
                 
                 # Create final response
+                results = to_search_results(standard_search_results)
                 final_response = SearchResponse(
                     search_id=search_id,
                     progress=SearchProgress.COMPLETE,
-                    standardResults=standard_search_results,
-                    aiResults=standard_search_results,
+                    standardResults=results,
+                    aiResults=results,
                     summary=summary
                 )
                 
@@ -196,7 +254,8 @@ class SearchService:
                 return 
             
             # Phase 1b: Enhanced Search (if enabled)
-            ai_results = standard_search_results.copy()
+            # Separate records: the rank fields of the two lists are set independently
+            ai_results = [result.copy() for result in standard_search_results]
             
             if request.vectorSearchEnabled:
                 # Query rewriting
@@ -207,7 +266,8 @@ class SearchService:
                     percentage=20
                 )
                 
-                rewritten_query = await self.openai.rewrite_query(request.query, persona)
+                with stage_timer("query_rewriting"):
+                    rewritten_query = await self.openai.rewrite_query(request.query, persona)
                 
                 # Vector search
                 self.progress.update_progress(
@@ -217,11 +277,14 @@ class SearchService:
                     percentage=30
                 )
                 
-                enhanced_results = await self.azure_search.hybrid_search(
-                    rewritten_query, 
-                    vector_fields=["titleVector", "descriptionVector", "brandVector"]
-                )
-                ai_results = [SearchResult(**result) for result in enhanced_results]
+                with stage_timer("enhanced_search"):
+                    enhanced_results = await self.azure_search.hybrid_search(
+                        rewritten_query, 
+                        vector_fields=["titleVector", "descriptionVector", "brandVector"],
+                        exhaustive=request.exhaustiveKnn,
+                        k=request.knnK
+                    )
+                ai_results = [ProductRecord.from_dict(result) for result in enhanced_results]
             
             # Phase 1b: Reranking (if enabled)
             if request.rerankerEnabled:
@@ -232,18 +295,28 @@ class SearchService:
                     percentage=50
                 )
                 
-                reranked_results = await self.openai.rerank_results(
-                    [result.dict() for result in ai_results], 
-                    request.query, 
-                    persona
-                )
-                ai_results = [SearchResult(**result) for result in reranked_results]
+                if self._reranker_mode(request) == "llm":
+                    with stage_timer("reranking"):
+                        reranked_results = await self.openai.rerank_results(
+                            list(ai_results), 
+                            request.query, 
+                            persona
+                        )
+                else:
+                    with stage_timer("local_reranking"):
+                        reranked_results = self.local_reranker.rerank_results(
+                            ai_results,
+                            request.query,
+                            persona
+                        )
+                ai_results = reranked_results
             
             # Calculate initial rank changes without reasoning
-            standard_results, ai_results, summary = self._calculate_rank_changes(
-                standard_search_results, 
-                ai_results
-            )
+            with stage_timer("rank_changes"):
+                standard_results, ai_results, summary = self._calculate_rank_changes(
+                    standard_search_results, 
+                    ai_results
+                )
             
             # Update in-progress data with current results
             self.in_progress_searches[search_id]["standard_results"] = standard_results
@@ -259,21 +332,23 @@ class SearchService:
                     percentage=70
                 )
                 
-                processed_results = await self._process_reasoning_in_batches(
-                    ai_results, 
-                    request, 
-                    persona, 
-                    search_id
-                )
+                with stage_timer("reasoning"):
+                    processed_results = await self._process_reasoning_in_batches(
+                        ai_results, 
+                        request, 
+                        persona, 
+                        search_id
+                    )
                 
                 # Update AI results with reasoning
                 self.in_progress_searches[search_id]["ai_results"] = processed_results
             
             # Final rank calculations with all processing complete
-            final_standard_results, final_ai_results, final_summary = self._calculate_rank_changes(
-                standard_search_results, 
-                self.in_progress_searches[search_id]["ai_results"]
-            )
+            with stage_timer("rank_changes"):
+                final_standard_results, final_ai_results, final_summary = self._calculate_rank_changes(
+                    standard_search_results, 
+                    self.in_progress_searches[search_id]["ai_results"]
+                )
             
             # Update in-progress data
             self.in_progress_searches[search_id]["standard_results"] = final_standard_results
@@ -284,8 +359,8 @@ class SearchService:
             final_response = SearchResponse(
                 search_id=search_id,
                 progress=SearchProgress.COMPLETE,
-                standardResults=final_standard_results,
-                aiResults=final_ai_results,
+                standardResults=to_search_results(final_standard_results),
+                aiResults=to_search_results(final_ai_results),
                 summary=final_summary
             )
             
@@ -315,9 +390,9 @@ class SearchService:
     
     def _calculate_rank_changes(
         self, 
-        standard_results: List[SearchResult], 
-        ai_results: List[SearchResult]
-    ) -> Tuple[List[SearchResult], List[SearchResult], SearchSummary]:
+        standard_results: List[ProductRecord], 
+        ai_results: List[ProductRecord]
+    ) -> Tuple[List[ProductRecord], List[ProductRecord], SearchSummary]:
         """
         Calculate rank changes between standard and AI results.
         
@@ -328,55 +403,37 @@ class SearchService:
         Returns:
             Updated standard results, AI results, and summary statistics
         """
-        # Create maps for easier lookups
-        standard_map = {result.id: idx for idx, result in enumerate(standard_results)}
-        ai_map = {result.id: idx for idx, result in enumerate(ai_results)}
+        diff = compute_rank_diff([r.id for r in standard_results], [r.id for r in ai_results])
         
-        # Set ranks and calculate changes for standard results
         for i, result in enumerate(standard_results):
             result.standardRank = i + 1
-            if result.id in ai_map:
-                result.aiRank = ai_map[result.id] + 1
-                result.rankChange = result.standardRank - result.aiRank
-            else:
-                result.aiRank = None
-                result.rankChange = None
+            result.aiRank = diff.standard_ai_ranks[i]
+            result.rankChange = diff.standard_rank_changes[i]
         
-        # Set ranks and calculate changes for AI results
         for i, result in enumerate(ai_results):
             result.aiRank = i + 1
-            if result.id in standard_map:
-                result.standardRank = standard_map[result.id] + 1
-                result.rankChange = result.standardRank - result.aiRank
-            else:
-                result.standardRank = None
-                result.rankChange = None
-        
-        # Calculate summary statistics
-        improved_count = sum(1 for r in ai_results if r.rankChange and r.rankChange > 0)
-        new_count = sum(1 for r in ai_results if r.standardRank is None)
-        removed_count = sum(1 for r in standard_results if r.id not in ai_map)
-        
-        total_improvement = sum(r.rankChange or 0 for r in ai_results if r.rankChange and r.rankChange > 0)
-        avg_improvement = total_improvement / improved_count if improved_count > 0 else 0.0
+            result.standardRank = diff.ai_standard_ranks[i]
+            result.rankChange = diff.ai_rank_changes[i]
         
         summary = SearchSummary(
             totalProductCount=len(ai_results),
-            improvedRankCount=improved_count,
-            newProductCount=new_count,
-            removedProductCount=removed_count,
-            averageRankImprovement=avg_improvement
+            improvedRankCount=diff.improved_count,
+            newProductCount=diff.new_count,
+            removedProductCount=diff.removed_count,
+            averageRankImprovement=diff.average_improvement,
+            kendallTau=diff.kendall_tau,
+            overlapAtK=diff.overlap_at_k
         )
         
         return standard_results, ai_results, summary
     
     async def _process_reasoning_in_batches(
         self, 
-        ai_results: List[SearchResult], 
+        ai_results: List[ProductRecord], 
         request: SearchRequest, 
         persona: UserPersona, 
         search_id: str
-    ) -> List[SearchResult]:
+    ) -> List[ProductRecord]:
         """
         Process reasoning tasks in parallel batches for better performance.
         
@@ -402,8 +459,8 @@ class SearchService:
             
             # Create concurrent tasks for this batch
             for result in batch:
-                task = self.openai.generate_reasoning(
-                    result.dict(), 
+                task = self._timed_reasoning(
+                    result, 
                     request.query, 
                     persona
                 )
@@ -417,7 +474,7 @@ class SearchService:
                 if isinstance(reasoning, Exception):
                     logger.error(f"Error generating reasoning for product {result_id}: {str(reasoning)}")
                     # Use default reasoning on error
-                    reasoning = self.openai._default_reasoning(result_map[result_id].dict(), request.query)
+                    reasoning = self.openai._default_reasoning(result_map[result_id], request.query)
                 
                 # Update product with reasoning
                 if result_id in result_map:
@@ -439,4 +496,24 @@ class SearchService:
                 self.in_progress_searches[search_id]["ai_results"] = list(result_map.values())
         
         # Return the updated results
-        return list(result_map.values())
\ No newline at end of file
+        return list(result_map.values())
+    
+    async def _timed_reasoning(
+        self, 
+        product: Dict[str, Any], 
+        query: str, 
+        persona: UserPersona
+    ):
+        """
+        Generate reasoning for a single product and record its latency.
+        
+        Args:
+            product: Product information
+            query: Search query
+            persona: User persona
+            
+        Returns:
+            AI reasoning for the product
+        """
+        with stage_timer("product_reasoning"):
+            return await self.openai.generate_reasoning(product, query, persona)
@@ -0,0 +1,52 @@
+# tests/test_local_reranker.py
+import numpy as np
+import pytest
+
+from data.personas import load_personas
+from services.local_reranker import LocalReranker
+
+
+def product(pid, title, brand, price, rating=0.0, reviews=0, discount=0):
+    return {"id": pid, "title": title, "brand": brand, "price": price,
+            "rating": rating, "reviews": reviews, "discount": discount}
+
+
+@pytest.fixture
+def headphones():
+    # Search engine order; the listing without price or reviews is near the top
+    return [
+        product("generic", "Bluetooth headphones", "Acme", 59.0, rating=3.9, reviews=120),
+        product("free", "Wireless headphones", "", 0.0),
+        product("sony", "Sony WH-1000XM5 headphones", "Sony", 349.0, rating=5.0, reviews=1000),
+        product("bose", "Bose QuietComfort Ultra headphones", "Bose", 449.0, rating=4.6, reviews=800),
+        product("sony-budget", "Sony WH-CH520 headphones", "Sony", 49.0, rating=4.3, reviews=400),
+    ]
+
+
+@pytest.mark.parametrize("persona_id", list(load_personas()))
+def test_unpriced_unrated_product_does_not_outrank_top_rated_sony(headphones, persona_id):
+    persona = load_personas()[persona_id]
+
+    ranked = [r["id"] for r in LocalReranker().rerank_results(headphones, "sony headphones", persona)]
+
+    assert ranked.index("sony") < ranked.index("free")
+
+
+def test_unknown_price_scores_like_the_median_price(headphones):
+    persona = load_personas()["smart"]
+    reranker = LocalReranker()
+    unknown = reranker.score(headphones, "headphones", persona)
+    known = [r["price"] for r in headphones if r["price"] > 0]
+    headphones[1]["price"] = float(np.expm1(np.median(np.log1p(known))))
+    median = reranker.score(headphones, "headphones", persona)
+
+    assert unknown == pytest.approx(median)
+
+
+def test_ties_keep_search_engine_order():
+    persona = load_personas()["smart"]
+    results = [product(f"p{i}", "Headphones", "Acme", 50.0, rating=4.0, reviews=10) for i in range(4)]
+
+    ranked = LocalReranker(relevance_weight=0.0).rerank_results(results, "headphones", persona)
+
+    assert [r["id"] for r in ranked] == ["p0", "p1", "p2", "p3"]
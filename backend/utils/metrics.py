@@ -0,0 +1,25 @@
+# utils/metrics.py
+"""
+Process-wide Prometheus-style metrics for the search pipeline, served by `main.py` at
+`/metrics`.
+
+The registry, metric types, `stage_timer` and `record_llm_usage` are the root app's
+utils/metrics.py, loaded by path (see utils/shared.py), so the services and the shared
+rate limiter record into one registry.
+"""
+from utils.shared import load_root_module
+
+load_root_module("metrics")
+
+from shared_metrics import (  # noqa: E402,F401
+    METRICS_CONTENT_TYPE,
+    DEFAULT_BUCKETS,
+    Counter,
+    Histogram,
+    REGISTRY,
+    counter,
+    histogram,
+    render_metrics,
+    stage_timer,
+    record_llm_usage,
+)
@@ -0,0 +1,10 @@
+# utils/model_pricing.py
+"""
+Model prices and call cost: the root app's utils/model_pricing.py, loaded by path (see
+utils/shared.py), so both apps price calls from one table.
+"""
+from utils.shared import load_root_module
+
+load_root_module("model_pricing")
+
+from shared_model_pricing import model_pricing, FALLBACK_PRICING, calculate_cost  # noqa: E402,F401
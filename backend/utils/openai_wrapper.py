@@ -8,6 +8,8 @@ import logging
 import asyncio
 from functools import wraps
 
+from utils.model_pricing import model_pricing, calculate_cost
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('openai_wrapper')
@@ -20,6 +22,8 @@ def async_wrap(func):
         return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
     return run
 
+
+
 class OpenAIWrapper:
     """
     Wrapper for OpenAI API that includes cost calculation.
@@ -59,66 +63,13 @@ class OpenAIWrapper:
     
     def _load_pricing_config(self) -> Dict:
         """Load pricing configuration."""
-        # Default pricing for common models (per million tokens)
-        return {
-            "gpt-4.5": {"input": 75.0, "output": 150.0},
-            "gpt-4o": {"input": 2.5, "output": 10.0},
-            "gpt-4o-mini": {"input": 0.15, "output": 0.6},
-            "o1": {"input": 15.0, "output": 60.0},
-            "o3-mini": {"input": 1.1, "output": 4.4},
-            "gpt-3.5-turbo": {"input": 0.5, "output": 1.5},
-            "gpt-4": {"input": 30.0, "output": 60.0}
-        }
+        return dict(model_pricing)
     
     def _calculate_cost(self, model: str, usage: Dict[str, int], is_cached: bool = False) -> Dict[str, Any]:
         """
         Calculate cost based on usage information from the API response.
         """
-        # Find the right pricing model
-        pricing_model = model
-        for prefix in self.pricing:
-            if model.startswith(prefix):
-                pricing_model = prefix
-                break
-        
-        pricing = self.pricing.get(pricing_model)
-        if not pricing:
-            pricing = {"input": 1.0, "output": 2.0}  # Default fallback
-            print(f"Warning: No pricing found for model {model}. Using default pricing.")
-        
-        # Extract token counts
-        input_tokens = usage.get("prompt_tokens", 0)
-        output_tokens = usage.get("completion_tokens", 0)
-        total_tokens = usage.get("total_tokens", 0) or (input_tokens + output_tokens)
-        
-        # Calculate costs (per million tokens)
-        input_cost = (input_tokens / 1_000_000) * pricing["input"]
-        output_cost = (output_tokens / 1_000_000) * pricing["output"]
-        total_cost = input_cost + output_cost
-        
-        # Debug print - this will show in your console regardless of logging settings
-        # print(f"\n===== COST CALCULATION =====")
-        # print(f"Model: {model}")
-        # print(f"Input tokens: {input_tokens}")
-        # print(f"Output tokens: {output_tokens}")
-        # print(f"Total tokens: {total_tokens}")
-        # print(f"Cost: ${total_cost:.6f} USD")
-        # print("============================\n")
-        
-        return {
-            "model": model,
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "total_tokens": total_tokens,
-            "input_cost": input_cost,
-            "output_cost": output_cost,
-            "total_cost": total_cost,
-            "currency": "USD",
-            "pricing_details": {
-                "input_price_per_million": pricing["input"],
-                "output_price_per_million": pricing["output"]
-            }
-        }
+        return calculate_cost(model, usage, pricing_config=self.pricing)
     
     async def chat_completion(self, 
                       model: str, 
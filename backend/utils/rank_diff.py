@@ -0,0 +1,121 @@
+# utils/rank_diff.py
+"""
+Rank differences between the standard and the AI result lists.
+
+`compute_rank_diff` maps each AI result to its standard position with one dict lookup
+per id and derives everything else with NumPy on the resulting index arrays: the ranks
+of both lists, the rank changes, the SearchSummary counts, and agreement metrics
+between the two orders (Kendall tau over the shared products, overlap of the top k).
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# Cut-offs of the top-k overlap reported in SearchSummary.overlapAtK
+OVERLAP_K = (5, 10)
+
+
+class RankDiff:
+    """
+    Ranks (1-based, None when absent from the other list) and summary statistics of a
+    standard and an AI ordering of the same search.
+    """
+
+    def __init__(
+        self,
+        standard_ai_ranks: List[Optional[int]],
+        standard_rank_changes: List[Optional[int]],
+        ai_standard_ranks: List[Optional[int]],
+        ai_rank_changes: List[Optional[int]],
+        improved_count: int,
+        new_count: int,
+        removed_count: int,
+        average_improvement: float,
+        kendall_tau: Optional[float],
+        overlap_at_k: Dict[int, float]
+    ):
+        self.standard_ai_ranks = standard_ai_ranks
+        self.standard_rank_changes = standard_rank_changes
+        self.ai_standard_ranks = ai_standard_ranks
+        self.ai_rank_changes = ai_rank_changes
+        self.improved_count = improved_count
+        self.new_count = new_count
+        self.removed_count = removed_count
+        self.average_improvement = average_improvement
+        self.kendall_tau = kendall_tau
+        self.overlap_at_k = overlap_at_k
+
+
+def _optional_ranks(positions: np.ndarray) -> List[Optional[int]]:
+    """0-based positions (-1 when absent) as 1-based ranks with None for absent."""
+    return [p + 1 if p >= 0 else None for p in positions.tolist()]
+
+
+def kendall_tau(positions: np.ndarray) -> Optional[float]:
+    """
+    Kendall tau-a between an order and a permutation of it.
+
+    Args:
+        positions: Position in the other order of each item, in this order
+
+    Returns:
+        Tau in [-1, 1] (1: same order), or None for fewer than two items
+    """
+    n = len(positions)
+    if n < 2:
+        return None
+    signs = np.sign(positions[None, :] - positions[:, None])
+    return float(np.triu(signs, 1).sum()) / (n * (n - 1) / 2)
+
+
+def compute_rank_diff(
+    standard_ids: Sequence[str],
+    ai_ids: Sequence[str],
+    overlap_k: Sequence[int] = OVERLAP_K
+) -> RankDiff:
+    """
+    Compare the standard and the AI ordering of a search.
+
+    Args:
+        standard_ids: Product ids of the standard results, in order
+        ai_ids: Product ids of the AI results, in order
+        overlap_k: Cut-offs for the top-k overlap
+
+    Returns:
+        RankDiff with the ranks and rank changes of both lists and the summary statistics
+    """
+    standard_index = {pid: i for i, pid in enumerate(standard_ids)}
+    n_standard, n_ai = len(standard_ids), len(ai_ids)
+
+    # Standard position of each AI result (-1: new) and AI position of each standard result (-1: removed)
+    ai_standard = np.fromiter((standard_index.get(pid, -1) for pid in ai_ids), dtype=np.int64, count=n_ai)
+    shared = ai_standard >= 0
+    standard_ai = np.full(n_standard, -1, dtype=np.int64)
+    standard_ai[ai_standard[shared]] = np.nonzero(shared)[0]
+
+    changes = np.where(shared, ai_standard - np.arange(n_ai), 0)
+    kept = standard_ai >= 0
+    standard_changes = np.where(kept, np.arange(n_standard) - standard_ai, 0)
+    improved = changes > 0
+    improved_count = int(improved.sum())
+
+    overlap_at_k = {}
+    for k in overlap_k:
+        depth = min(k, n_standard, n_ai)
+        if depth > 0:
+            top = ai_standard[:k]
+            overlap_at_k[k] = float(((top >= 0) & (top < k)).sum()) / depth
+
+    return RankDiff(
+        standard_ai_ranks=_optional_ranks(standard_ai),
+        standard_rank_changes=[c if k else None for c, k in zip(standard_changes.tolist(), kept.tolist())],
+        ai_standard_ranks=_optional_ranks(ai_standard),
+        ai_rank_changes=[c if s else None for c, s in zip(changes.tolist(), shared.tolist())],
+        improved_count=improved_count,
+        new_count=int(n_ai - shared.sum()),
+        removed_count=int(n_standard - kept.sum()),
+        average_improvement=float(changes[improved].mean()) if improved_count else 0.0,
+        kendall_tau=kendall_tau(ai_standard[shared]),
+        overlap_at_k=overlap_at_k
+    )
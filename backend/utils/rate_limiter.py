@@ -0,0 +1,22 @@
+# utils/rate_limiter.py
+"""
+Client-side TPM/RPM rate limiting for the Azure OpenAI deployment.
+
+The limiter is the root app's utils/rate_limiter.py, loaded by path (see utils/shared.py).
+Quotas come from `AZURE_OPENAI_TPM` / `AZURE_OPENAI_RPM` in the settings and are passed
+to `get_rate_limiter` explicitly; the RPM quota defaults to 6 RPM per 1000 TPM.
+"""
+from utils.shared import load_root_module
+
+load_root_module("rate_limiter")
+
+from shared_rate_limiter import (  # noqa: E402
+    INTERACTIVE,
+    BACKGROUND,
+    PRIORITY_NAMES,
+    RateLimitTimeout,
+    DeploymentRateLimiter,
+    estimate_tokens,
+    parse_retry_after,
+    get_rate_limiter,
+)
@@ -0,0 +1,41 @@
+# utils/shared.py
+"""
+Modules shared with the root app (server.py).
+
+The root app keeps its helpers in a top-level `utils` package, as the backend does, so
+they cannot be imported by name from here. `load_root_module("metrics")` loads the
+root utils/metrics.py by path as the module `shared_metrics`, once per process. The
+`utils.<name>` imports inside a shared module resolve to the backend's `utils`, so
+every shared root module has a backend module of the same name that loads it
+(utils/metrics.py, utils/model_pricing.py, utils/rate_limiter.py).
+"""
+import os
+import sys
+import importlib.util
+from types import ModuleType
+
+ROOT_UTILS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "utils"))
+
+
+def load_root_module(name: str) -> ModuleType:
+    """
+    Load a module of the root app's utils package.
+
+    Args:
+        name: Module name within the root utils package, e.g. "metrics"
+
+    Returns:
+        The module, registered in sys.modules as shared_<name>
+    """
+    module_name = f"shared_{name}"
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT_UTILS_DIR, f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+    return module
@@ -0,0 +1,135 @@
+# benchmarks/filter_benchmark.py
+"""
+Compares the phase1 filter built by search/filter_builder.py with the previous
+string-concatenated filter (four case variants of every term, one clause each).
+
+Offline it reports the size of both expressions: characters, search.ismatch clauses
+and phrase queries the service has to evaluate. With --live it also runs both filters
+against the configured Azure Search index and reports latency and result overlap.
+
+    python benchmarks/filter_benchmark.py [--live] [--runs 10]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search.filter_builder import build_filter
+
+
+SAMPLE_EXPANSIONS = [
+    {
+        "query": "cordless drill for home projects",
+        "filters": {"title": ["cordless drill", "Cordless Drill", "drill driver", "hammer drill", "impact driver"],
+                    "brand": ["DeWalt", "dewalt", "Makita", "Bosch", "Ryobi"],
+                    "description": ["cordless", "lithium-ion", "brushless motor", "drill", "18V"],
+                    "categories": ["Power Tools", "Drills"]},
+        "price": {"ge": None, "lte": 200},
+    },
+    {
+        "query": "kids' running shoes",
+        "filters": {"title": ["running shoes", "sneakers", "kids' shoes", "trainers"],
+                    "brand": ["Nike", "Adidas", "ASICS"],
+                    "description": ["running shoes", "sneakers", "kids' shoes", "trainers"],
+                    "categories": ["Shoes", "Kids"]},
+        "price": {"ge": 20, "lte": 90},
+    },
+    {
+        "query": "noise cancelling headphones",
+        "filters": {"title": ["noise cancelling headphones", "wireless headphones", "over-ear headphones", "ANC",
+                              "bluetooth headphones", "earbuds", "headset", "noise canceling", "studio headphones", "headphones"],
+                    "brand": ["Sony", "Bose", "Sennheiser", "Apple", "Beats"],
+                    "description": ["active noise cancellation", "bluetooth", "wireless", "long battery life", "over-ear",
+                                    "noise cancelling", "ANC", "comfortable", "foldable", "travel"],
+                    "categories": ["Electronics", "Headphones"]},
+        "price": {"ge": 100, "lte": 400},
+    },
+]
+
+
+def legacy_filter(filter_obj, price_obj):
+    """
+    The filter construction phase1_discovery used before search/filter_builder.py.
+    """
+    filter_expr = "("
+    for field in ["title", "brand", "description", "categories"]:
+        if field in filter_obj and filter_obj[field]:
+            for term in filter_obj[field]:
+                if field != "categories":
+                    for variant in (term.strip().lower(), term.strip().upper(), term.strip().capitalize(), term.strip().title()):
+                        filter_expr += f"search.ismatch('\"{variant}\"~10', '{field}', 'full', 'any') or "
+                else:
+                    filter_expr += f"search.ismatch('{term}', '{field}', 'full', 'any') or "
+    if filter_expr.endswith(" or "):
+        filter_expr = filter_expr[:-4]
+    filter_expr += ")"
+    if filter_expr == "()":
+        filter_expr = ""
+
+    price_str = ""
+    if price_obj.get("ge") is not None:
+        price_str += f" and price ge {price_obj['ge']}"
+    if price_obj.get("lte") is not None:
+        price_str += f" and price le {price_obj['lte']}"
+    if price_str and filter_expr:
+        filter_expr += price_str
+    elif price_str:
+        filter_expr = price_str[5:]
+    return filter_expr
+
+
+def describe(expr):
+    return {
+        "chars": len(expr),
+        "ismatch": expr.count("search.ismatch("),
+        "phrases": len(re.findall(r'~10', expr)),
+    }
+
+
+def timed_search(search_client, query, filter_expr, runs):
+    latencies, ids = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            ids = [doc["id"] for doc in search_client.search(search_text=query, filter=filter_expr, top=50, select=["id"])]
+        except Exception as e:
+            return None, str(e)[:80]
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="also time both filters against Azure Search")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    search_client = None
+    if args.live:
+        from search.config import search_client
+
+    for sample in SAMPLE_EXPANSIONS:
+        old = legacy_filter(sample["filters"], sample["price"])
+        new = build_filter(sample["filters"], sample["price"])
+        d_old, d_new = describe(old), describe(new)
+        print(f"\n{sample['query']}")
+        print(f"  {'':10} {'chars':>8} {'ismatch':>8} {'phrases':>8}")
+        print(f"  {'legacy':10} {d_old['chars']:>8} {d_old['ismatch']:>8} {d_old['phrases']:>8}")
+        print(f"  {'builder':10} {d_new['chars']:>8} {d_new['ismatch']:>8} {d_new['phrases']:>8}")
+
+        if search_client is not None:
+            old_ms, old_ids = timed_search(search_client, sample["query"], old, args.runs)
+            new_ms, new_ids = timed_search(search_client, sample["query"], new, args.runs)
+            if old_ms is None or new_ms is None:
+                print(f"  live: legacy={old_ms if old_ms is not None else old_ids} builder={new_ms if new_ms is not None else new_ids}")
+            else:
+                overlap = len(set(old_ids) & set(new_ids)) / max(len(old_ids), 1)
+                print(f"  live p50: legacy {old_ms:.1f} ms, builder {new_ms:.1f} ms, top-50 overlap {overlap:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/knn_recall_benchmark.py
+"""
+Recall vs. latency of approximate (HNSW) and exhaustive kNN on a local index stand-in
+(search/local_hnsw.py), to choose VECTOR_SEARCH_EXHAUSTIVE, VECTOR_SEARCH_K and the
+HNSW_M / HNSW_EF_CONSTRUCTION / HNSW_EF_SEARCH parameters.
+
+Vectors are read from an embedding cache file (utils/embedding_service.py, e.g. after
+python -m search.reembed_catalog) or generated as clustered synthetic data. Queries
+are held-out vectors with a little noise; recall@k is measured against the exact
+neighbours. "dists" is the number of vectors compared per query, the cost that
+scales to the service; wall times of the pure-Python graph walk are only
+comparable between HNSW configurations, not with the NumPy exhaustive scan.
+
+    python benchmarks/knn_recall_benchmark.py [--vectors embedding_cache/text-embedding-3-small-1536.f32]
+        [--n 5000] [--dims 256] [--queries 200] [--k 50] [--m 4 8 16] [--ef-construction 200] [--ef-search 50 100 500]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search.local_hnsw import HnswIndex
+
+
+def synthetic_vectors(n, dims, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + 0.6 * rng.normal(size=(n, dims))).astype(np.float32)
+
+
+def cached_vectors(path, dims, n):
+    vectors = np.fromfile(path, dtype=np.float32)
+    return vectors[:(len(vectors) // dims) * dims].reshape(-1, dims)[:n]
+
+
+def measure(index, queries, truth, k, **kwargs):
+    latencies, recalls = [], []
+    evaluations = index.distance_evaluations
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids, _ = index.search(query, k=k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(ids.tolist()) & expected) / len(expected))
+    evaluations = (index.distance_evaluations - evaluations) / len(queries)
+    return statistics.mean(recalls), evaluations, statistics.median(latencies), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="float32 vector file from the embedding cache")
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--dims", type=int, default=256, help="dimensions (1536 for cached text-embedding-3-small vectors)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--m", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[50, 100, 500])
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = cached_vectors(args.vectors, args.dims, args.n + args.queries)
+    else:
+        vectors = synthetic_vectors(args.n + args.queries, args.dims)
+    rng = np.random.default_rng(1)
+    corpus = vectors[:-args.queries]
+    queries = vectors[-args.queries:] + 0.1 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    print(f"{len(corpus)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}\n")
+
+    print(f"{'config':32} {'recall@k':>9} {'dists':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    truth = None
+    for m in args.m:
+        start = time.perf_counter()
+        index = HnswIndex(dimensions=vectors.shape[1], m=m, ef_construction=args.ef_construction)
+        index.add(corpus)
+        build_seconds = time.perf_counter() - start
+
+        if truth is None:
+            truth = [set(index.search(q, k=args.k, exhaustive=True)[0].tolist()) for q in queries]
+            recall, dists, p50, p95 = measure(index, queries, truth, args.k, exhaustive=True)
+            print(f"{'exhaustive':32} {recall:>9.3f} {dists:>8.0f} {p50:>8.2f} {p95:>8.2f} {'-':>8}")
+
+        for ef in args.ef_search:
+            recall, dists, p50, p95 = measure(index, queries, truth, args.k, ef_search=ef)
+            print(f"{f'hnsw m={m} efC={args.ef_construction} efS={ef}':32} {recall:>9.3f} {dists:>8.0f} {p50:>8.2f} {p95:>8.2f} {build_seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/local_search_benchmark.py
+"""
+Throughput of the local search engine (search/local_search.py) on phase1-shaped queries:
+hybrid text + three vector legs, with and without the expansion filter built by
+search/filter_builder.py.
+
+Uses a catalog snapshot (python -m search.local_search snapshot catalog.jsonl) when
+given, otherwise a synthetic catalog with random vectors.
+
+    python benchmarks/local_search_benchmark.py [--catalog catalog.jsonl] [--docs 10000] [--dims 1536]
+        [--queries 2000] [--threads 1 4 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from azure.search.documents.models import VectorizedQuery
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search.local_search import LocalSearchClient, VECTOR_FIELDS
+from search.filter_builder import build_filter
+from benchmarks.filter_benchmark import SAMPLE_EXPANSIONS
+
+
+WORDS = ("cordless drill driver hammer impact brushless lithium running shoes sneakers kids trainers wireless "
+         "headphones noise cancelling bluetooth over-ear travel foldable kitchen knife steel chef outdoor tent "
+         "waterproof camping backpack lightweight jacket rain cotton shirt organic coffee grinder espresso").split()
+BRANDS = ["DeWalt", "Makita", "Bosch", "Ryobi", "Nike", "Adidas", "ASICS", "Sony", "Bose", "Sennheiser"]
+CATEGORIES = ["Power Tools", "Drills", "Shoes", "Kids", "Electronics", "Headphones", "Kitchen", "Outdoor"]
+
+
+def synthetic_catalog(num_docs, dims, seed=0):
+    rng = random.Random(seed)
+    documents = [{
+        "id": str(i),
+        "title": " ".join(rng.choices(WORDS, k=5)),
+        "brand": rng.choice(BRANDS),
+        "description": " ".join(rng.choices(WORDS, k=60)),
+        "categories": rng.sample(CATEGORIES, 2),
+        "image_url": f"https://example.com/{i}.jpg",
+        "price": round(rng.uniform(5, 500), 2),
+        "final_price": round(rng.uniform(5, 500), 2),
+    } for i in range(num_docs)]
+    vectors = {field: np.random.default_rng(seed + n).normal(size=(num_docs, dims)).astype(np.float32)
+               for n, field in enumerate(VECTOR_FIELDS)}
+    return LocalSearchClient(documents, vectors)
+
+
+def make_queries(client, count, seed=1):
+    rng = np.random.default_rng(seed)
+    dims = next(iter(client.vectors.values())).shape[1] if client.vectors else 0
+    queries = []
+    for i in range(count):
+        sample = SAMPLE_EXPANSIONS[i % len(SAMPLE_EXPANSIONS)]
+        vector = rng.normal(size=dims).astype(np.float32).tolist() if dims else None
+        vector_queries = [VectorizedQuery(vector=vector, k_nearest_neighbors=50, fields=f) for f in client.vectors] if dims else None
+        queries.append({
+            "search_text": sample["query"],
+            "vector_queries": vector_queries,
+            "filter": build_filter(sample["filters"], sample["price"]) if i % 2 else None,
+            "top": 50,
+            "select": ["id", "title", "brand", "description", "image_url", "final_price"],
+        })
+    return queries
+
+
+def run(client, queries, threads):
+    def one(query):
+        start = time.perf_counter()
+        results = list(client.search(**query))
+        return time.perf_counter() - start, len(results)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        timings = list(executor.map(one, queries))
+    elapsed = time.perf_counter() - start
+    latencies = [t * 1000 for t, _ in timings]
+    return len(queries) / elapsed, statistics.median(latencies), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", help="JSON-lines catalog snapshot")
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    client = LocalSearchClient.from_catalog(args.catalog) if args.catalog else synthetic_catalog(args.docs, args.dims)
+    print(f"{client.get_document_count()} documents loaded in {time.perf_counter() - start:.1f}s")
+
+    queries = make_queries(client, args.queries)
+    run(client, queries[:50], 1)  # warm-up
+    print(f"{'threads':>8} {'qps':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for threads in args.threads:
+        qps, p50, p95 = run(client, queries, threads)
+        print(f"{threads:>8} {qps:>10.0f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/phase1_overlap.py
+"""
+Offline comparison of the two phase1 retrieval modes against the configured index:
+    interleave  unfiltered + filtered query, interleaved in Python (current default)
+    boosted     one query with the filter terms as boosted clauses (PHASE1_SEARCH_MODE=boosted);
+                full-Lucene, so without the semantic reranking the interleave legs get
+
+For every expansion it reports overlap@k of the boosted ranking with the interleaved one,
+plus latency and the number of search requests of each mode. Expansions are read from a
+JSON-lines file with {"query", "expanded_terms", "filters", "price"} records (e.g. logged
+phase1 outputs), or taken from the samples in filter_benchmark.py.
+
+    python benchmarks/phase1_overlap.py [--expansions expansions.jsonl] [--k 10 20 50] [--scoring-profile NAME]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search.azure_search import search_products, boosted_search_products
+from search.filter_builder import build_filter, build_boost_query
+from search.retail_search_ai import interleave_results
+
+
+def overlap_at_k(reference, candidate, k):
+    """
+    Fraction of the reference top-k that also appears in the candidate top-k.
+    """
+    top = set(reference[:k])
+    if not top:
+        return 1.0
+    return len(top & set(candidate[:k])) / len(top)
+
+
+def run_interleave(expansion, top):
+    terms = ", ".join(expansion["expanded_terms"])
+    filter_expr = build_filter(expansion.get("filters"), expansion.get("price"))
+    start = time.perf_counter()
+    unfiltered = search_products(query=terms, top=top)
+    filtered = search_products(query=terms, filter_expr=filter_expr, top=top) if filter_expr else []
+    elapsed = time.perf_counter() - start
+    return [r["id"] for r in interleave_results(unfiltered, filtered)], elapsed, 2 if filter_expr else 1
+
+
+def run_boosted(expansion, top, scoring_profile=None):
+    terms = ", ".join(expansion["expanded_terms"])
+    boost_query = build_boost_query(expansion["expanded_terms"], expansion.get("filters"))
+    start = time.perf_counter()
+    results = boosted_search_products(query=terms, boost_query=boost_query, top=2 * top, scoring_profile=scoring_profile)
+    return [r["id"] for r in results], time.perf_counter() - start, 1
+
+
+def load_expansions(path):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    from benchmarks.filter_benchmark import SAMPLE_EXPANSIONS
+    return [dict(sample, expanded_terms=[sample["query"]]) for sample in SAMPLE_EXPANSIONS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expansions", help="JSON-lines file of phase1 expansions")
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--top", type=int, default=50, help="results per query in interleave mode")
+    parser.add_argument("--scoring-profile", default=None)
+    args = parser.parse_args()
+
+    overlaps = {k: [] for k in args.k}
+    latencies = {"interleave": [], "boosted": []}
+    requests = {"interleave": 0, "boosted": 0}
+
+    for expansion in load_expansions(args.expansions):
+        reference, t_ref, n_ref = run_interleave(expansion, args.top)
+        candidate, t_cand, n_cand = run_boosted(expansion, args.top, args.scoring_profile)
+        latencies["interleave"].append(t_ref * 1000)
+        latencies["boosted"].append(t_cand * 1000)
+        requests["interleave"] += n_ref
+        requests["boosted"] += n_cand
+
+        row = "  ".join(f"overlap@{k}={overlap_at_k(reference, candidate, k):.2f}" for k in args.k)
+        print(f"{expansion['query'][:40]:<40}  {row}  interleave {t_ref * 1000:.0f} ms  boosted {t_cand * 1000:.0f} ms")
+        for k in args.k:
+            overlaps[k].append(overlap_at_k(reference, candidate, k))
+
+    print()
+    print("mean " + "  ".join(f"overlap@{k}={statistics.mean(v):.2f}" for k, v in overlaps.items() if v))
+    for mode in ("interleave", "boosted"):
+        if latencies[mode]:
+            print(f"{mode:<10} p50 {statistics.median(latencies[mode]):.0f} ms  requests {requests[mode]}")
+
+
+if __name__ == "__main__":
+    main()
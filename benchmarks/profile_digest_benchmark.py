@@ -0,0 +1,54 @@
+# benchmarks/profile_digest_benchmark.py
+"""
+Prompt tokens spent on the customer profile per search, for every profile in
+customer_profiles/: the serializations used before profile digests (phase1 formatted
+the dict as Python repr, phase2 dumped it with indent=2), the full profile as compact
+JSON (PROFILE_PROMPT_MODE=full) and the digest (utils/profile_digest.py, the default).
+
+Tokens are counted with tiktoken's o200k_base encoding when it is available, otherwise
+estimated at ~4 characters per token (as in utils/rate_limiter.py).
+
+    python benchmarks/profile_digest_benchmark.py [--profiles customer_profiles] [--show-digest]
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.profile_digest import build_profile_digest
+from utils.profile_store import profile_prompt_text
+from utils.rate_limiter import _count_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="customer_profiles")
+    parser.add_argument("--show-digest", action="store_true", help="print each digest")
+    args = parser.parse_args()
+
+    print(f"{'customer':24} {'before':>8} {'full':>8} {'digest':>8} {'saved':>8} {'saved %':>8}   (profile tokens per search, phase1 + phase2)")
+    totals = [0, 0, 0]
+    for name in sorted(os.listdir(args.profiles)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(args.profiles, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        digest = build_profile_digest(data)
+
+        before = _count_tokens(str(data)) + _count_tokens(json.dumps(data, indent=2))
+        full = 2 * _count_tokens(profile_prompt_text(data))
+        compact = 2 * _count_tokens(profile_prompt_text(digest))
+        totals = [totals[0] + before, totals[1] + full, totals[2] + compact]
+        print(f"{name:24} {before:>8} {full:>8} {compact:>8} {before - compact:>8} {100 * (before - compact) / before:>7.1f}%")
+        if args.show_digest:
+            print(json.dumps(digest, indent=2))
+
+    before, full, compact = totals
+    if before:
+        print(f"{'total':24} {before:>8} {full:>8} {compact:>8} {before - compact:>8} {100 * (before - compact) / before:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/result_record_benchmark.py
+"""
+CPU time and memory per backend search spent on the product representation: pydantic
+SearchResult models throughout the pipeline (as before backend/models/product_record.py)
+against ProductRecord inside the pipeline and SearchResult only for the response.
+
+Both variants go through the same steps for the standard and the hybrid results
+(--results hits each): build from the formatted hits, hand the AI results to the
+reranker and get them back, hand each one to the reasoning service, set the rank
+fields, and build the SearchResponse. Memory is the tracemalloc peak during one search
+and what the pipeline's result lists hold once it is done.
+
+    python benchmarks/result_record_benchmark.py [--results 50] [--runs 2000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import warnings
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from models.search import SearchResult, SearchResponse, SearchProgress
+from models.product_record import ProductRecord, to_search_results
+
+# The model variant uses .dict() as the backend did
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def make_hits(count: int, seed: int):
+    rng = random.Random(seed)
+    return [{
+        "id": f"product-{i}",
+        "title": f"Product {i}",
+        "description": "A product description of a few sentences. " * 4,
+        "price": round(rng.uniform(10, 500), 2),
+        "img": f"https://img.example.com/{i}.jpg",
+        "brand": f"Brand {i % 7}",
+        "category": "Electronics",
+        "features": ["Feature 1", "Feature 2", "Feature 3"],
+        "sustainability": "",
+        "rating": round(rng.uniform(3, 5), 1),
+        "reviews": rng.randint(0, 5000),
+        "stockStatus": "In Stock",
+        "delivery": "Free Delivery",
+        "originalPrice": 600.0,
+        "discount": 20,
+    } for i in range(count)]
+
+
+def set_ranks(standard, ai):
+    for i, result in enumerate(standard):
+        result.standardRank = i + 1
+    for i, result in enumerate(ai):
+        result.aiRank = i + 1
+
+
+def models_search(standard_hits, hybrid_hits):
+    standard = [SearchResult(**hit) for hit in standard_hits]
+    ai = [SearchResult(**hit) for hit in hybrid_hits]
+    reranked = [result.dict() for result in ai][::-1]
+    ai = [SearchResult(**result) for result in reranked]
+    set_ranks(standard, ai)
+    for result in ai:
+        product = result.dict()
+        result.match = len(product["title"])
+    set_ranks(standard, ai)
+    response = SearchResponse(search_id="s", progress=SearchProgress.COMPLETE, standardResults=standard, aiResults=ai)
+    return standard, ai, response
+
+
+def records_search(standard_hits, hybrid_hits):
+    standard = [ProductRecord.from_dict(hit) for hit in standard_hits]
+    ai = [ProductRecord.from_dict(hit) for hit in hybrid_hits]
+    ai = ai[::-1]
+    set_ranks(standard, ai)
+    for result in ai:
+        result.match = len(result["title"])
+    set_ranks(standard, ai)
+    response = SearchResponse(search_id="s", progress=SearchProgress.COMPLETE,
+                              standardResults=to_search_results(standard), aiResults=to_search_results(ai))
+    return standard, ai, response
+
+
+def measure(search, standard_hits, hybrid_hits, runs: int):
+    for _ in range(min(runs, 50)):
+        search(standard_hits, hybrid_hits)
+    start = time.process_time()
+    for _ in range(runs):
+        search(standard_hits, hybrid_hits)
+    cpu_us = (time.process_time() - start) / runs * 1e6
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    standard, ai, response = search(standard_hits, hybrid_hits)
+    del response
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_us, (peak - base) / 1024, (held - base) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=50, help="hits per search leg")
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    standard_hits, hybrid_hits = make_hits(args.results, 1), make_hits(args.results, 2)
+    print(f"{'':10} {'CPU us/search':>14} {'peak KiB':>10} {'held KiB':>10}   ({args.results} standard + {args.results} hybrid results)")
+    rows = {}
+    for name, search in (("models", models_search), ("records", records_search)):
+        rows[name] = measure(search, standard_hits, hybrid_hits, args.runs)
+        cpu_us, peak, held = rows[name]
+        print(f"{name:10} {cpu_us:>14.0f} {peak:>10.1f} {held:>10.1f}")
+    (m_cpu, m_peak, m_held), (r_cpu, r_peak, r_held) = rows["models"], rows["records"]
+    print(f"{'saved':10} {100 * (m_cpu - r_cpu) / m_cpu:>13.0f}% {100 * (m_peak - r_peak) / m_peak:>9.0f}% {100 * (m_held - r_held) / m_held:>9.0f}%")
+
+
+if __name__ == "__main__":
+    main()
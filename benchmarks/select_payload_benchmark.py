@@ -0,0 +1,100 @@
+# benchmarks/select_payload_benchmark.py
+"""
+Measures what field projection (select=) saves per Azure Search query: response bytes
+over the wire and JSON decode time, with and without `select`.
+
+With --live it posts the same hybrid query twice to the configured index through the
+REST API, once returning every retrievable field and once with search.azure_search.RESULT_FIELDS.
+Without --live it builds a synthetic response of the same shape (three 1536-dimension
+vector fields per document, as in the product index) and times decoding both variants.
+
+    python benchmarks/select_payload_benchmark.py [--live] [--query "running shoes"] [--top 50] [--runs 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search.azure_search import RESULT_FIELDS
+
+API_VERSION = "2024-07-01"
+VECTOR_FIELDS = ["titleVector", "descriptionVector", "brandVector"]
+
+
+def synthetic_payloads(top, dimensions=1536):
+    """
+    Response bodies (bytes) of a search returning `top` full documents and the same
+    documents projected to RESULT_FIELDS.
+    """
+    rng = random.Random(0)
+    docs = []
+    for i in range(top):
+        doc = {
+            "@search.score": rng.random(),
+            "id": str(i),
+            "title": f"Product {i} " + "lorem " * 8,
+            "brand": "Brand",
+            "description": "ipsum dolor sit amet " * 60,
+            "categories": ["Category A", "Category B"],
+            "image_url": f"https://example.com/images/{i}.jpg",
+            "final_price": round(rng.uniform(5, 500), 2),
+        }
+        for field in VECTOR_FIELDS:
+            doc[field] = [rng.uniform(-0.1, 0.1) for _ in range(dimensions)]
+        docs.append(doc)
+    keep = set(RESULT_FIELDS) | {"@search.score"}
+    projected = [{k: v for k, v in doc.items() if k in keep} for doc in docs]
+    return json.dumps({"value": docs}).encode(), json.dumps({"value": projected}).encode()
+
+
+def live_payloads(query, top):
+    import requests
+    from search.config import search_endpoint, index_name, search_api_key
+
+    url = f"{search_endpoint}/indexes/{index_name}/docs/search?api-version={API_VERSION}"
+    headers = {"api-key": search_api_key, "Content-Type": "application/json"}
+    body = {"search": query, "top": top, "queryType": "semantic", "semanticConfiguration": "semantic-config"}
+
+    full = requests.post(url, headers=headers, json=body)
+    full.raise_for_status()
+    projected = requests.post(url, headers=headers, json=dict(body, select=",".join(RESULT_FIELDS)))
+    projected.raise_for_status()
+    return full.content, projected.content
+
+
+def decode_ms(payload, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        json.loads(payload)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="query the configured Azure Search index")
+    parser.add_argument("--query", default="running shoes")
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.live:
+        full, projected = live_payloads(args.query, args.top)
+    else:
+        full, projected = synthetic_payloads(args.top)
+
+    full_ms, projected_ms = decode_ms(full, args.runs), decode_ms(projected, args.runs)
+    print(f"{'':12} {'bytes':>12} {'decode ms':>10}")
+    print(f"{'all fields':12} {len(full):>12,} {full_ms:>10.2f}")
+    print(f"{'select':12} {len(projected):>12,} {projected_ms:>10.2f}")
+    print(f"reduction: {1 - len(projected) / len(full):.0%} bytes, {1 - projected_ms / max(full_ms, 1e-9):.0%} decode time")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 # search/azure_search.py
 from rich.console import Console
-from search.config import search_client
-from search.config import vector_fields
+from search.config import search_client, search_endpoint, index_name, credential
+from search.config import vector_fields, query_vector_mode, query_embedding_model
+from search.config import vector_search_exhaustive, vector_search_k, hnsw_m, hnsw_ef_construction, hnsw_ef_search
 
 import sys
+import contextvars
+from contextlib import contextmanager
 sys.path.append("../")
 
 from azure.search.documents import SearchIndexingBufferedSender
 from azure.search.documents.models import (
     VectorizableTextQuery,
+    VectorizedQuery,
     QueryType
 )
 from azure.search.documents.indexes.models import (
@@ -18,6 +22,7 @@ from azure.search.documents.indexes.models import (
     SemanticSearch,
     VectorSearchAlgorithmConfiguration,
     HnswAlgorithmConfiguration,
+    HnswParameters,
     VectorSearchProfile,
     AzureOpenAIVectorizer,
     AzureOpenAIVectorizerParameters,
@@ -26,16 +31,23 @@ from azure.search.documents.indexes.models import (
     SemanticField,
     SimpleField,
     SearchFieldDataType,
-    SearchableField
+    SearchableField,
+    SearchField
 )
+from azure.search.documents.indexes import SearchIndexClient
 
 
 from utils.openai_data_models import *
+from utils.embedding_service import get_embedding_service
+from utils.tracing import start_span, current_span
 from search.search_data_models import *
 
 console = Console()
 
 
+# Stored fields read by the result formatters below. Passed as select= so Azure does not
+# return every retrievable field (including vector fields) for each hit.
+RESULT_FIELDS = ["id", "title", "brand", "description", "image_url", "final_price"]
 
 
 def build_configurations(embedding_model_info):
@@ -45,7 +57,13 @@ def build_configurations(embedding_model_info):
     vector_search = VectorSearch(
         algorithms=[
             HnswAlgorithmConfiguration(
-                name="myHnsw"
+                name="myHnsw",
+                parameters=HnswParameters(
+                    m=hnsw_m,
+                    ef_construction=hnsw_ef_construction,
+                    ef_search=hnsw_ef_search,
+                    metric="cosine"
+                )
             )
         ],
         profiles=[
@@ -84,13 +102,106 @@ def build_configurations(embedding_model_info):
 
 
 
+def build_index(embedding_model_info, name: str = None):
+    """
+    The product index: the fields the search functions and filters use, one vector
+    field per entry of vector_fields, HNSW/vectorizer and semantic configuration.
+    """
+    vector_search, semantic_search = build_configurations(embedding_model_info)
+    fields = [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
+        SearchableField(name="title", type=SearchFieldDataType.String),
+        SearchableField(name="brand", type=SearchFieldDataType.String, filterable=True, facetable=True),
+        SearchableField(name="description", type=SearchFieldDataType.String),
+        SearchableField(name="categories", type=SearchFieldDataType.String, collection=True, filterable=True, facetable=True),
+        SimpleField(name="price", type=SearchFieldDataType.Double, filterable=True, sortable=True),
+        SimpleField(name="final_price", type=SearchFieldDataType.Double, filterable=True, sortable=True),
+        SimpleField(name="image_url", type=SearchFieldDataType.String),
+    ] + [
+        SearchField(
+            name=vf,
+            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            searchable=True,
+            vector_search_dimensions=embedding_model_info.dimensions,
+            vector_search_profile_name="vector-search-profile"
+        ) for vf in vector_fields
+    ]
+    return SearchIndex(name=name or index_name, fields=fields, vector_search=vector_search, semantic_search=semantic_search)
+
+
+def create_or_update_index(embedding_model_info, name: str = None):
+    index = build_index(embedding_model_info, name)
+    result = SearchIndexClient(endpoint=search_endpoint, credential=credential).create_or_update_index(index)
+    console.log(f"Index {result.name} created or updated ({len(result.fields)} fields)")
+    return result
+
+
+
+_vector_options = contextvars.ContextVar("vector_search_options", default={})
+
+
+@contextmanager
+def vector_search_options(exhaustive: bool = None, k: int = None):
+    """
+    Overrides VECTOR_SEARCH_EXHAUSTIVE / VECTOR_SEARCH_K for the vector queries issued
+    in this block, e.g. for one API request. None keeps the configured value.
+    """
+    options = dict(_vector_options.get())
+    if exhaustive is not None:
+        options["exhaustive"] = exhaustive
+    if k is not None:
+        options["k"] = k
+    token = _vector_options.set(options)
+    try:
+        yield
+    finally:
+        _vector_options.reset(token)
+
+
+def build_vector_queries(query: str, k: int = None, exhaustive: bool = None):
+    """
+    One vector query per vector field. In "client" mode the query is embedded once
+    (through the batching, caching embedding service) and all fields share that vector; otherwise, or if
+    embedding fails, the index vectorizer embeds the text for each field.
+    Queries use the HNSW index unless exhaustive kNN is requested (argument, then
+    vector_search_options, then VECTOR_SEARCH_EXHAUSTIVE).
+    """
+    options = _vector_options.get()
+    k = k or options.get("k") or vector_search_k
+    exhaustive = exhaustive if exhaustive is not None else options.get("exhaustive", vector_search_exhaustive)
+    current_span().set_attributes({"search.vector_k": k, "search.vector_exhaustive": exhaustive})
+
+    if query_vector_mode == "client":
+        try:
+            vector = get_embedding_service(EmbeddingModelnfo(model_name=query_embedding_model)).embed_one(query).tolist()
+            current_span().set_attribute("search.query_vector_mode", "client")
+            return [VectorizedQuery(
+                    vector=vector,
+                    k_nearest_neighbors=k,
+                    fields=vf,
+                    exhaustive=exhaustive
+                ) for vf in vector_fields]
+        except Exception as e:
+            console.log(f"[yellow]Query embedding failed, using the index vectorizer: {e}[/yellow]")
+
+    current_span().set_attribute("search.query_vector_mode", "service")
+    return [VectorizableTextQuery(
+            text=query, 
+            k_nearest_neighbors=k,  
+            fields=vf,
+            exhaustive=exhaustive
+        ) for vf in vector_fields]
+
+
+
 def simple_search_products(query: str, filter_expr: str = None, top: int = 15):
     """
     Perform Azure Cognitive Search with optional filter
     """
     results = search_client.search(search_text=query, 
                                    filter=filter_expr, 
-                                   top=top)
+                                   top=top,
+                                   select=RESULT_FIELDS)
     output = []
     for doc in results:
         output.append({
@@ -106,31 +217,82 @@ def simple_search_products(query: str, filter_expr: str = None, top: int = 15):
 
 def search_products(query: str, filter_expr: str = None, top: int = 15):
 
-    vector_queries = [VectorizableTextQuery(
-            text=query, 
-            k_nearest_neighbors=50,  
-            fields=vf,
-            exhaustive=True
-        ) for vf in vector_fields]
+    attributes = {
+        "search.leg": "filtered" if filter_expr else "unfiltered",
+        "search.top": top,
+        "search.filter_length": len(filter_expr) if filter_expr else 0,
+    }
+    with start_span("search_products", attributes) as span:
+        vector_queries = build_vector_queries(query)
 
-    results = search_client.search(
-        search_text=query,  
-        vector_queries=vector_queries,
-        filter=filter_expr,
-        top=top,
-        semantic_configuration_name="semantic-config",
-        query_type=QueryType.SEMANTIC
-    )
+        results = search_client.search(
+            search_text=query,  
+            vector_queries=vector_queries,
+            filter=filter_expr,
+            top=top,
+            semantic_configuration_name="semantic-config",
+            query_type=QueryType.SEMANTIC,
+            select=RESULT_FIELDS
+        )
 
-    output = []
-    for doc in results:
-        output.append({
-            "id": doc["id"],
-            "name": doc["title"],
-            "brand": doc["brand"],
-            "description": doc["description"][:750],
-            "images": doc["image_url"],
-            "price": doc["final_price"]
-        })
+        output = []
+        for doc in results:
+            output.append({
+                "id": doc["id"],
+                "name": doc["title"],
+                "brand": doc["brand"],
+                "description": doc["description"][:750],
+                "images": doc["image_url"],
+                "price": doc["final_price"]
+            })
+
+        span.set_attribute("search.result_count", len(output))
         
-    return output
\ No newline at end of file
+    return output
+
+
+
+def boosted_search_products(query: str, boost_query: str, top: int = 50, scoring_profile: str = None):
+    """
+    Single hybrid query for phase1: `boost_query` is full-Lucene search text in which the
+    expansion filter terms are boosted clauses (see search.filter_builder.build_boost_query),
+    the vector legs use the plain query. Replaces the unfiltered + filtered query pair.
+
+    Trade-off: boosted clauses need QueryType.FULL, and a query is either full-Lucene or
+    semantic, so this query has no semantic reranking (search_products uses
+    "semantic-config"). Results are ordered by RRF of the BM25 (with boosts) and vector
+    legs, plus the scoring profile if one is given.
+    """
+    attributes = {
+        "search.leg": "boosted",
+        "search.top": top,
+        "search.boost_query_length": len(boost_query),
+        "search.scoring_profile": scoring_profile,
+    }
+    with start_span("search_products", attributes) as span:
+        vector_queries = build_vector_queries(query)
+
+        results = search_client.search(
+            search_text=boost_query,
+            vector_queries=vector_queries,
+            top=top,
+            query_type=QueryType.FULL,
+            search_mode="any",
+            scoring_profile=scoring_profile,
+            select=RESULT_FIELDS
+        )
+
+        output = []
+        for doc in results:
+            output.append({
+                "id": doc["id"],
+                "name": doc["title"],
+                "brand": doc["brand"],
+                "description": doc["description"][:750],
+                "images": doc["image_url"],
+                "price": doc["final_price"]
+            })
+
+        span.set_attribute("search.result_count", len(output))
+
+    return output
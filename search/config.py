@@ -21,7 +21,7 @@ search_api_key = os.getenv("SEARCH_API_KEY", "")
 # Configure the Azure Search client
 search_endpoint = f"https://{search_service_name}.search.windows.net"
 credential = AzureKeyCredential(search_api_key)
-search_client = SearchClient(endpoint=search_endpoint, index_name=index_name, credential=credential)
+search_client = None  # created at the end of this file, once the search backend settings are loaded
 
 # Read prompt files
 search_expansion_prompt = read_file("prompts/search_expansion_prompt.txt")
@@ -30,4 +30,65 @@ product_categories = read_file("prompts/product_categories.txt")
 
 
 # Vector Fields
-vector_fields = ["titleVector", "descriptionVector", "brandVector"]
\ No newline at end of file
+vector_fields = ["titleVector", "descriptionVector", "brandVector"]
+
+
+# Phase1 retrieval: "interleave" runs an unfiltered and a filtered query and interleaves them,
+# "boosted" runs one query that boosts filter matches (optionally through a scoring profile)
+phase1_search_mode = os.getenv("PHASE1_SEARCH_MODE", "interleave")
+phase1_scoring_profile = os.getenv("PHASE1_SCORING_PROFILE") or None
+
+
+# Query vectors: "service" sends the query text to the index vectorizer, which embeds it once per
+# vector field; "client" embeds it once here (cached) and sends that vector to all vector fields.
+# The client-side model must be the one the index vectorizer uses.
+query_vector_mode = os.getenv("QUERY_VECTOR_MODE", "service")
+query_embedding_model = os.getenv("QUERY_EMBEDDING_MODEL", "text-embedding-3-small")
+
+
+# Vector queries: approximate kNN over the HNSW graph unless exhaustive search is requested.
+# k is the number of neighbours each vector query contributes to the hybrid ranking.
+vector_search_exhaustive = os.getenv("VECTOR_SEARCH_EXHAUSTIVE", "0") == "1"
+vector_search_k = int(os.getenv("VECTOR_SEARCH_K", 50))
+
+# HNSW parameters of the index (applied when the index is created or updated)
+hnsw_m = int(os.getenv("HNSW_M", 4))
+hnsw_ef_construction = int(os.getenv("HNSW_EF_CONSTRUCTION", 400))
+hnsw_ef_search = int(os.getenv("HNSW_EF_SEARCH", 500))
+# Pipelined phase2: phase1 runs its filtered leg next to the unfiltered one and, if the filtered
+# results are not in within PHASE2_PIPELINE_DEADLINE_MS of the unfiltered ones, phase2 starts
+# without them; they are interleaved into the unranked tail afterwards. Per request: pipelined_phase2.
+phase2_pipeline = os.getenv("PHASE2_PIPELINE", "0") == "1"
+phase2_pipeline_deadline_ms = float(os.getenv("PHASE2_PIPELINE_DEADLINE_MS", 150))
+
+
+# Phase1 query expansions are cached per (model, query, customer profile) for this many seconds;
+# the customer warm-up (search/warmup.py) fills the cache speculatively. 0 disables the cache.
+expansion_cache_seconds = float(os.getenv("EXPANSION_CACHE_SECONDS", 600))
+
+
+# Phase2 ranking: "llm" asks the recommender model for the ordering; "ltr" ranks the phase1
+# candidates with the model distilled from logged LLM orderings (search/ltr_ranker.py), without
+# an LLM call, and falls back to the LLM when there is no model. Per request: phase2_ranker.
+phase2_ranker = os.getenv("PHASE2_RANKER", "llm")
+
+
+# Search backend: "azure" (the live index) or "local", an in-process engine serving a catalog
+# snapshot (search/local_search.py) for offline development and load tests.
+# LOCAL_SEARCH_EMBEDDINGS=1 embeds the text of vector queries with query_embedding_model;
+# otherwise only pre-computed query vectors (QUERY_VECTOR_MODE=client) reach the vector legs.
+search_backend = os.getenv("SEARCH_BACKEND", "azure")
+local_catalog_path = os.getenv("LOCAL_CATALOG_PATH", "data/catalog.jsonl")
+local_search_embeddings = os.getenv("LOCAL_SEARCH_EMBEDDINGS", "0") == "1"
+
+if search_backend == "local":
+    from search.local_search import LocalSearchClient
+
+    embedder = None
+    if local_search_embeddings:
+        from utils.openai_data_models import EmbeddingModelnfo
+        from utils.embedding_service import get_embedding_service
+        embedder = lambda text: get_embedding_service(EmbeddingModelnfo(model_name=query_embedding_model)).embed_one(text)
+    search_client = LocalSearchClient.from_catalog(local_catalog_path, embedder=embedder)
+else:
+    search_client = SearchClient(endpoint=search_endpoint, index_name=index_name, credential=credential)
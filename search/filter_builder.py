@@ -0,0 +1,244 @@
+# search/filter_builder.py
+"""
+Builds the phase1 OData filter from the LLM's query expansion.
+
+The filter is assembled as a small AST and rendered at the end, instead of by
+string concatenation:
+    - terms are deduplicated case-insensitively; `search.ismatch` runs the field's
+      analyzer, which lowercases, so "drill", "DRILL", "Drill" all match the same documents
+    - all terms of a field go into one `search.ismatch` with an OR-ed Lucene query, and
+      fields with the same terms share one clause ('title,description'), so the service
+      evaluates one full-text clause per term set instead of four per term
+    - single quotes are escaped for OData and Lucene special characters for the query
+    - the number of terms and the rendered length are capped
+    - the result is validated locally; invalid input raises FilterValidationError
+"""
+import math
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from rich.console import Console
+console = Console()
+
+
+TEXT_FIELDS = ["title", "brand", "description"]
+KEYWORD_FIELDS = ["categories"]
+NUMERIC_FIELDS = ["price"]
+FILTERABLE_FIELDS = set(TEXT_FIELDS + KEYWORD_FIELDS + NUMERIC_FIELDS)
+
+PHRASE_SLOP = 10
+MAX_TERMS_PER_FIELD = 8
+MAX_TERM_LENGTH = 100
+MAX_FILTER_LENGTH = 4000
+
+_LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+class FilterValidationError(ValueError):
+    """
+    Raised when a filter expression would be rejected by the search service.
+    """
+
+
+# AST nodes
+
+class IsMatch:
+    """
+    search.ismatch over one or more fields with an OR of terms.
+    """
+
+    def __init__(self, terms: Sequence[str], fields: Sequence[str], phrase: bool = True):
+        self.terms = list(terms)
+        self.fields = list(fields)
+        self.phrase = phrase
+
+    def term_query(self, term: str) -> str:
+        if self.phrase:
+            escaped = term.replace("\\", "\\\\").replace('"', '\\"')
+            return f'"{escaped}"~{PHRASE_SLOP}'
+        return _LUCENE_SPECIAL.sub(r"\\\1", term)
+
+    def render(self) -> str:
+        query = " OR ".join(self.term_query(t) for t in self.terms)
+        return f"search.ismatch({odata_string(query)}, {odata_string(','.join(self.fields))}, 'full', 'any')"
+
+
+class Comparison:
+    def __init__(self, field: str, op: str, value: float):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def render(self) -> str:
+        value = int(self.value) if float(self.value).is_integer() else self.value
+        return f"{self.field} {self.op} {value}"
+
+
+class BoolOp:
+    def __init__(self, op: str, children: List[Any]):
+        self.op = op
+        self.children = [c for c in children if c is not None]
+
+    def render(self) -> str:
+        parts = [p for p in (c.render() for c in self.children) if p]
+        if not parts:
+            return ""
+        if len(parts) == 1:
+            return parts[0]
+        return "(" + f" {self.op} ".join(parts) + ")"
+
+
+def odata_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(str(term).split())
+
+
+def dedupe_terms(terms: Sequence[str], limit: int = MAX_TERMS_PER_FIELD) -> List[str]:
+    """
+    Removes blanks and case/whitespace variants, keeping the first spelling of each term.
+    """
+    seen = set()
+    unique = []
+    for term in terms or []:
+        term = normalize_term(term)[:MAX_TERM_LENGTH]
+        key = term.casefold()
+        if term and key not in seen:
+            seen.add(key)
+            unique.append(term)
+        if len(unique) >= limit:
+            break
+    return unique
+
+
+def _price_bound(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise FilterValidationError(f"Price bound is not a number: {value!r}")
+    if not math.isfinite(value) or value < 0:
+        raise FilterValidationError(f"Price bound out of range: {value!r}")
+    return value
+
+
+def build_filter_tree(filter_obj: Dict[str, List[str]], price_obj: Optional[Dict[str, Any]] = None,
+                      max_terms_per_field: int = MAX_TERMS_PER_FIELD, field_limits: Optional[Dict[str, int]] = None):
+    """
+    Builds the AST: (text/category matches OR-ed together) AND price bounds.
+    `field_limits` overrides `max_terms_per_field` for the fields it names.
+    """
+    filter_obj = filter_obj or {}
+    price_obj = price_obj or {}
+    field_limits = field_limits or {}
+
+    # Group text fields that ended up with the same terms into one multi-field clause
+    groups: Dict[tuple, List[str]] = {}
+    for field in TEXT_FIELDS:
+        terms = dedupe_terms(filter_obj.get(field) or [], field_limits.get(field, max_terms_per_field))
+        if terms:
+            groups.setdefault(tuple(t.casefold() for t in terms), [terms, []])[1].append(field)
+    matches = [IsMatch(terms, fields) for terms, fields in groups.values()]
+
+    for field in KEYWORD_FIELDS:
+        terms = dedupe_terms(filter_obj.get(field) or [], field_limits.get(field, max_terms_per_field))
+        if terms:
+            matches.append(IsMatch(terms, [field], phrase=False))
+
+    ge = _price_bound(price_obj.get("ge"))
+    le = _price_bound(price_obj.get("lte"))
+    if ge is not None and le is not None and ge > le:
+        ge, le = le, ge
+
+    return BoolOp("and", [
+        BoolOp("or", matches),
+        Comparison("price", "ge", ge) if ge is not None else None,
+        Comparison("price", "le", le) if le is not None else None,
+    ])
+
+
+_ISMATCH_FIELDS = re.compile(r"search\.ismatch\('(?:[^']|'')*',\s*'([^']*)'")
+_COMPARISON = re.compile(r"\b([A-Za-z_][A-Za-z0-9_/]*)\s+(eq|ne|gt|ge|lt|le)\s+")
+
+
+def validate_filter(expr: str, max_length: int = MAX_FILTER_LENGTH) -> str:
+    """
+    Checks an OData filter locally: length, balanced quotes and parentheses, known fields.
+    Returns the expression unchanged or raises FilterValidationError.
+    """
+    if len(expr) > max_length:
+        raise FilterValidationError(f"Filter is {len(expr)} characters, limit is {max_length}")
+
+    # Strip string literals ('' is an escaped quote) before checking structure
+    without_strings, n = re.subn(r"'(?:[^']|'')*'", "''", expr)
+    if "'" in without_strings.replace("''", ""):
+        raise FilterValidationError("Unterminated string literal in filter")
+
+    depth = 0
+    for ch in without_strings:
+        depth += (ch == "(") - (ch == ")")
+        if depth < 0:
+            raise FilterValidationError("Unbalanced parentheses in filter")
+    if depth != 0:
+        raise FilterValidationError("Unbalanced parentheses in filter")
+
+    for fields in _ISMATCH_FIELDS.findall(expr):
+        unknown = set(f.strip() for f in fields.split(",")) - FILTERABLE_FIELDS
+        if unknown:
+            raise FilterValidationError(f"Unknown fields in search.ismatch: {sorted(unknown)}")
+    for field, _ in _COMPARISON.findall(without_strings):
+        if field not in FILTERABLE_FIELDS:
+            raise FilterValidationError(f"Unknown field in comparison: {field}")
+    return expr
+
+
+def build_filter(filter_obj: Dict[str, List[str]], price_obj: Optional[Dict[str, Any]] = None,
+                 max_length: int = MAX_FILTER_LENGTH) -> str:
+    """
+    Renders and validates the phase1 filter. While the expression is longer than
+    `max_length`, the last term of the longest field (most characters in its kept terms)
+    is dropped, down to one term per field. Returns "" if there is nothing to filter on.
+    """
+    filter_obj = filter_obj or {}
+    terms = {field: dedupe_terms(filter_obj.get(field) or []) for field in TEXT_FIELDS + KEYWORD_FIELDS}
+    limits = {field: len(field_terms) for field, field_terms in terms.items()}
+    while True:
+        expr = build_filter_tree(filter_obj, price_obj, field_limits=limits).render()
+        trimmable = [field for field, limit in limits.items() if limit > 1]
+        if len(expr) <= max_length or not trimmable:
+            break
+        longest = max(trimmable, key=lambda field: sum(len(t) for t in terms[field][:limits[field]]))
+        limits[longest] -= 1
+    trimmed = {field: limit for field, limit in limits.items() if limit < len(terms[field])}
+    if trimmed:
+        console.log(f"Filter trimmed to {trimmed} terms per field ({len(expr)} characters)")
+    return validate_filter(expr, max_length) if expr else ""
+
+
+DEFAULT_BOOST = 3.0
+
+
+def lucene_escape(text: str) -> str:
+    return _LUCENE_SPECIAL.sub(r"\\\1", text)
+
+
+def build_boost_query(expanded_terms: Sequence[str], filter_obj: Dict[str, List[str]], boost: float = DEFAULT_BOOST,
+                      max_terms_per_field: int = MAX_TERMS_PER_FIELD) -> str:
+    """
+    Full-Lucene search text for the single-query phase1 mode: the expanded terms, OR-ed with
+    fielded clauses for the filter terms, boosted by `boost`. Documents the filtered query
+    would have returned rank higher instead of being fetched by a second request.
+    Price bounds have no Lucene equivalent and are not part of the boost.
+    """
+    filter_obj = filter_obj or {}
+    clauses = [lucene_escape(t) for t in dedupe_terms(expanded_terms, limit=32)]
+    for field in TEXT_FIELDS + KEYWORD_FIELDS:
+        terms = dedupe_terms(filter_obj.get(field) or [], max_terms_per_field)
+        if not terms:
+            continue
+        node = IsMatch(terms, [field], phrase=field in TEXT_FIELDS)
+        clauses.append(f"{field}:({' OR '.join(node.term_query(t) for t in terms)})^{boost:g}")
+    return " OR ".join(clauses)
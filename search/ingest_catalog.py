@@ -0,0 +1,302 @@
+# search/ingest_catalog.py
+"""
+Bulk ingestion of a product catalog into the Azure Search index.
+
+The catalog (JSON lines, CSV or Parquet) is streamed in chunks:
+    1. records are normalized to index documents (see to_document)
+    2. titleVector/descriptionVector/brandVector are computed in batched embedding calls
+       through the embedding service (records that already carry vectors keep them)
+    3. chunks go to a bounded queue served by --upload-workers threads, each with its own
+       SearchIndexingBufferedSender; when uploads fall behind, the queue is full and
+       reading/embedding waits (back-pressure)
+After every chunk the checkpoint file records how many source records are fully
+uploaded (contiguously, since workers finish out of order); a restarted run with the
+same checkpoint skips them. Documents still failing after the sender's retries are
+appended to <checkpoint>.errors.jsonl.
+
+    python -m search.ingest_catalog catalog.jsonl [--create-index] [--chunk-size 500] [--upload-workers 4]
+        [--checkpoint ingest.checkpoint.json] [--limit N] [--dry-run]
+"""
+import os
+import re
+import csv
+import json
+import time
+import queue
+import argparse
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from rich.console import Console
+from azure.search.documents import SearchIndexingBufferedSender
+
+from search.config import search_endpoint, index_name, credential, query_embedding_model
+from search.azure_search import create_or_update_index
+from search.reembed_catalog import VECTOR_SOURCES
+from utils.openai_data_models import EmbeddingModelnfo
+from utils.embedding_service import get_embedding_service
+from utils.general_helpers import generate_uuid_from_string
+
+console = Console()
+
+
+REPORT_INTERVAL_SECONDS = 10
+_VALID_KEY = re.compile(r"[A-Za-z0-9_\-=]+")
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the records of a .jsonl/.json, .csv or .parquet catalog.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".json", ".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif extension == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+    elif extension == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            import pandas as pd
+            yield from pd.read_parquet(path).to_dict(orient="records")
+            return
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=1024):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported catalog format: {path}")
+
+
+def _number(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(str(value).replace("$", "").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _categories(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            value = json.loads(value)
+        else:
+            value = re.split(r"[|;]", value)
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def to_document(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Maps a catalog record to the index schema (search.azure_search.build_index).
+    Ids that are not valid document keys, or missing ids, are replaced by a UUID
+    derived from the id (or title and brand), so re-ingestion yields the same key.
+    """
+    doc_id = str(record.get("id") or "")
+    if not _VALID_KEY.fullmatch(doc_id):
+        doc_id = generate_uuid_from_string(doc_id or f"{record.get('title', '')}|{record.get('brand', '')}")
+    price = _number(record.get("price"))
+    final_price = _number(record.get("final_price"))
+    document = {
+        "id": doc_id,
+        "title": str(record.get("title") or ""),
+        "brand": str(record.get("brand") or ""),
+        "description": str(record.get("description") or ""),
+        "categories": _categories(record.get("categories")),
+        "price": price if price is not None else final_price,
+        "final_price": final_price if final_price is not None else price,
+        "image_url": record.get("image_url") or "",
+    }
+    for vector_field in VECTOR_SOURCES:
+        if isinstance(record.get(vector_field), list) and record[vector_field]:
+            document[vector_field] = record[vector_field]
+    return document
+
+
+def embed_documents(documents: List[Dict[str, Any]], service, batch_size: int):
+    """
+    Fills in the vector fields of documents that do not have them, one batched
+    embedding pass per vector field.
+    """
+    for vector_field, text_field in VECTOR_SOURCES.items():
+        missing = [doc for doc in documents if vector_field not in doc]
+        if not missing:
+            continue
+        vectors = service.embed_many([doc[text_field] for doc in missing], batch_size=batch_size)
+        for doc, vector in zip(missing, vectors):
+            doc[vector_field] = vector.tolist()
+
+
+class Checkpoint:
+    """
+    Number of source records whose chunks are all uploaded, persisted atomically.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source
+        self.records = 0
+        self._done: Dict[int, int] = {}
+        self._next_chunk = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("source") == os.path.abspath(source):
+                self.records = state.get("records", 0)
+
+    def complete(self, chunk_index: int, size: int):
+        with self._lock:
+            self._done[chunk_index] = size
+            advanced = False
+            while self._next_chunk in self._done:
+                self.records += self._done.pop(self._next_chunk)
+                self._next_chunk += 1
+                advanced = True
+            if advanced and self.path:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"source": os.path.abspath(self.source), "records": self.records, "updated": time.time()}, f)
+                os.replace(tmp, self.path)
+
+
+class IngestionStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.read = 0
+        self.embedded = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.embed_seconds = 0.0
+        self._last_report = self.start
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self, final: bool = False):
+        now = time.perf_counter()
+        if not final and now - self._last_report < REPORT_INTERVAL_SECONDS:
+            return
+        self._last_report = now
+        elapsed = max(now - self.start, 1e-9)
+        console.log(f"{'Done' if final else 'Progress'}: read {self.read}, embedded {self.embedded}, uploaded {self.uploaded}, "
+                    f"failed {self.failed} | {self.uploaded / elapsed:.1f} docs/s, embedding {self.embed_seconds:.1f}s of {elapsed:.1f}s")
+
+
+def upload_worker(chunks: "queue.Queue", stats: IngestionStats, checkpoint: Checkpoint, errors_path: str,
+                  batch_size: int, errors_lock: threading.Lock):
+    def on_error(action):
+        # IndexAction is a mapping of "@search.action" and the document fields
+        stats.add(failed=1)
+        document = {k: v for k, v in action.items() if k not in VECTOR_SOURCES and k != "@search.action"}
+        with errors_lock, open(errors_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(document) + "\n")
+
+    with SearchIndexingBufferedSender(endpoint=search_endpoint, index_name=index_name, credential=credential,
+                                      auto_flush=False, max_retries_per_action=5, on_error=on_error,
+                                      on_progress=lambda action: stats.add(uploaded=1)) as sender:
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            chunk_index, documents, size = item
+            try:
+                # Without auto_flush the sender sends whatever is queued in one request, so the
+                # chunk goes out in batch_size slices; flushing each one makes the checkpoint
+                # exact: the chunk is acknowledged (or failed) when the loop ends
+                for start in range(0, len(documents), batch_size):
+                    sender.merge_or_upload_documents(documents=documents[start:start + batch_size])
+                    sender.flush()
+            except Exception as e:
+                # The checkpoint stops before this chunk, so a rerun retries it
+                console.log(f"[red]Upload of chunk {chunk_index} failed: {e}[/red]")
+                stats.add(failed=size)
+                continue
+            checkpoint.complete(chunk_index, size)
+            stats.report()
+
+
+def ingest(path: str, chunk_size: int = 500, upload_workers: int = 4, checkpoint_path: Optional[str] = None,
+           embedding_batch_size: int = 256, upload_batch_size: int = 500, limit: Optional[int] = None, dry_run: bool = False):
+    service = get_embedding_service(EmbeddingModelnfo(model_name=query_embedding_model))
+    checkpoint = Checkpoint(checkpoint_path, path)
+    stats = IngestionStats()
+    if checkpoint.records:
+        console.log(f"Resuming after {checkpoint.records} records ({checkpoint_path})")
+
+    chunks: "queue.Queue" = queue.Queue(maxsize=2 * upload_workers)
+    errors_lock = threading.Lock()
+    errors_path = (checkpoint_path or "ingest") + ".errors.jsonl"
+    workers = [] if dry_run else [
+        threading.Thread(target=upload_worker, args=(chunks, stats, checkpoint, errors_path, upload_batch_size, errors_lock),
+                         name=f"ingest-upload-{i}", daemon=True)
+        for i in range(upload_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    chunk, chunk_index = [], 0
+    for position, record in enumerate(read_records(path)):
+        if position < checkpoint.records:
+            continue
+        if limit is not None and stats.read >= limit:
+            break
+        chunk.append(to_document(record))
+        stats.add(read=1)
+        if len(chunk) < chunk_size:
+            continue
+        _process_chunk(chunk, chunk_index, chunks, service, stats, embedding_batch_size, dry_run)
+        chunk, chunk_index = [], chunk_index + 1
+    if chunk:
+        _process_chunk(chunk, chunk_index, chunks, service, stats, embedding_batch_size, dry_run)
+
+    for _ in workers:
+        chunks.put(None)
+    for worker in workers:
+        worker.join()
+    stats.report(final=True)
+    return stats
+
+
+def _process_chunk(documents, chunk_index, chunks, service, stats, embedding_batch_size, dry_run):
+    start = time.perf_counter()
+    embed_documents(documents, service, embedding_batch_size)
+    stats.add(embedded=len(documents), embed_seconds=time.perf_counter() - start)
+    if dry_run:
+        # Nothing was uploaded, so the checkpoint stays where it is
+        stats.report()
+    else:
+        # Blocks while all upload workers are busy and the queue is full
+        chunks.put((chunk_index, documents, len(documents)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("catalog", help="catalog file (.jsonl, .csv or .parquet)")
+    parser.add_argument("--create-index", action="store_true", help="create or update the index schema first")
+    parser.add_argument("--chunk-size", type=int, default=500, help="records per pipeline chunk")
+    parser.add_argument("--upload-workers", type=int, default=4, help="parallel upload batches")
+    parser.add_argument("--upload-batch-size", type=int, default=500, help="documents per indexing request (max 1000)")
+    parser.add_argument("--embedding-batch-size", type=int, default=256, help="texts per embeddings request")
+    parser.add_argument("--checkpoint", default="ingest.checkpoint.json")
+    parser.add_argument("--limit", type=int, default=None, help="ingest at most N records")
+    parser.add_argument("--dry-run", action="store_true", help="read and embed only, leaving the checkpoint unchanged")
+    args = parser.parse_args()
+
+    if args.create_index and not args.dry_run:
+        create_or_update_index(EmbeddingModelnfo(model_name=query_embedding_model))
+    ingest(args.catalog, chunk_size=args.chunk_size, upload_workers=args.upload_workers, checkpoint_path=args.checkpoint,
+           embedding_batch_size=args.embedding_batch_size, upload_batch_size=args.upload_batch_size,
+           limit=args.limit, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
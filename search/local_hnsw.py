@@ -0,0 +1,183 @@
+# search/local_hnsw.py
+"""
+In-process stand-in for the index's vector search: an HNSW graph with the parameters
+Azure AI Search exposes (m, efConstruction, efSearch, cosine metric) and an exact
+brute-force search for comparison, over a float32 NumPy matrix.
+
+It follows the HNSW paper (Malkov & Yashunin): every vector is inserted on layers
+0..l with l drawn from an exponential distribution; on each layer it is linked to up
+to m neighbours (2*m on layer 0), picked with the paper's neighbour-selection
+heuristic from a beam of efConstruction candidates.
+Queries descend greedily through the upper layers and run a beam of
+max(efSearch, k) candidates on layer 0.
+
+    index = HnswIndex(dimensions=1536, m=4, ef_construction=400, ef_search=500)
+    index.add(vectors)
+    ids, scores = index.search(query, k=50)                     # approximate
+    ids, scores = index.search(query, k=50, exhaustive=True)    # exact
+"""
+import heapq
+import math
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class HnswIndex:
+    """
+    HNSW graph over cosine similarity. Ids are the insertion positions of the vectors.
+    """
+
+    def __init__(self, dimensions: int, m: int = 4, ef_construction: int = 400, ef_search: int = 500, seed: int = 0):
+        self.dimensions = dimensions
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(max(m, 2))
+        self._random = random.Random(seed)
+
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self._size = 0
+        # _links[level][node] -> neighbour ids on that level
+        self._links: List[dict] = []
+        self._entry: Optional[int] = None
+        # Vectors compared against a query so far; the cost measure of a search that
+        # carries over to the service, unlike the wall time of this Python implementation
+        self.distance_evaluations = 0
+
+    def __len__(self):
+        return self._size
+
+    def _distances(self, query: np.ndarray, ids) -> np.ndarray:
+        self.distance_evaluations += len(ids)
+        return 1.0 - self.vectors[ids] @ query
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """
+        Beam search on one layer; returns up to `ef` (distance, id) pairs, closest first.
+        """
+        links = self._links[level]
+        visited = set(entry_points)
+        distances = self._distances(query, entry_points)
+        candidates = [(float(d), i) for d, i in zip(distances, entry_points)]
+        heapq.heapify(candidates)
+        # Max-heap (negated distances) of the best `ef` found so far
+        best = [(-d, i) for d, i in candidates]
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -best[0][0] and len(best) >= ef:
+                break
+            neighbours = [n for n in links.get(node, ()) if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for d, n in zip(self._distances(query, neighbours), neighbours):
+                d = float(d)
+                if len(best) < ef or d < -best[0][0]:
+                    heapq.heappush(candidates, (d, n))
+                    heapq.heappush(best, (-d, n))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted((-d, i) for d, i in best)
+
+    def _select_neighbours(self, candidates: List[Tuple[float, int]], max_links: int) -> List[int]:
+        """
+        Heuristic neighbour selection: a candidate is kept only if it is closer to the new
+        node than to every neighbour kept so far, so links spread out across clusters
+        instead of all pointing into the nearest one. Free slots are filled with the
+        closest discarded candidates.
+        """
+        selected, discarded = [], []
+        for distance, candidate in candidates:
+            if len(selected) >= max_links:
+                break
+            if not selected or distance < float(np.min(self._distances(self.vectors[candidate], selected))):
+                selected.append(candidate)
+            else:
+                discarded.append(candidate)
+        return selected + discarded[:max_links - len(selected)]
+
+    def _link(self, node: int, found: List[Tuple[float, int]], level: int):
+        links = self._links[level]
+        max_links = self.m0 if level == 0 else self.m
+        links[node] = self._select_neighbours(found, max_links)
+        for n in links[node]:
+            n_links = links.setdefault(n, [])
+            n_links.append(node)
+            if len(n_links) > max_links:
+                distances = self._distances(self.vectors[n], n_links)
+                order = np.argsort(distances)
+                links[n] = self._select_neighbours([(float(distances[i]), n_links[i]) for i in order], max_links)
+
+    def _insert(self, node: int):
+        query = self.vectors[node]
+        level = int(-math.log(1.0 - self._random.random()) * self._level_mult)
+        while len(self._links) <= level:
+            self._links.append({})
+
+        if self._entry is None:
+            for l in range(level + 1):
+                self._links[l][node] = []
+            self._entry = node
+            return
+
+        entry = [self._entry]
+        top_level = max(l for l in range(len(self._links)) if self._entry in self._links[l])
+        for l in range(top_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, l)[0][1]]
+        for l in range(min(level, top_level), -1, -1):
+            found = self._search_layer(query, entry, self.ef_construction, l)
+            self._link(node, found, l)
+            entry = [i for _, i in found]
+        for l in range(top_level + 1, level + 1):
+            self._links[l][node] = []
+        if level > top_level:
+            self._entry = node
+
+    def add(self, vectors: np.ndarray) -> range:
+        """
+        Normalizes and inserts `vectors`; returns their ids.
+        """
+        vectors = normalize(np.atleast_2d(vectors))
+        start = self._size
+        self.vectors = np.vstack([self.vectors[:self._size], vectors])
+        self._size += len(vectors)
+        for node in range(start, self._size):
+            self._insert(node)
+        return range(start, self._size)
+
+    def search(self, query: np.ndarray, k: int = 50, exhaustive: bool = False,
+               ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the ids and cosine similarities of the k nearest vectors, best first.
+        """
+        if self._size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(query)
+        k = min(k, self._size)
+
+        if exhaustive:
+            self.distance_evaluations += self._size
+            scores = self.vectors[:self._size] @ query
+            ids = np.argpartition(-scores, k - 1)[:k]
+            ids = ids[np.argsort(-scores[ids])]
+            return ids, scores[ids]
+
+        entry = [self._entry]
+        for l in range(len(self._links) - 1, 0, -1):
+            entry = [self._search_layer(query, entry, 1, l)[0][1]]
+        found = self._search_layer(query, entry, max(ef_search or self.ef_search, k), 0)[:k]
+        ids = np.array([i for _, i in found], dtype=np.int64)
+        return ids, 1.0 - np.array([d for d, _ in found], dtype=np.float32)
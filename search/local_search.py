@@ -0,0 +1,493 @@
+# search/local_search.py
+"""
+In-process stand-in for the Azure AI Search index, for offline development and load tests.
+
+LocalSearchClient implements the part of SearchClient.search the app uses:
+    search_text     BM25 over per-field inverted indexes ("*" matches everything); with
+                    query_type="full", fielded clauses `field:(a OR "b c"~10)^3` are scored on
+                    that field with the boost, other Lucene syntax is ignored
+    vector_queries  VectorizedQuery (the vector is used as is) and VectorizableTextQuery (the
+                    text is embedded with the client's embedder; without one the leg is skipped),
+                    exact cosine kNN over a float32 matrix per vector field
+    filter          OData subset: and/or/not, parentheses, eq/ne/gt/ge/lt/le, search.ismatch,
+                    search.in and `field/any(x: x eq 'v')`; applied before both legs
+    top, skip, select
+Text and vector rankings are fused with reciprocal rank fusion (k=60) as in hybrid search.
+Semantic ranking and scoring profiles are not emulated.
+
+A catalog snapshot is a JSON-lines (or JSON array) file of index documents, optionally with
+their titleVector/descriptionVector/brandVector fields. Take one from the live index with:
+
+    python -m search.local_search snapshot catalog.jsonl
+"""
+import re
+import json
+import math
+import time
+import operator
+import argparse
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from rich.console import Console
+
+console = Console()
+
+
+SEARCHABLE_FIELDS = ["title", "brand", "description", "categories"]
+VECTOR_FIELDS = ["titleVector", "descriptionVector", "brandVector"]
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+FILTER_CACHE_SIZE = 1024
+
+_TOKEN = re.compile(r"\w+")
+_FIELDED_CLAUSE = re.compile(r"(\w+):\((.*?)\)(?:\^([\d.]+))?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(str(text).lower())
+
+
+class FieldIndex:
+    """
+    Inverted index of one text field with precomputed BM25 weights per posting.
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self.num_docs = len(texts)
+        term_freqs = defaultdict(dict)
+        lengths = np.zeros(self.num_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                term_freqs[token][doc_id] = term_freqs[token].get(doc_id, 0) + 1
+
+        avg_length = float(lengths.mean()) if self.num_docs and lengths.mean() > 0 else 1.0
+        self.postings = {}
+        for term, docs in term_freqs.items():
+            ids = np.fromiter(docs.keys(), dtype=np.int64, count=len(docs))
+            tf = np.fromiter(docs.values(), dtype=np.float32, count=len(docs))
+            idf = math.log(1 + (self.num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / avg_length)
+            self.postings[term] = (ids, (idf * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32))
+
+    def score(self, terms: Sequence[str], scores: np.ndarray, boost: float = 1.0):
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += boost * posting[1]
+
+    def match_all(self, terms: Sequence[str]) -> np.ndarray:
+        mask = np.ones(self.num_docs, dtype=bool)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                return np.zeros(self.num_docs, dtype=bool)
+            term_mask = np.zeros(self.num_docs, dtype=bool)
+            term_mask[posting[0]] = True
+            mask &= term_mask
+        return mask
+
+
+def _lucene_groups(query: str) -> List[List[str]]:
+    """
+    Splits a Lucene query into term groups: a quoted phrase is one group (all its words
+    must match, proximity is ignored), every other word is a group of its own.
+    """
+    groups = [tokenize(phrase) for phrase in re.findall(r'"((?:[^"\\]|\\.)*)"', query)]
+    rest = re.sub(r'"(?:[^"\\]|\\.)*"(?:~\d+)?', " ", query)
+    groups += [[t] for t in tokenize(re.sub(r"\b(?:AND|OR|NOT)\b", " ", rest))]
+    return [g for g in groups if g]
+
+
+def _query_param(query, key: str, attribute: str):
+    """
+    Reads a vector query parameter. SDK models are read through their mapping interface
+    (REST names), since attribute access re-serializes values such as the vector.
+    """
+    if hasattr(query, "keys"):
+        return query.get(key)
+    return getattr(query, attribute, None)
+
+
+# OData filter subset
+
+_ODATA_TOKEN = re.compile(r"\s*(?:('(?:[^']|'')*')|(-?\d+(?:\.\d+)?)|([A-Za-z_][\w./]*)|(\(|\)|,|:))")
+
+
+class FilterParser:
+    """
+    Recursive-descent parser that evaluates an OData filter to a boolean mask.
+    """
+
+    def __init__(self, engine: "LocalSearchClient", expr: str):
+        self.engine = engine
+        self.tokens = []
+        pos = 0
+        expr = expr.strip()
+        while pos < len(expr):
+            match = _ODATA_TOKEN.match(expr, pos)
+            if not match or match.end() == pos:
+                raise ValueError(f"Invalid filter near: {expr[pos:pos + 30]!r}")
+            string, number, name, punct = match.groups()
+            if string is not None:
+                self.tokens.append(("str", string[1:-1].replace("''", "'")))
+            elif number is not None:
+                self.tokens.append(("num", float(number)))
+            elif name is not None:
+                self.tokens.append(("name", name))
+            else:
+                self.tokens.append(("punct", punct))
+            pos = match.end()
+            while pos < len(expr) and expr[pos].isspace():
+                pos += 1
+        self.pos = 0
+
+    def _peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if (kind is None or token[0] == kind) and (value is None or str(token[1]).lower() == value):
+            return token
+        return None
+
+    def _take(self, kind=None, value=None):
+        token = self._peek(kind, value)
+        if token is None:
+            found = self.tokens[self.pos] if self.pos < len(self.tokens) else "end of filter"
+            raise ValueError(f"Invalid filter: expected {value or kind or 'a value'}, found {found}")
+        self.pos += 1
+        return token
+
+    def parse(self) -> np.ndarray:
+        mask = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Invalid filter: unexpected {self.tokens[self.pos]}")
+        return mask
+
+    def _or(self):
+        mask = self._and()
+        while self._peek("name", "or"):
+            self.pos += 1
+            mask = mask | self._and()
+        return mask
+
+    def _and(self):
+        mask = self._not()
+        while self._peek("name", "and"):
+            self.pos += 1
+            mask = mask & self._not()
+        return mask
+
+    def _not(self):
+        if self._peek("name", "not"):
+            self.pos += 1
+            return ~self._not()
+        return self._primary()
+
+    def _literal(self):
+        kind, value = self._take()
+        if kind in ("str", "num"):
+            return value
+        if kind == "name" and value.lower() in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[value.lower()]
+        raise ValueError(f"Invalid filter: expected a literal, found {value!r}")
+
+    def _arguments(self):
+        self._take("punct", "(")
+        args = [self._literal_or_name()]
+        while self._peek("punct", ","):
+            self.pos += 1
+            args.append(self._literal_or_name())
+        self._take("punct", ")")
+        return args
+
+    def _literal_or_name(self):
+        token = self._peek("name")
+        if token is not None and token[1].lower() not in ("true", "false", "null"):
+            self.pos += 1
+            return token[1]
+        return self._literal()
+
+    def _primary(self):
+        if self._peek("punct", "("):
+            self.pos += 1
+            mask = self._or()
+            self._take("punct", ")")
+            return mask
+
+        name = self._take("name")[1]
+        if name.lower() == "search.ismatch":
+            args = self._arguments()
+            fields = args[1].split(",") if len(args) > 1 and args[1] else SEARCHABLE_FIELDS
+            mode = args[3] if len(args) > 3 else "any"
+            return self.engine.match(args[0], [f.strip() for f in fields], mode)
+        if name.lower() == "search.in":
+            args = self._arguments()
+            separator = args[2] if len(args) > 2 else None
+            values = [v.strip() for v in (args[1].split(separator) if separator else re.split(r"[ ,]", args[1])) if v.strip()]
+            return self.engine.compare(args[0], "in", values)
+        if "/" in name and self._peek("punct", "("):
+            # Collection lambda: field/any(x: x eq 'value')
+            field, quantifier = name.rsplit("/", 1)
+            self._take("punct", "(")
+            variable = self._take("name")[1]
+            self._take("punct", ":")
+            if self._take("name")[1] != variable:
+                raise ValueError("Invalid filter: only `x op literal` is supported inside any/all")
+            op = self._take("name")[1].lower()
+            value = self._literal()
+            self._take("punct", ")")
+            return self.engine.compare(field, f"{quantifier.lower()}:{op}", value)
+
+        op = self._take("name")[1].lower()
+        if op not in ("eq", "ne", "gt", "ge", "lt", "le"):
+            raise ValueError(f"Invalid filter: unsupported operator {op!r}")
+        return self.engine.compare(name, op, self._literal())
+
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "ge": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "le": lambda a, b: a is not None and a <= b,
+}
+_ARRAY_OPERATORS = {"eq": operator.eq, "ne": operator.ne, "gt": operator.gt, "ge": operator.ge, "lt": operator.lt, "le": operator.le}
+
+
+class LocalSearchClient:
+    """
+    Serves `search` from documents held in memory. Use `from_catalog` to load a snapshot.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], vectors: Optional[Dict[str, np.ndarray]] = None,
+                 embedder: Optional[Callable[[str], Sequence[float]]] = None):
+        self.documents = documents
+        self.embedder = embedder
+        self.fields = {field: FieldIndex([self._text(doc.get(field)) for doc in documents]) for field in SEARCHABLE_FIELDS}
+        self.vectors = {}
+        for field, matrix in (vectors or {}).items():
+            matrix = np.asarray(matrix, dtype=np.float32)
+            self.vectors[field] = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self._columns: Dict[str, Any] = {}
+        # Evaluated filters, as load tests and phase1 repeat the same expressions
+        self._filter_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._filter_lock = threading.Lock()
+        self._warned = set()
+
+    @classmethod
+    def from_catalog(cls, path: str, embedder: Optional[Callable[[str], Sequence[float]]] = None) -> "LocalSearchClient":
+        start = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                documents = json.load(f)
+            else:
+                documents = [json.loads(line) for line in f if line.strip()]
+
+        vectors = {}
+        for field in VECTOR_FIELDS:
+            rows = [doc.pop(field, None) for doc in documents]
+            dims = next((len(r) for r in rows if r), 0)
+            if dims:
+                vectors[field] = np.array([r if r else np.zeros(dims) for r in rows], dtype=np.float32)
+        client = cls(documents, vectors, embedder)
+        console.log(f"Local search: {len(documents)} documents, vector fields {sorted(vectors) or 'none'} loaded from {path} in {time.perf_counter() - start:.1f}s")
+        return client
+
+    @staticmethod
+    def _text(value) -> str:
+        return " ".join(map(str, value)) if isinstance(value, list) else str(value or "")
+
+    def get_document_count(self) -> int:
+        return len(self.documents)
+
+    # Filters
+
+    def _column(self, field: str):
+        """
+        Values of a field across documents: a float64 array (NaN for missing) if all are
+        numbers, otherwise a list.
+        """
+        column = self._columns.get(field)
+        if column is None:
+            column = [doc.get(field) for doc in self.documents]
+            if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in column):
+                column = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+            self._columns[field] = column
+        return column
+
+    def compare(self, field: str, op: str, value) -> np.ndarray:
+        column = self._column(field)
+        if isinstance(column, np.ndarray) and op in _ARRAY_OPERATORS:
+            if value is None:
+                return np.isnan(column) if op == "eq" else ~np.isnan(column)
+            if isinstance(value, (int, float)):
+                # NaN (missing) compares false, except for ne
+                return _ARRAY_OPERATORS[op](column, value)
+            column = [None if np.isnan(v) else v for v in column]
+        if op == "in":
+            values = set(value)
+            return np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+        if ":" in op:
+            quantifier, op = op.split(":")
+            test = _OPERATORS[op]
+            combine = any if quantifier == "any" else all
+            return np.fromiter((combine(test(item, value) for item in (v or [])) for v in column), dtype=bool, count=len(column))
+        test = _OPERATORS[op]
+        return np.fromiter((test(v, value) for v in column), dtype=bool, count=len(column))
+
+    def _filter_mask(self, expr: str) -> np.ndarray:
+        with self._filter_lock:
+            mask = self._filter_cache.get(expr)
+            if mask is not None:
+                self._filter_cache.move_to_end(expr)
+                return mask
+        mask = FilterParser(self, expr).parse()
+        mask.flags.writeable = False
+        with self._filter_lock:
+            self._filter_cache[expr] = mask
+            while len(self._filter_cache) > FILTER_CACHE_SIZE:
+                self._filter_cache.popitem(last=False)
+        return mask
+
+    def match(self, query: str, fields: Sequence[str], mode: str = "any") -> np.ndarray:
+        groups = _lucene_groups(query)
+        mask = np.zeros(len(self.documents), dtype=bool) if mode == "any" else np.ones(len(self.documents), dtype=bool)
+        for group in groups:
+            group_mask = np.zeros(len(self.documents), dtype=bool)
+            for field in fields:
+                if field not in self.fields:
+                    raise ValueError(f"Invalid filter: field {field!r} is not searchable")
+                group_mask |= self.fields[field].match_all(group)
+            mask = mask | group_mask if mode == "any" else mask & group_mask
+        return mask
+
+    # Ranking legs
+
+    def _text_scores(self, search_text: Optional[str], query_type) -> Optional[np.ndarray]:
+        if not search_text or search_text.strip() == "*":
+            return None
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        if str(query_type).lower().endswith("full"):
+            for field, clause, boost in _FIELDED_CLAUSE.findall(search_text):
+                if field in self.fields:
+                    self.fields[field].score([t for g in _lucene_groups(clause) for t in g], scores, float(boost or 1.0))
+            search_text = _FIELDED_CLAUSE.sub(" ", search_text)
+            terms = [t for g in _lucene_groups(search_text.replace("\\", "")) for t in g]
+        else:
+            terms = tokenize(search_text)
+        for index in self.fields.values():
+            index.score(terms, scores)
+        return scores
+
+    def _query_vector(self, query) -> Optional[np.ndarray]:
+        vector = _query_param(query, "vector", "vector")
+        if vector is None:
+            text = _query_param(query, "text", "text")
+            if text is None or self.embedder is None:
+                if "embed" not in self._warned:
+                    console.log("[yellow]Local search: no embedder configured, skipping text vector queries[/yellow]")
+                    self._warned.add("embed")
+                return None
+            vector = self.embedder(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _vector_rankings(self, vector_queries, mask: Optional[np.ndarray]) -> List[np.ndarray]:
+        rankings = []
+        for query in vector_queries or []:
+            vector = self._query_vector(query)
+            if vector is None:
+                continue
+            k = _query_param(query, "k", "k_nearest_neighbors") or 50
+            for field in str(_query_param(query, "fields", "fields")).split(","):
+                matrix = self.vectors.get(field.strip())
+                if matrix is None or matrix.shape[1] != len(vector):
+                    continue
+                scores = matrix @ vector
+                if mask is not None:
+                    scores[~mask] = -np.inf
+                candidates = min(k, int(np.isfinite(scores).sum()))
+                if candidates == 0:
+                    continue
+                ids = np.argpartition(-scores, candidates - 1)[:candidates]
+                rankings.append(ids[np.argsort(-scores[ids])])
+        return rankings
+
+    def search(self, search_text: Optional[str] = None, vector_queries=None, filter: Optional[str] = None,
+               top: Optional[int] = 50, skip: int = 0, select: Optional[Sequence[str]] = None,
+               query_type=None, **kwargs) -> Iterator[Dict[str, Any]]:
+        top = 50 if top is None else top
+        mask = self._filter_mask(filter) if filter else None
+
+        text_scores = self._text_scores(search_text, query_type)
+        text_ranking = None
+        if text_scores is not None:
+            if mask is not None:
+                text_scores[~mask] = 0.0
+            matched = np.flatnonzero(text_scores > 0)
+            text_ranking = matched[np.argsort(-text_scores[matched], kind="stable")]
+        elif not vector_queries:
+            text_ranking = np.flatnonzero(mask) if mask is not None else np.arange(len(self.documents))
+
+        vector_rankings = self._vector_rankings(vector_queries, mask)
+        if not vector_rankings:
+            ranking = text_ranking if text_ranking is not None else np.empty(0, dtype=np.int64)
+            scores = text_scores if text_scores is not None else np.ones(len(self.documents), dtype=np.float32)
+        else:
+            # Reciprocal rank fusion; like the service, the text leg contributes its top `max(top, 50)`
+            fused = defaultdict(float)
+            legs = vector_rankings + ([text_ranking[:max(top + skip, 50)]] if text_ranking is not None else [])
+            for leg in legs:
+                for rank, doc_id in enumerate(leg.tolist()):
+                    fused[doc_id] += 1.0 / (RRF_K + rank + 1)
+            ranking = np.array(sorted(fused, key=fused.get, reverse=True), dtype=np.int64)
+            scores = fused
+
+        for doc_id in ranking[skip:skip + top].tolist():
+            doc = self.documents[doc_id]
+            result = {k: doc.get(k) for k in select} if select else dict(doc)
+            result["@search.score"] = float(scores[doc_id])
+            yield result
+
+
+def snapshot(path: str):
+    """
+    Writes every document of the configured Azure Search index, vectors included, to `path`.
+    """
+    from azure.search.documents import SearchClient
+    from search.config import search_endpoint, index_name, credential
+
+    client = SearchClient(endpoint=search_endpoint, index_name=index_name, credential=credential)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in client.search(search_text="*", include_total_count=True):
+            f.write(json.dumps({k: v for k, v in doc.items() if not k.startswith("@")}) + "\n")
+            count += 1
+    console.log(f"Wrote {count} documents of {index_name} to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subparsers.add_parser("snapshot", help="export the live index to a JSON-lines catalog")
+    snapshot_parser.add_argument("path")
+    query_parser = subparsers.add_parser("query", help="run a text query against a catalog snapshot")
+    query_parser.add_argument("catalog")
+    query_parser.add_argument("text")
+    query_parser.add_argument("--filter", default=None)
+    query_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        snapshot(args.path)
+    else:
+        client = LocalSearchClient.from_catalog(args.catalog)
+        for doc in client.search(search_text=args.text, filter=args.filter, top=args.top, select=["id", "title", "brand"]):
+            print(f"{doc['@search.score']:8.3f}  {doc['id']}  {doc['title']}  ({doc['brand']})")
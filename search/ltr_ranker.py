@@ -0,0 +1,383 @@
+# search/ltr_ranker.py
+"""
+Learning-to-rank distilled from the phase2 recommender: a linear ranking model trained
+offline on logged LLM orderings, which ranks phase1 candidates in about a millisecond
+without an LLM call.
+
+Logging: with LTR_LOG_PATH set, every phase2_recommender ordering is appended (off the
+request path) as one JSON line:
+    query, expanded_terms, profile digest, candidates (id, name, brand, description,
+    price, in phase1 order), llm_order (the recommended ids, best first), model
+
+Training and evaluation:
+
+    python -m search.ltr_ranker train [--logs ltr_logs.jsonl] [--model ltr_model.json] [--holdout 0.2]
+    python -m search.ltr_ranker evaluate [--logs ltr_logs.jsonl] [--model ltr_model.json] [--holdout 0.2]
+
+Each candidate is described by the features in FEATURE_NAMES (phase1 position, query and
+expansion term overlap, brand affinity, price against the customer's price bands, overlap
+with recent items and interests). Its label is its place in the LLM order (1 for the
+first recommended product, falling linearly; 0 if not recommended). The model is a
+pairwise logistic (RankNet-style) linear scorer fitted with Newton's method; the last
+--holdout share of the logs (by time) is kept out of training and the agreement with
+the LLM on it is reported as NDCG@5/@10, next to that of the phase1 order.
+
+Serving: with PHASE2_RANKER=ltr (or phase2_ranker="ltr" on /api/search), phase2 ranks
+the candidates with the model instead of calling the LLM, and recommends the top
+LTR_RECOMMENDED of them. Without a model file the LLM is used.
+
+Configuration (environment variables):
+    LTR_LOG_PATH        JSON lines file the LLM orderings are appended to (default: unset, no logging)
+    LTR_MODEL_PATH      trained model (default ltr_model.json); reloaded when the file changes
+    LTR_RECOMMENDED     products the model recommends per search (default 10)
+"""
+import os
+import re
+import json
+import math
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from rich.console import Console
+
+from utils.profile_digest import build_profile_digest
+
+console = Console()
+
+
+LTR_LOG_PATH = os.getenv("LTR_LOG_PATH", "")
+LTR_MODEL_PATH = os.getenv("LTR_MODEL_PATH", "ltr_model.json")
+LTR_RECOMMENDED = int(os.getenv("LTR_RECOMMENDED", 10))
+
+MODEL_VERSION = 1
+FEATURE_NAMES = [
+    "phase1_position",
+    "phase1_reciprocal_rank",
+    "query_name_overlap",
+    "query_description_overlap",
+    "expansion_overlap",
+    "brand_affinity",
+    "brand_in_query",
+    "price_log_ratio_median",
+    "price_abs_log_ratio_median",
+    "price_in_band",
+    "price_above_max",
+    "price_candidate_percentile",
+    "recent_items_overlap",
+    "interest_overlap",
+]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: Any) -> set:
+    return set(_TOKEN.findall(str(text or "").lower()))
+
+
+def _overlap(terms: set, text_tokens: set) -> float:
+    return len(terms & text_tokens) / len(terms) if terms else 0.0
+
+
+def candidate_features(query: str, digest: Dict[str, Any], expanded_terms: Sequence[str],
+                       candidates: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Feature matrix (one row per candidate, columns as FEATURE_NAMES) of the phase1
+    candidates, in phase1 order, for a query and a customer's profile digest.
+    """
+    n = len(candidates)
+    features = np.zeros((n, len(FEATURE_NAMES)))
+    if n == 0:
+        return features
+
+    query_lower = (query or "").lower()
+    query_tokens = _tokens(query)
+    expansion_tokens = set().union(*(_tokens(t) for t in expanded_terms)) if expanded_terms else set()
+    affinities = {str(b).lower(): float(s) for b, s in (digest.get("brand_affinities") or {}).items()}
+    bands = digest.get("price_bands") or {}
+    recent_tokens = set().union(*(_tokens(i) for i in digest.get("recent_items") or [])) if digest.get("recent_items") else set()
+    interests = list((digest.get("behavior") or {}).get("preferred_product_types") or []) + list(digest.get("interests") or [])
+    interest_tokens = set().union(*(_tokens(i) for i in interests)) if interests else set()
+
+    prices = np.array([float(c.get("price") or 0) for c in candidates])
+    order = np.argsort(prices, kind="stable")
+    percentile = np.empty(n)
+    percentile[order] = np.arange(n) / max(n - 1, 1)
+    median = float(bands.get("median") or 0)
+
+    for i, candidate in enumerate(candidates):
+        name_tokens = _tokens(candidate.get("name"))
+        description_tokens = _tokens(candidate.get("description"))
+        brand = str(candidate.get("brand") or "").strip().lower()
+        price = prices[i]
+        log_ratio = math.log(price / median) if price > 0 and median > 0 else 0.0
+        features[i] = (
+            i / n,
+            1.0 / (1 + i),
+            _overlap(query_tokens, name_tokens),
+            _overlap(query_tokens, description_tokens),
+            _overlap(expansion_tokens, name_tokens | description_tokens),
+            affinities.get(brand, 0.0),
+            1.0 if brand and brand in query_lower else 0.0,
+            log_ratio,
+            abs(log_ratio),
+            1.0 if bands and float(bands.get("p25", 0)) <= price <= float(bands.get("p75", 0)) else 0.0,
+            1.0 if bands and price > float(bands.get("max", 0)) else 0.0,
+            percentile[i],
+            _overlap(name_tokens, recent_tokens),
+            _overlap(name_tokens, interest_tokens),
+        )
+    return features
+
+
+def relevance_labels(candidates: List[Dict[str, Any]], llm_order: List[str]) -> np.ndarray:
+    """
+    Graded relevance of each candidate from the LLM order: 1 for the first recommended
+    product, falling linearly to 1/len(llm_order) for the last, 0 if not recommended.
+    """
+    grade = {pid: (len(llm_order) - r) / len(llm_order) for r, pid in enumerate(llm_order)}
+    return np.array([grade.get(c.get("id"), 0.0) for c in candidates])
+
+
+def ndcg_at_k(labels: np.ndarray, order: np.ndarray, k: int) -> Optional[float]:
+    """
+    NDCG@k of ranking `order` (candidate indices, best first) against graded `labels`;
+    None when no candidate is relevant.
+    """
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = np.sort(labels)[::-1][:k]
+    ideal_dcg = float((ideal * discounts[:len(ideal)]).sum())
+    if ideal_dcg <= 0:
+        return None
+    gains = labels[order][:k]
+    return float((gains * discounts[:len(gains)]).sum()) / ideal_dcg
+
+
+class LtrModel:
+    """
+    Linear scorer over standardized features: score = ((x - mean) / std) . weights.
+    """
+
+    def __init__(self, weights: np.ndarray, mean: np.ndarray, std: np.ndarray, metadata: Dict[str, Any] = None):
+        self.weights = np.asarray(weights, dtype=float)
+        self.mean = np.asarray(mean, dtype=float)
+        self.std = np.asarray(std, dtype=float)
+        self.metadata = metadata or {}
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return ((features - self.mean) / self.std) @ self.weights
+
+    def rank(self, query: str, digest: Dict[str, Any], expanded_terms: Sequence[str],
+             candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        The candidates ordered by model score; ties keep the phase1 order.
+        """
+        scores = self.score(candidate_features(query, digest, expanded_terms, candidates))
+        return [candidates[i] for i in np.argsort(-scores, kind="stable")]
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MODEL_VERSION, "features": FEATURE_NAMES, "weights": self.weights.tolist(),
+                       "mean": self.mean.tolist(), "std": self.std.tolist(), "metadata": self.metadata}, f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LtrModel":
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("version") != MODEL_VERSION or stored.get("features") != FEATURE_NAMES:
+            raise ValueError(f"{path} was trained with other features (version {stored.get('version')})")
+        return cls(stored["weights"], stored["mean"], stored["std"], stored.get("metadata"))
+
+
+# ----- logging -----
+
+_log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ltr-log")
+
+
+def _write_log_record(path: str, record: Dict[str, Any]):
+    try:
+        if record["digest"] is None:
+            record["digest"] = build_profile_digest(record.pop("profile"))
+        else:
+            record.pop("profile")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        console.log(f"[yellow]Could not log the recommender ordering: {e}[/yellow]")
+
+
+def log_recommendation(query: str, customer_profile: dict, digest: Optional[dict], expansion_result: dict,
+                       llm_order: List[str], model_name: str):
+    """
+    Queues a phase2 recommender ordering for the LTR log (no-op without LTR_LOG_PATH).
+    """
+    if not LTR_LOG_PATH:
+        return
+    record = {
+        "ts": time.time(),
+        "query": query,
+        "expanded_terms": list(expansion_result.get("expanded_terms", [])),
+        "digest": digest,
+        "profile": customer_profile,
+        "candidates": [{k: c.get(k) for k in ("id", "name", "brand", "description", "price")}
+                       for c in expansion_result.get("search_results", [])],
+        "llm_order": list(llm_order),
+        "model": model_name,
+    }
+    _log_executor.submit(_write_log_record, LTR_LOG_PATH, record)
+
+
+def read_logs(path: str) -> List[Dict[str, Any]]:
+    """
+    Logged orderings with at least one recommended candidate, oldest first.
+    """
+    logs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            ids = {c.get("id") for c in record.get("candidates", [])}
+            if any(pid in ids for pid in record.get("llm_order", [])):
+                logs.append(record)
+    return sorted(logs, key=lambda r: r.get("ts", 0))
+
+
+def _log_features(record: Dict[str, Any]) -> np.ndarray:
+    return candidate_features(record["query"], record.get("digest") or {}, record.get("expanded_terms", []), record["candidates"])
+
+
+# ----- training and evaluation -----
+
+def fit_pairwise(logs: List[Dict[str, Any]], l2: float = 1e-3, iterations: int = 25) -> LtrModel:
+    """
+    Fits a linear scorer on every (more relevant, less relevant) candidate pair of each
+    log by minimizing the pairwise logistic loss with Newton's method.
+    """
+    matrices = [(_log_features(r), relevance_labels(r["candidates"], r["llm_order"])) for r in logs]
+    rows = np.vstack([x for x, _ in matrices])
+    mean = rows.mean(axis=0)
+    std = rows.std(axis=0)
+    std[std < 1e-9] = 1.0
+
+    differences = []
+    for x, labels in matrices:
+        z = (x - mean) / std
+        better, worse = np.nonzero(labels[:, None] > labels[None, :])
+        differences.append(z[better] - z[worse])
+    d = np.vstack(differences)
+    if len(d) == 0:
+        raise ValueError("no candidate pairs to train on")
+
+    weights = np.zeros(d.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(d @ weights)))
+        gradient = -d.T @ (1.0 - p) / len(d) + 2 * l2 * weights
+        hessian = (d * (p * (1.0 - p))[:, None]).T @ d / len(d) + 2 * l2 * np.eye(d.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return LtrModel(weights, mean, std, {"pairs": int(len(d)), "logs": len(logs), "l2": l2})
+
+
+def evaluate(model: LtrModel, logs: List[Dict[str, Any]], ks: Sequence[int] = (5, 10)) -> Dict[str, float]:
+    """
+    Mean NDCG@k against the LLM order of the model's ranking and of the phase1 order,
+    and how often both put the same product first.
+    """
+    scores = {f"{name}_ndcg@{k}": [] for name in ("model", "phase1") for k in ks}
+    top1 = []
+    for record in logs:
+        labels = relevance_labels(record["candidates"], record["llm_order"])
+        model_order = np.argsort(-model.score(_log_features(record)), kind="stable")
+        phase1_order = np.arange(len(labels))
+        for k in ks:
+            for name, order in (("model", model_order), ("phase1", phase1_order)):
+                value = ndcg_at_k(labels, order, k)
+                if value is not None:
+                    scores[f"{name}_ndcg@{k}"].append(value)
+        top1.append(labels[model_order[0]] == labels.max())
+    result = {name: round(float(np.mean(values)), 4) if values else None for name, values in scores.items()}
+    result["model_top1_agreement"] = round(float(np.mean(top1)), 4) if top1 else None
+    result["logs"] = len(logs)
+    return result
+
+
+def split_logs(logs: List[Dict[str, Any]], holdout: float):
+    """
+    (training, held-out) logs: the newest `holdout` share is held out.
+    """
+    split = len(logs) - int(round(len(logs) * holdout)) if len(logs) > 1 else len(logs)
+    return logs[:split], logs[split:]
+
+
+def train(log_path: str, model_path: str, holdout: float = 0.2, l2: float = 1e-3) -> Dict[str, Any]:
+    training, held_out = split_logs(read_logs(log_path), holdout)
+    if not training:
+        raise ValueError(f"no usable logs in {log_path}")
+    model = fit_pairwise(training, l2=l2)
+    model.metadata["trained"] = time.time()
+    if held_out:
+        model.metadata["holdout"] = evaluate(model, held_out)
+    model.save(model_path)
+    return model.metadata
+
+
+# ----- serving -----
+
+_model: Optional[LtrModel] = None
+_model_mtime: Optional[int] = None
+_model_lock = threading.Lock()
+
+
+def get_ltr_model() -> Optional[LtrModel]:
+    """
+    The model at LTR_MODEL_PATH (reloaded when the file changes), or None if there is
+    no usable model.
+    """
+    global _model, _model_mtime
+    try:
+        mtime = os.stat(LTR_MODEL_PATH).st_mtime_ns
+    except OSError:
+        return None
+    if mtime != _model_mtime:
+        with _model_lock:
+            if mtime != _model_mtime:
+                try:
+                    _model = LtrModel.load(LTR_MODEL_PATH)
+                except (OSError, ValueError, KeyError) as e:
+                    console.log(f"[yellow]Could not load LTR model {LTR_MODEL_PATH}: {e}[/yellow]")
+                    _model = None
+                _model_mtime = mtime
+    return _model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--logs", default=LTR_LOG_PATH or "ltr_logs.jsonl")
+    parser.add_argument("--model", default=LTR_MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of the newest logs held out for evaluation")
+    parser.add_argument("--l2", type=float, default=1e-3, help="L2 regularization of the weights")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        start = time.perf_counter()
+        metadata = train(args.logs, args.model, holdout=args.holdout, l2=args.l2)
+        console.log(f"Trained on {metadata['logs']} logs ({metadata['pairs']} pairs) in {time.perf_counter() - start:.1f}s, "
+                    f"saved to {args.model}")
+        if "holdout" in metadata:
+            console.log("Held-out agreement with the LLM:", metadata["holdout"])
+    else:
+        _, held_out = split_logs(read_logs(args.logs), args.holdout)
+        console.log(evaluate(LtrModel.load(args.model), held_out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# search/model_router.py
+"""
+Latency-SLO aware routing of search requests to models.
+
+The router keeps a rolling window of phase1/phase2 latencies and outcomes per route
+(the requested model names, e.g. "o1-high"). Before a search it picks the first route
+of the requested model's fallback ladder whose p90 latency fits the SLO, that is not
+failing and that is not saturated with in-flight requests. After phase1 it checks
+again whether phase2 still fits the remaining time; if not, the interleaved phase1
+results are returned as they are.
+
+Configuration (environment variables):
+    SEARCH_SLO_SECONDS      latency objective for one search_processing call (default 30)
+    ROUTER_WINDOW           samples kept per route and phase (default 50)
+    ROUTER_WINDOW_SECONDS   samples older than this are ignored, so degraded routes are retried (default 600)
+    ROUTER_MAX_INFLIGHT     concurrent searches per route before it counts as saturated (default 8)
+"""
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from rich.console import Console
+
+from search.search_data_models import RouteDecision
+from utils.metrics import counter
+from utils.retry_policy import remaining_time
+
+console = Console()
+
+
+# Cheaper/faster routes to try, in order, when a route would miss the SLO
+FALLBACKS = {
+    "o1-high": ["o1-medium", "o3-mini-medium", "o3-mini-low"],
+    "o1-medium": ["o1-low", "o3-mini-medium", "o3-mini-low"],
+    "o1-low": ["o3-mini-low"],
+    "o1-mini": ["o3-mini-low"],
+    "o3-mini-high": ["o3-mini-medium", "o3-mini-low"],
+    "o3-mini-medium": ["o3-mini-low"],
+    "o3-mini-low": [],
+    "gpt45": ["gpt4o"],
+    "gpt4o": [],
+}
+DEFAULT_ROUTE = "o3-mini-medium"
+
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = 0.5
+
+
+SEARCH_ROUTES = counter(
+    "search_route_total",
+    "Routing decisions, by requested model, routed model and whether phase2 ran.",
+    ("requested", "routed", "phase2")
+)
+
+
+class RouteStats:
+    """
+    Rolling latency and outcome samples of one route, per phase.
+    """
+
+    def __init__(self, window: int, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.samples: Dict[str, deque] = {"phase1": deque(maxlen=window), "phase2": deque(maxlen=window)}
+        self.inflight = 0
+
+    def _recent(self, phase: str) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window_seconds
+        return [s for s in self.samples[phase] if s[0] >= cutoff]
+
+    def record(self, phase: str, seconds: float, ok: bool):
+        self.samples[phase].append((time.monotonic(), seconds, ok))
+
+    def p90(self, phase: str) -> Optional[float]:
+        latencies = [seconds for _, seconds, ok in self._recent(phase) if ok]
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return float(np.percentile(latencies, 90))
+
+    def error_rate(self) -> Optional[float]:
+        outcomes = [ok for phase in self.samples for _, _, ok in self._recent(phase)]
+        if len(outcomes) < MIN_SAMPLES:
+            return None
+        return 1.0 - sum(outcomes) / len(outcomes)
+
+
+class ModelRouter:
+    """
+    Chooses the route of each search and collects the latencies that drive the choice.
+    """
+
+    def __init__(self, slo_seconds: float = 30.0, window: int = 50, window_seconds: float = 600.0, max_inflight: int = 8):
+        self.slo_seconds = slo_seconds
+        self.max_inflight = max_inflight
+        self._window = window
+        self._window_seconds = window_seconds
+        self._stats: Dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, route: str) -> RouteStats:
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = RouteStats(self._window, self._window_seconds)
+            self._stats[route] = stats
+        return stats
+
+    def _budget(self, elapsed: float = 0.0) -> float:
+        """
+        Seconds left of the SLO after `elapsed`, capped by the request deadline. The deadline
+        already counts the time spent so far, so `elapsed` only comes off the SLO.
+        """
+        budget = self.slo_seconds - elapsed
+        request_remaining = remaining_time()
+        if request_remaining is not None:
+            budget = min(budget, request_remaining)
+        return budget
+
+    def _rejection(self, route: str, budget: float) -> Optional[str]:
+        """
+        Returns why a route cannot serve a full search right now, or None if it can.
+        """
+        stats = self._get_stats(route)
+        error_rate = stats.error_rate()
+        if error_rate is not None and error_rate > MAX_ERROR_RATE:
+            return f"{route} error rate {error_rate:.0%}"
+        if stats.inflight >= self.max_inflight:
+            return f"{route} has {stats.inflight} searches in flight"
+        p1, p2 = stats.p90("phase1"), stats.p90("phase2")
+        if p1 is not None and p2 is not None and p1 + p2 > budget:
+            return f"{route} p90 {p1 + p2:.1f}s > {budget:.1f}s"
+        return None
+
+    def choose(self, requested_model: str) -> RouteDecision:
+        requested = requested_model if requested_model in FALLBACKS else DEFAULT_ROUTE
+        ladder = [requested] + FALLBACKS[requested]
+        budget = self._budget()
+
+        reasons = []
+        with self._lock:
+            for route in ladder:
+                rejection = self._rejection(route, budget)
+                if rejection is None:
+                    decision = RouteDecision(requested_model=requested_model, model=route,
+                                             reason="primary" if not reasons else "; ".join(reasons))
+                    break
+                reasons.append(rejection)
+            else:
+                # No route fits with phase2: serve phase1 only from the cheapest healthy route
+                healthy = [r for r in ladder if (self._get_stats(r).error_rate() or 0.0) <= MAX_ERROR_RATE]
+                route = healthy[-1] if healthy else ladder[-1]
+                decision = RouteDecision(requested_model=requested_model, model=route, phase2=False,
+                                         reason="; ".join(reasons) + "; phase2 skipped")
+
+        if decision.model != requested_model or not decision.phase2:
+            console.log(f"Routing {requested_model} -> {decision.model} (phase2={decision.phase2}): {decision.reason}")
+        return decision
+
+    def should_run_phase2(self, decision: RouteDecision, elapsed: float) -> bool:
+        """
+        Re-checks after phase1 whether phase2 still fits into what is left of the SLO.
+        Updates the decision's reason when phase2 is dropped.
+        """
+        if not decision.phase2:
+            return False
+        with self._lock:
+            p2 = self._get_stats(decision.model).p90("phase2")
+        left = self._budget(elapsed)
+        if p2 is not None and p2 > left:
+            decision.phase2 = False
+            reason = f"phase2 skipped: p90 {p2:.1f}s > {max(left, 0.0):.1f}s left"
+            decision.reason = reason if decision.reason == "primary" else f"{decision.reason}; {reason}"
+            console.log(f"Route {decision.model}: {reason}")
+            return False
+        return True
+
+    @contextmanager
+    def track(self, decision: RouteDecision):
+        """
+        Counts the search as in flight on its route for the duration of the block.
+        """
+        with self._lock:
+            self._get_stats(decision.model).inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._get_stats(decision.model).inflight -= 1
+            SEARCH_ROUTES.inc(requested=decision.requested_model, routed=decision.model, phase2=str(decision.phase2).lower())
+
+    def record(self, route: str, phase: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self._get_stats(route).record(phase, seconds, ok)
+
+
+model_router = ModelRouter(
+    slo_seconds=float(os.getenv("SEARCH_SLO_SECONDS", 30)),
+    window=int(os.getenv("ROUTER_WINDOW", 50)),
+    window_seconds=float(os.getenv("ROUTER_WINDOW_SECONDS", 600)),
+    max_inflight=int(os.getenv("ROUTER_MAX_INFLIGHT", 8)),
+)
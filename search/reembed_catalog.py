@@ -0,0 +1,79 @@
+# search/reembed_catalog.py
+"""
+Bulk re-embedding of the product catalog through the embedding service.
+
+Reads the text fields of every document (from the index, or from a JSON-lines file
+of documents), embeds them in full batches with EmbeddingService.embed_many (texts
+already in the embedding cache are not sent again), and merges the new vectors into
+the index.
+
+    python -m search.reembed_catalog [--documents catalog.jsonl] [--model text-embedding-3-small] [--batch-size 256] [--dry-run]
+"""
+import json
+import time
+import argparse
+
+from rich.console import Console
+from azure.search.documents import SearchIndexingBufferedSender
+
+from search.config import search_client, search_endpoint, index_name, credential
+from utils.openai_data_models import EmbeddingModelnfo
+from utils.embedding_service import get_embedding_service
+
+console = Console()
+
+
+# Vector field -> text field it is computed from
+VECTOR_SOURCES = {
+    "titleVector": "title",
+    "descriptionVector": "description",
+    "brandVector": "brand",
+}
+
+
+def read_index_documents():
+    fields = ["id"] + list(VECTOR_SOURCES.values())
+    return list(search_client.search(search_text="*", select=fields))
+
+
+def read_jsonl_documents(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def reembed_documents(documents, service, batch_size=None):
+    """
+    Returns merge actions ({"id", <vector field>: [...]}) for `documents`.
+    """
+    updates = [{"id": doc["id"]} for doc in documents]
+    for vector_field, text_field in VECTOR_SOURCES.items():
+        texts = [str(doc.get(text_field) or "") for doc in documents]
+        vectors = service.embed_many(texts, batch_size=batch_size)
+        for update, vector in zip(updates, vectors):
+            update[vector_field] = vector.tolist()
+    return updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", help="JSON-lines file of documents; default: read them from the index")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="embed only, do not update the index")
+    args = parser.parse_args()
+
+    documents = read_jsonl_documents(args.documents) if args.documents else read_index_documents()
+    service = get_embedding_service(EmbeddingModelnfo(model_name=args.model))
+
+    start = time.perf_counter()
+    updates = reembed_documents(documents, service, batch_size=args.batch_size)
+    console.log(f"Embedded {len(updates)} documents x {len(VECTOR_SOURCES)} fields in {time.perf_counter() - start:.1f}s")
+
+    if not args.dry_run:
+        with SearchIndexingBufferedSender(endpoint=search_endpoint, index_name=index_name, credential=credential) as sender:
+            sender.merge_documents(documents=updates)
+        console.log(f"Merged vectors of {len(updates)} documents into {index_name}")
+
+
+if __name__ == "__main__":
+    main()
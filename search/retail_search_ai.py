@@ -1,11 +1,26 @@
 # search/o1_o3.py
+import os
 import json
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from rich.console import Console
 
-from search.config import search_expansion_prompt, recommender_prompt, product_categories
-from search.azure_search import search_products
+from search.config import search_expansion_prompt, recommender_prompt, product_categories, phase1_search_mode, phase1_scoring_profile
+from search.config import expansion_cache_seconds, phase2_pipeline, phase2_pipeline_deadline_ms, phase2_ranker
+from search.azure_search import search_products, boosted_search_products
+from search.model_router import model_router
+from search.filter_builder import build_filter, build_boost_query, FilterValidationError
+from search.ltr_ranker import get_ltr_model, log_recommendation, LTR_RECOMMENDED
 from utils.openai_helpers import call_llm, call_llm_structured_outputs
 from utils.openai_data_models import TextProcessingModelnfo
+from utils.profile_store import profile_prompt_text
+from utils.profile_digest import build_profile_digest
+from utils.metrics import stage_timer, counter, histogram
+from utils.tracing import traced, current_span
 
 import sys
 sys.path.append("../")
@@ -14,36 +29,163 @@ from search.search_data_models import *
 
 console = Console()
 
+SEARCH_FILTER_ERRORS = counter(
+    "search_filter_errors_total",
+    "Phase1 filters that were rejected locally or by Azure Search.",
+    ("stage",)
+)
+EXPANSION_CACHE_LOOKUPS = counter(
+    "query_expansion_cache_total",
+    "Phase1 query expansion cache lookups, by result.",
+    ("result",)
+)
 
-def phase1_discovery(query: str, customer_profile: dict, model_info: TextProcessingModelnfo = TextProcessingModelnfo(model_name="o1", reasoning_efforts="medium")):
+PHASE2_PIPELINE = counter(
+    "phase2_pipeline_total",
+    "Pipelined phase1 searches: filtered leg in before the deadline, phase2 started without it, or no filtered leg.",
+    ("outcome",)
+)
+PHASE2_RANKER = counter(
+    "phase2_ranker_total",
+    "Phase2 orderings by ranker (ltr_unavailable: LTR requested without a usable model, the LLM ranked).",
+    ("ranker",)
+)
+STAGE_OVERLAP_SECONDS = histogram(
+    "search_stage_overlap_seconds",
+    "Time two search stages ran concurrently.",
+    ("stages",)
+)
+
+# Runs the filtered Azure Search leg of pipelined phase1 searches
+_leg_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PHASE1_LEG_WORKERS", 16)), thread_name_prefix="phase1-leg")
+
+EXPANSION_CACHE_SIZE = 1024
+# (model, reasoning effort, normalized query, profile hash) -> (expiry, expanded query)
+_expansion_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_expansion_cache_lock = threading.Lock()
+
+
+def interleave_results(unfiltered_results, filtered_results):
     """
-    1) Expands the query using the LLM.
-    2) Constructs a filter expression based on the expanded query.
-    3) Combines unfiltered and filtered Azure Search results.
+    Alternates the two result lists, skipping products already included.
     """
-    valid_fields = ["title", "brand", "description", "categories"]
+    combined_product_ids = {}
+    combined_results = []
+    idx = 0
+    max_len = max(len(unfiltered_results), len(filtered_results))
 
-    # 1) Expand query with LLM
-    prompt = search_expansion_prompt.format(query=query, customer_profile=customer_profile, product_categories=product_categories)
-    #console.log(f"Model Info: {model_info}")
-    
-    if model_info.model_name == "o1-mini":
-        expanded_query = call_llm(
-            prompt=prompt, 
-            model_info=model_info
-        )
-        expanded_query = expanded_query.replace("```json", "").replace("```", "").strip()
-        expanded_query = json.loads(expanded_query)
-    else:    
-        expanded_query = call_llm_structured_outputs(
-            prompt=prompt, 
-            response_format=ExpandedSearch, 
-            model_info=model_info
-        )
+    while idx < max_len:
+        if idx < len(unfiltered_results):
+            pid = unfiltered_results[idx]["id"]
+            if pid not in combined_product_ids:
+                combined_results.append(unfiltered_results[idx])
+                combined_product_ids[pid] = True
+        if idx < len(filtered_results):
+            pid = filtered_results[idx]["id"]
+            if pid not in combined_product_ids:
+                combined_results.append(filtered_results[idx])
+                combined_product_ids[pid] = True
+        idx += 1
+
+    return combined_results
+
+
+def _expansion_key(query: str, profile_text: str, model_info: TextProcessingModelnfo) -> tuple:
+    return (model_info.model_name, model_info.reasoning_efforts, " ".join(query.lower().split()),
+            hashlib.sha1(profile_text.encode("utf-8")).hexdigest())
+
+
+def expand_query(query: str, profile_text: str, model_info: TextProcessingModelnfo) -> dict:
+    """
+    The LLM query expansion of phase1 as a dict (ExpandedSearch fields), served from
+    the expansion cache when the same model expanded the same query for the same
+    profile within EXPANSION_CACHE_SECONDS.
+    """
+    key = _expansion_key(query, profile_text, model_info)
+    if expansion_cache_seconds > 0:
+        with _expansion_cache_lock:
+            cached = _expansion_cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                _expansion_cache.move_to_end(key)
+                EXPANSION_CACHE_LOOKUPS.inc(result="hit")
+                current_span().set_attribute("search.expansion_cached", True)
+                return dict(cached[1])
+        EXPANSION_CACHE_LOOKUPS.inc(result="miss")
+
+    prompt = search_expansion_prompt.format(query=query, customer_profile=profile_text, product_categories=product_categories)
+
+    with stage_timer("query_expansion"):
+        if model_info.model_name == "o1-mini":
+            expanded_query = call_llm(
+                prompt=prompt, 
+                model_info=model_info
+            )
+            expanded_query = expanded_query.replace("```json", "").replace("```", "").strip()
+            expanded_query = json.loads(expanded_query)
+        else:    
+            expanded_query = call_llm_structured_outputs(
+                prompt=prompt, 
+                response_format=ExpandedSearch, 
+                model_info=model_info
+            )
     
     if isinstance(expanded_query, ExpandedSearch):
         expanded_query = expanded_query.dict()
 
+    if expansion_cache_seconds > 0:
+        with _expansion_cache_lock:
+            _expansion_cache[key] = (time.monotonic() + expansion_cache_seconds, expanded_query)
+            _expansion_cache.move_to_end(key)
+            while len(_expansion_cache) > EXPANSION_CACHE_SIZE:
+                _expansion_cache.popitem(last=False)
+    return dict(expanded_query)
+
+
+def _filtered_leg(expanded_terms, filter_expr: str, top: int):
+    """
+    The filtered Azure Search leg. It is optional: on failure phase1 continues with the
+    unfiltered results only.
+    """
+    try:
+        with stage_timer("azure_search_filtered"):
+            return search_products(query=", ".join(expanded_terms), filter_expr=filter_expr, top=top)
+    except Exception as e:
+        console.log(f"Filtered Azure Search failed, using unfiltered results only: {e}")
+        SEARCH_FILTER_ERRORS.inc(stage="search")
+        return []
+
+
+def merge_late_filtered(recommended, num_recommended: int, filtered_results):
+    """
+    Adds filtered results that arrived after phase2 started: the products phase2 ranked
+    keep their positions, the rest is interleaved with the late results.
+    """
+    ranked = recommended[:num_recommended]
+    ranked_ids = {p["id"] for p in ranked}
+    tail = interleave_results(recommended[num_recommended:], filtered_results)
+    return ranked + [p for p in tail if p["id"] not in ranked_ids]
+
+
+@traced("phase1_discovery")
+def phase1_discovery(query: str, customer_profile: dict, model_info: TextProcessingModelnfo = TextProcessingModelnfo(model_name="o1", reasoning_efforts="medium"), search_mode: str = None, customer_profile_text: str = None, pipelined: bool = None):
+    """
+    1) Expands the query using the LLM.
+    2) Constructs a filter expression based on the expanded query.
+    3) Combines unfiltered and filtered Azure Search results, or with search_mode="boosted"
+       runs a single query that boosts the filter matches (default: PHASE1_SEARCH_MODE).
+    `customer_profile_text` is the profile's precomputed prompt serialization (utils.profile_store).
+    With `pipelined` (default: PHASE2_PIPELINE) the two legs run concurrently; if the filtered
+    leg is not done PHASE2_PIPELINE_DEADLINE_MS after the unfiltered one, the result holds only
+    the unfiltered results and "pending_filtered", the future of the filtered leg.
+    """
+    search_mode = search_mode or phase1_search_mode
+    pipelined = phase2_pipeline if pipelined is None else pipelined
+    pending_filtered = None
+
+    # 1) Expand query with LLM
+    profile_text = customer_profile_text or profile_prompt_text(customer_profile)
+    expanded_query = expand_query(query, profile_text, model_info)
+
     console.log(f"Expanded query object: {expanded_query}")
     
     expanded_terms = expanded_query.get("expanded_terms", [])
@@ -51,39 +193,13 @@ def phase1_discovery(query: str, customer_profile: dict, model_info: TextProcess
     price_obj = expanded_query.get("price", {})
 
     # 2) Construct filter expression
-    filter_expr = "("
-    for field in valid_fields:
-        if field in filter_obj and filter_obj[field]:
-            for term in filter_obj[field]:
-                if field != "categories":
-                    lower_term = term.strip().lower()
-                    upper_term = term.strip().upper()
-                    capital_term = term.strip().capitalize()
-                    title_term = term.strip().title()
-                    filter_expr += f"search.ismatch('\"{lower_term}\"~10', '{field}', 'full', 'any') or "
-                    filter_expr += f"search.ismatch('\"{upper_term}\"~10', '{field}', 'full', 'any') or "
-                    filter_expr += f"search.ismatch('\"{capital_term}\"~10', '{field}', 'full', 'any') or "
-                    filter_expr += f"search.ismatch('\"{title_term}\"~10', '{field}', 'full', 'any') or "
-                else:
-                    filter_expr += f"search.ismatch('{term}', '{field}', 'full', 'any') or "
-    
-    if filter_expr.endswith(" or "):
-        filter_expr = filter_expr[:-4]
-    filter_expr += ")"
-    if filter_expr == "()":
-        filter_expr = ""
-    
-    # Append price conditions
-    price_str = ""
-    if price_obj.get("ge") is not None:
-        price_str += f" and price ge {price_obj['ge']}"
-    if price_obj.get("lte") is not None:
-        price_str += f" and price le {price_obj['lte']}"
-    
-    if price_str and filter_expr:
-        filter_expr += price_str
-    elif price_str:
-        filter_expr = price_str[5:] if price_str.startswith(" and ") else price_str
+    with stage_timer("filter_construction"):
+        try:
+            filter_expr = build_filter(filter_obj, price_obj)
+        except FilterValidationError as e:
+            console.log(f"Discarding invalid filter from query expansion: {e}")
+            SEARCH_FILTER_ERRORS.inc(stage="validation")
+            filter_expr = ""
     
     console.log(f"Original query: {query}")
     console.log(f"Expanded terms: {expanded_terms}")
@@ -92,49 +208,67 @@ def phase1_discovery(query: str, customer_profile: dict, model_info: TextProcess
     top_results = 50
     
     # 3) Perform search
-    unfiltered_results = search_products(query=", ".join(expanded_terms), top=top_results)
-    filtered_results = []
-    
-    try:
-        if filter_expr:
-            filtered_results = search_products(query=", ".join(expanded_terms), filter_expr=filter_expr, top=top_results)
-    except Exception as e:
-        #console.log(f"Error in Azure Search: {e}")
-        pass
-    
-    combined_product_ids = {}
-    combined_results = []
-    idx = 0
-    max_len = max(len(unfiltered_results), len(filtered_results))
-    
-    while idx < max_len:
-        if idx < len(unfiltered_results):
-            pid = unfiltered_results[idx]["id"]
-            if pid not in combined_product_ids:
-                combined_results.append(unfiltered_results[idx])
-                combined_product_ids[pid] = True
-        if idx < len(filtered_results):
-            pid = filtered_results[idx]["id"]
-            if pid not in combined_product_ids:
-                combined_results.append(filtered_results[idx])
-                combined_product_ids[pid] = True
-        idx += 1
+    if search_mode == "boosted":
+        # One query: filter matches are boosted clauses instead of a second, filtered request
+        boost_query = build_boost_query(expanded_terms, filter_obj)
+        with stage_timer("azure_search_boosted"):
+            combined_results = boosted_search_products(query=", ".join(expanded_terms), boost_query=boost_query,
+                                                       top=2 * top_results, scoring_profile=phase1_scoring_profile)
+        unfiltered_results, filtered_results = combined_results, []
+    else:
+        filtered_future = None
+        if filter_expr and pipelined:
+            # Copy of the context: span, request deadline and vector search options carry over
+            filtered_future = _leg_executor.submit(contextvars.copy_context().run, _filtered_leg, expanded_terms, filter_expr, top_results)
+        with stage_timer("azure_search_unfiltered"):
+            unfiltered_results = search_products(query=", ".join(expanded_terms), top=top_results)
+        filtered_results = []
+
+        if filtered_future is not None:
+            try:
+                filtered_results = filtered_future.result(timeout=phase2_pipeline_deadline_ms / 1000)
+                PHASE2_PIPELINE.inc(outcome="filtered_in_time")
+            except FuturesTimeout:
+                pending_filtered = filtered_future
+                PHASE2_PIPELINE.inc(outcome="speculative")
+        elif filter_expr:
+            filtered_results = _filtered_leg(expanded_terms, filter_expr, top_results)
+        elif pipelined:
+            PHASE2_PIPELINE.inc(outcome="no_filter")
+        
+        with stage_timer("result_merge"):
+            combined_results = interleave_results(unfiltered_results, filtered_results)
     
     console.log(f"Unfiltered: {len(unfiltered_results)} | Filtered: {len(filtered_results)} | Combined: {len(combined_results)}")
+    current_span().set_attributes({
+        "llm.model": model_info.model_name,
+        "llm.reasoning_effort": model_info.reasoning_efforts,
+        "search.expanded_terms": len(expanded_terms),
+        "search.unfiltered_count": len(unfiltered_results),
+        "search.filtered_count": len(filtered_results),
+        "search.combined_count": len(combined_results),
+        "search.phase1_mode": search_mode,
+        "search.phase1_pipelined": pipelined,
+        "search.filtered_pending": pending_filtered is not None,
+    })
     
-    return {
+    result = {
         "expanded_terms": expanded_terms,
         "filter_expr": json.dumps(filter_obj, indent=2),
         "search_results": combined_results
     }
+    if pending_filtered is not None:
+        result["pending_filtered"] = pending_filtered
+    return result
 
 
-def phase2_recommender(search_results, query: str, customer_profile: dict, model_info: TextProcessingModelnfo = TextProcessingModelnfo(model_name="o1", reasoning_efforts="medium")):
+@traced("phase2_recommender")
+def phase2_recommender(search_results, query: str, customer_profile: dict, model_info: TextProcessingModelnfo = TextProcessingModelnfo(model_name="o1", reasoning_efforts="medium"), customer_profile_text: str = None):
     """
     Calls the LLM to generate a recommended ordering of the products.
     """
     products_json = json.dumps(search_results.get("search_results", []), indent=2)
-    profile_json = json.dumps(customer_profile, indent=2)
+    profile_json = customer_profile_text or profile_prompt_text(customer_profile)
 
     prompt = recommender_prompt.format(
         customer_profile=profile_json,
@@ -144,19 +278,20 @@ def phase2_recommender(search_results, query: str, customer_profile: dict, model
         expansion_filters=search_results.get("filter_expr", "")
     )
 
-    if model_info.model_name == "o1-mini":
-        recommendations = call_llm(
-            prompt=prompt, 
-            model_info=model_info
-        )
-        recommendations = recommendations.replace("```json", "").replace("```", "").strip()
-        recommendations = json.loads(recommendations)
-    else:
-        recommendations = call_llm_structured_outputs(
-            prompt=prompt, 
-            response_format=SearchResults, 
-            model_info=model_info
-        )
+    with stage_timer("recommender_llm"):
+        if model_info.model_name == "o1-mini":
+            recommendations = call_llm(
+                prompt=prompt, 
+                model_info=model_info
+            )
+            recommendations = recommendations.replace("```json", "").replace("```", "").strip()
+            recommendations = json.loads(recommendations)
+        else:
+            recommendations = call_llm_structured_outputs(
+                prompt=prompt, 
+                response_format=SearchResults, 
+                model_info=model_info
+            )
 
     console.print("Recommendations:", recommendations)
     
@@ -167,40 +302,156 @@ def phase2_recommender(search_results, query: str, customer_profile: dict, model
     justification = recommendations.get("justification", "")
     
     # Reorder products based on LLM recommendations
-    recommended_products = []
-    for rid in recommended_ids:
+    with stage_timer("recommendation_reorder"):
+        recommended_products = []
+        for rid in recommended_ids:
+            for product in search_results.get("search_results", []):
+                if product["id"] == rid:
+                    recommended_products.append(product)
+                    break
+    
+        included_ids = {p["id"] for p in recommended_products}
         for product in search_results.get("search_results", []):
-            if product["id"] == rid:
+            if product["id"] not in included_ids:
                 recommended_products.append(product)
-                break
-    
-    included_ids = {p["id"] for p in recommended_products}
-    for product in search_results.get("search_results", []):
-        if product["id"] not in included_ids:
-            recommended_products.append(product)
+
+    current_span().set_attributes({
+        "llm.model": model_info.model_name,
+        "llm.reasoning_effort": model_info.reasoning_efforts,
+        "search.candidate_count": len(search_results.get("search_results", [])),
+        "search.recommended_count": len(included_ids),
+    })
 
     return recommended_products, justification, len(included_ids)
 
 
 
 
-def retail_search_with_ai(search_config: SearchConfig, model_info: TextProcessingModelnfo):
-    
+def retail_search_with_ai(search_config: SearchConfig, model_info: TextProcessingModelnfo, route: RouteDecision = None):
+    """
+    Runs phase1 and phase2. With a route from search.model_router, phase latencies are
+    reported to the router and phase2 is skipped (or its failure absorbed) when the route
+    says so; the interleaved phase1 results are returned in that case.
+    When phase1 left its filtered leg pending (pipelined mode), phase2 starts on the
+    unfiltered results and the late filtered results are merged in afterwards; the
+    time both ran concurrently is recorded in search_stage_overlap_seconds (a zero
+    sample when phase2 was skipped or ranked with LTR, which only start after the merge).
+    With the "ltr" phase2 ranker and a trained model, phase2 ranks the candidates with the
+    model instead of calling the LLM; LLM orderings are logged for training (LTR_LOG_PATH).
+    """
     console.print("model_info:\n", model_info)
-    expansion_result = phase1_discovery(search_config.query, 
-                                        search_config.customer_profile, 
-                                        model_info=model_info)
-    
-    recommended, justification, num_recommended = phase2_recommender(
-        search_results=expansion_result,
-        query=search_config.query,
-        customer_profile=search_config.customer_profile,
-        model_info=model_info
-    )
+    start = time.perf_counter()
+    try:
+        expansion_result = phase1_discovery(search_config.query, 
+                                            search_config.customer_profile, 
+                                            model_info=model_info,
+                                            customer_profile_text=search_config.customer_profile_text,
+                                            pipelined=search_config.pipelined)
+    except Exception:
+        if route is not None:
+            model_router.record(route.model, "phase1", time.perf_counter() - start, ok=False)
+        raise
+    phase1_seconds = time.perf_counter() - start
+    pending_filtered = expansion_result.pop("pending_filtered", None)
+    filtered_done = []
+    if pending_filtered is not None:
+        pending_filtered.add_done_callback(lambda f: filtered_done.append(time.perf_counter()))
+
+    if (search_config.phase2_ranker or phase2_ranker) == "ltr":
+        ltr_model = get_ltr_model()
+        if ltr_model is not None:
+            if route is not None:
+                model_router.record(route.model, "phase1", phase1_seconds)
+            return ltr_phase2(search_config, _complete_phase1(expansion_result, pending_filtered), ltr_model)
+        PHASE2_RANKER.inc(ranker="ltr_unavailable")
+
+    if route is not None:
+        model_router.record(route.model, "phase1", phase1_seconds)
+        if not model_router.should_run_phase2(route, phase1_seconds):
+            return _phase1_only_results(_complete_phase1(expansion_result, pending_filtered))
+
+    start = time.perf_counter()
+    try:
+        recommended, justification, num_recommended = phase2_recommender(
+            search_results=expansion_result,
+            query=search_config.query,
+            customer_profile=search_config.customer_profile,
+            model_info=model_info,
+            customer_profile_text=search_config.customer_profile_text
+        )
+    except Exception as e:
+        if route is None:
+            raise
+        model_router.record(route.model, "phase2", time.perf_counter() - start, ok=False)
+        route.phase2 = False
+        route.reason = f"phase2 failed: {e.__class__.__name__}" if route.reason == "primary" else f"{route.reason}; phase2 failed: {e.__class__.__name__}"
+        console.log(f"Phase2 on {route.model} failed, returning phase1 results: {e}")
+        return _phase1_only_results(_complete_phase1(expansion_result, pending_filtered))
+
+    phase2_end = time.perf_counter()
+    if route is not None:
+        model_router.record(route.model, "phase2", phase2_end - start)
+    PHASE2_RANKER.inc(ranker="llm")
+
+    if pending_filtered is not None:
+        with stage_timer("late_filtered_merge"):
+            filtered_results = pending_filtered.result()
+            recommended = merge_late_filtered(recommended, num_recommended, filtered_results)
+            expansion_result["search_results"] = interleave_results(expansion_result["search_results"], filtered_results)
+        overlap = max(0.0, min(filtered_done[0] if filtered_done else phase2_end, phase2_end) - start)
+        STAGE_OVERLAP_SECONDS.observe(overlap, stages="filtered_search+phase2")
+        current_span().set_attribute("search.stage_overlap_seconds", round(overlap, 4))
+
+    # Logged with the merged candidates, the list the LTR model ranks when it serves phase2
+    log_recommendation(search_config.query, search_config.customer_profile, search_config.customer_profile_digest,
+                       expansion_result, [p["id"] for p in recommended[:num_recommended]], model_info.model_name)
 
     return {
         "expansion_result": expansion_result,
         "recommended": recommended,
         "justification": justification,
         "num_recommended": num_recommended
-    }
\ No newline at end of file
+    }
+
+
+def ltr_phase2(search_config: SearchConfig, expansion_result, ltr_model):
+    """
+    Phase2 without an LLM call: the phase1 candidates ranked by the model distilled from
+    logged recommender orderings (search/ltr_ranker.py).
+    """
+    candidates = expansion_result.get("search_results", [])
+    with stage_timer("ltr_ranking"):
+        digest = search_config.customer_profile_digest or build_profile_digest(search_config.customer_profile)
+        recommended = ltr_model.rank(search_config.query, digest, expansion_result.get("expanded_terms", []), candidates)
+    PHASE2_RANKER.inc(ranker="ltr")
+    current_span().set_attributes({
+        "search.phase2_ranker": "ltr",
+        "search.candidate_count": len(candidates),
+    })
+    return {
+        "expansion_result": expansion_result,
+        "recommended": recommended,
+        "justification": "",
+        "num_recommended": min(LTR_RECOMMENDED, len(recommended))
+    }
+
+
+def _complete_phase1(expansion_result, pending_filtered):
+    """
+    Interleaves the results of a pending filtered leg, for responses without LLM phase2.
+    """
+    if pending_filtered is not None:
+        expansion_result["search_results"] = interleave_results(expansion_result["search_results"], pending_filtered.result())
+        # Nothing ran next to the filtered leg: recorded so every pipelined search has a sample
+        STAGE_OVERLAP_SECONDS.observe(0.0, stages="filtered_search+phase2")
+        current_span().set_attribute("search.stage_overlap_seconds", 0.0)
+    return expansion_result
+
+
+def _phase1_only_results(expansion_result):
+    return {
+        "expansion_result": expansion_result,
+        "recommended": expansion_result["search_results"],
+        "justification": "",
+        "num_recommended": 0
+    }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Literal, Union, Any, Dict
 
 
@@ -48,13 +48,29 @@ class SearchRequest(BaseModel):
     reasoning_effort: str  # 'low', 'medium', 'high', 'mini' etc.
     compare: bool = False
     left_model: Optional[str] = "no-llm"
+    exhaustive_knn: Optional[bool] = None  # None: VECTOR_SEARCH_EXHAUSTIVE
+    knn_k: Optional[int] = Field(default=None, ge=1, le=1000)  # None: VECTOR_SEARCH_K
+    pipelined_phase2: Optional[bool] = None  # None: PHASE2_PIPELINE
+    phase2_ranker: Optional[Literal["llm", "ltr"]] = None  # None: PHASE2_RANKER
 
 
 # Extended Request model to handle compare + left_model
 class SearchConfig(BaseModel):
     query: str
     customer_profile: Dict
+    customer_profile_text: Optional[str] = None  # prompt serialization of customer_profile, if precomputed
+    customer_profile_digest: Optional[Dict] = None  # profile digest of customer_profile, if precomputed
+    pipelined: Optional[bool] = None  # None: PHASE2_PIPELINE
+    phase2_ranker: Optional[str] = None  # None: PHASE2_RANKER
     model_name: Literal["o3-mini", "o1-mini", "o1", "gpt-4o", "gpt-45", "no-llm"] = "o3-mini"
     reasoning_effort: Literal['low', 'medium', 'high']      
     
-    
\ No newline at end of file
+    
+
+
+# Route chosen by search.model_router for one search_processing call
+class RouteDecision(BaseModel):
+    requested_model: str
+    model: str
+    phase2: bool = True
+    reason: str = "primary"
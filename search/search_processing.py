@@ -3,7 +3,9 @@ from search.azure_search import search_products
 
 from rich.console import Console
 from search.retail_search_ai import phase1_discovery, phase2_recommender, retail_search_with_ai
+from search.model_router import model_router
 from utils.openai_data_models import TextProcessingModelnfo
+from utils.tracing import traced, current_span
 
 import sys
 sys.path.append("../")
@@ -80,19 +82,35 @@ def search_no_llm(query: str):
     return results
 
 
-def search_processing(query, requested_model, customer_profile):
+@traced("search_processing")
+def search_processing(query, requested_model, customer_profile, customer_profile_text=None, pipelined=None,
+                      customer_profile_digest=None, phase2_ranker=None):
 
-    model_name, reasoning_effort = get_model_name(requested_model)
-    model_info = get_model_instance(requested_model)
+    route = model_router.choose(requested_model)
+    model_name, reasoning_effort = get_model_name(route.model)
+    model_info = get_model_instance(route.model)
+    current_span().set_attributes({
+        "search.requested_model": requested_model,
+        "search.route": route.model,
+        "llm.model": model_name,
+        "llm.reasoning_effort": reasoning_effort,
+    })
 
     search_config = SearchConfig(
         query=query,
         customer_profile=customer_profile,
+        customer_profile_text=customer_profile_text,
+        customer_profile_digest=customer_profile_digest,
+        pipelined=pipelined,
+        phase2_ranker=phase2_ranker,
         model_name=model_name,
         reasoning_effort=reasoning_effort
     )
 
-    results = retail_search_with_ai(search_config, model_info)
+    with model_router.track(route):
+        results = retail_search_with_ai(search_config, model_info, route=route)
 
+    current_span().set_attributes({"search.phase2": route.phase2, "search.route_reason": route.reason})
+    results["route"] = route.dict()
     return results
     
@@ -0,0 +1,193 @@
+# search/sync_catalog.py
+"""
+Incremental re-indexing of the product catalog: only what changed since the last
+sync is embedded and sent to the index.
+
+A manifest (JSON, next to the catalog by default) keeps two hashes per document id:
+    "embed"   - of the fields the vectors are computed from (title, description, brand)
+    "content" - of all other indexed fields (prices, categories, image_url, ...)
+On each run, every catalog record (read and normalized as in search.ingest_catalog) is
+compared with the manifest:
+    new id                  -> embedded, merge_or_upload
+    embedded field changed  -> re-embedded, merge_or_upload
+    other field changed     -> merge of the non-vector fields only (vectors stay as they are)
+    id no longer in catalog -> delete
+    unchanged               -> nothing
+A document's manifest entry is only updated once the index acknowledges it, so
+failures are retried on the next run. If the catalog file's MD5 equals the one of the
+last sync, the run stops right away.
+
+    python -m search.sync_catalog catalog.jsonl [--manifest catalog.manifest.json] [--chunk-size 500]
+        [--baseline] [--dry-run]
+
+--baseline records the current catalog as synced without uploading anything, for an
+index that was just loaded with search.ingest_catalog.
+"""
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, Optional
+
+from rich.console import Console
+from azure.search.documents import SearchIndexingBufferedSender
+
+from search.config import search_endpoint, index_name, credential, query_embedding_model
+from search.ingest_catalog import read_records, to_document, embed_documents
+from search.reembed_catalog import VECTOR_SOURCES
+from utils.openai_data_models import EmbeddingModelnfo
+from utils.embedding_service import get_embedding_service
+from utils.general_helpers import generate_uuid_from_string, get_file_md5
+
+console = Console()
+
+
+EMBEDDED_FIELDS = sorted(set(VECTOR_SOURCES.values()))
+
+
+def document_hashes(document: Dict[str, Any]) -> Dict[str, str]:
+    embedded = {f: document.get(f) for f in EMBEDDED_FIELDS}
+    content = {k: v for k, v in document.items() if k not in embedded and k not in VECTOR_SOURCES}
+    return {
+        "embed": generate_uuid_from_string(json.dumps(embedded, sort_keys=True, ensure_ascii=False)),
+        "content": generate_uuid_from_string(json.dumps(content, sort_keys=True, ensure_ascii=False)),
+    }
+
+
+class Manifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.catalog_md5: Optional[str] = None
+        self.documents: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.catalog_md5 = state.get("catalog_md5")
+            self.documents = state.get("documents", {})
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"catalog_md5": self.catalog_md5, "updated": time.time(), "documents": self.documents}, f)
+        os.replace(tmp, self.path)
+
+
+def plan_changes(path: str, manifest: Manifest):
+    """
+    Compares the catalog with the manifest. Returns (to_embed, to_merge, to_delete, hashes):
+    documents needing new vectors, documents with only non-vector changes (vector
+    fields left out), ids to delete, and the new hashes of every changed document.
+    """
+    to_embed, to_merge, hashes, seen = [], [], {}, set()
+    for record in read_records(path):
+        document = to_document(record)
+        doc_id = document["id"]
+        seen.add(doc_id)
+        new = document_hashes(document)
+        old = manifest.documents.get(doc_id)
+        if old == new:
+            continue
+        hashes[doc_id] = new
+        if old is None or old["embed"] != new["embed"]:
+            to_embed.append(document)
+        else:
+            to_merge.append({k: v for k, v in document.items() if k not in VECTOR_SOURCES})
+    to_delete = [doc_id for doc_id in manifest.documents if doc_id not in seen]
+    return to_embed, to_merge, to_delete, hashes
+
+
+def sync(path: str, manifest_path: Optional[str] = None, chunk_size: int = 500, embedding_batch_size: int = 256,
+         baseline: bool = False, dry_run: bool = False, force: bool = False):
+    manifest = Manifest(manifest_path or os.path.splitext(path)[0] + ".manifest.json")
+    catalog_md5 = get_file_md5(path)
+    if catalog_md5 == manifest.catalog_md5 and not force:
+        console.log(f"Catalog unchanged since the last sync ({catalog_md5})")
+        return {"embedded": 0, "merged": 0, "deleted": 0, "failed": 0}
+
+    start = time.perf_counter()
+    to_embed, to_merge, to_delete, hashes = plan_changes(path, manifest)
+    console.log(f"{len(manifest.documents)} documents in manifest: {len(to_embed)} to embed, "
+                f"{len(to_merge)} to merge, {len(to_delete)} to delete ({time.perf_counter() - start:.1f}s)")
+    counts = {"embedded": 0, "merged": 0, "deleted": 0, "failed": 0}
+    if dry_run:
+        return counts
+    if baseline:
+        for doc_id in to_delete:
+            manifest.documents.pop(doc_id, None)
+        manifest.documents.update(hashes)
+        manifest.catalog_md5 = catalog_md5
+        manifest.save()
+        console.log(f"Baseline of {len(manifest.documents)} documents written to {manifest.path}")
+        return counts
+
+    # id -> manifest entry to store once the index acknowledges the action (None: deleted)
+    pending: Dict[str, Optional[Dict[str, str]]] = {}
+
+    # IndexAction is a mapping of the document fields and "@search.action"
+    def on_progress(action):
+        doc_id = action.get("id")
+        if doc_id not in pending:
+            return
+        entry = pending.pop(doc_id)
+        if entry is None:
+            manifest.documents.pop(doc_id, None)
+        else:
+            manifest.documents[doc_id] = entry
+
+    def on_error(action):
+        counts["failed"] += 1
+        pending.pop(action.get("id"), None)
+
+    service = get_embedding_service(EmbeddingModelnfo(model_name=query_embedding_model))
+    with SearchIndexingBufferedSender(endpoint=search_endpoint, index_name=index_name, credential=credential,
+                                      auto_flush=False, max_retries_per_action=5,
+                                      on_progress=on_progress, on_error=on_error) as sender:
+        for i in range(0, len(to_embed), chunk_size):
+            chunk = to_embed[i:i + chunk_size]
+            embed_documents(chunk, service, embedding_batch_size)
+            pending.update({doc["id"]: hashes[doc["id"]] for doc in chunk})
+            sender.merge_or_upload_documents(documents=chunk)
+            sender.flush()
+            counts["embedded"] += len(chunk)
+            manifest.save()
+        for i in range(0, len(to_merge), chunk_size):
+            chunk = to_merge[i:i + chunk_size]
+            pending.update({doc["id"]: hashes[doc["id"]] for doc in chunk})
+            sender.merge_documents(documents=chunk)
+            sender.flush()
+            counts["merged"] += len(chunk)
+            manifest.save()
+        for i in range(0, len(to_delete), chunk_size):
+            chunk = to_delete[i:i + chunk_size]
+            pending.update({doc_id: None for doc_id in chunk})
+            sender.delete_documents(documents=[{"id": doc_id} for doc_id in chunk])
+            sender.flush()
+            counts["deleted"] += len(chunk)
+            manifest.save()
+
+    # Only a fully acknowledged sync lets the next run skip an unchanged catalog
+    if not counts["failed"]:
+        manifest.catalog_md5 = catalog_md5
+    manifest.save()
+    console.log(f"Synced in {time.perf_counter() - start:.1f}s: {counts['embedded']} embedded, {counts['merged']} merged, "
+                f"{counts['deleted']} deleted, {counts['failed']} failed")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("catalog", help="catalog file (.jsonl, .csv or .parquet)")
+    parser.add_argument("--manifest", default=None, help="manifest file (default: <catalog>.manifest.json)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="documents per embedding and upload round")
+    parser.add_argument("--embedding-batch-size", type=int, default=256, help="texts per embeddings request")
+    parser.add_argument("--baseline", action="store_true", help="record the catalog as synced without uploading")
+    parser.add_argument("--force", action="store_true", help="compare documents even if the catalog file is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="only report the planned changes")
+    args = parser.parse_args()
+
+    sync(args.catalog, manifest_path=args.manifest, chunk_size=args.chunk_size, embedding_batch_size=args.embedding_batch_size,
+         baseline=args.baseline, dry_run=args.dry_run, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# search/warmup.py
+"""
+Warm-up when a customer is selected in the UI (GET /api/customer/{filename}), so the
+customer's first search starts hot. In a background thread, after the endpoint has
+loaded the profile and its digest into the profile store:
+
+  - connections: a cheap request to every deployment of the route's model (models.list)
+    and to the search index (document count) opens the pooled keep-alive connections
+    (DNS, TCP and TLS setup) the search will reuse; repeated at most every
+    WARMUP_CONNECTION_SECONDS, while the pools are likely still warm
+  - speculative expansions (WARMUP_SPECULATIVE_QUERIES > 0): the phase1 query expansion
+    is run for the customer's most likely queries, taken from their recent purchases in
+    the profile digest (categories, then item names), and stored in the expansion cache;
+    a search for one of them skips the expansion call. Costs one LLM call per query,
+    so it is off by default; the calls run at BACKGROUND priority in the rate limiter
+    (utils.rate_limiter), behind the calls of searches.
+
+Configuration (environment variables):
+    WARMUP_ENABLED                  set to 0 to disable the warm-up (default 1)
+    WARMUP_CONNECTION_SECONDS       minimum interval between connection warm-ups per model (default 60)
+    WARMUP_SPECULATIVE_QUERIES      expansions to precompute per customer selection (default 0)
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from rich.console import Console
+
+from search.config import search_client, expansion_cache_seconds
+from search.retail_search_ai import expand_query
+from search.search_processing import get_model_instance
+from search.model_router import DEFAULT_ROUTE
+from utils.openai_data_models import instantiate_model
+from utils.deployment_pool import get_deployment_pool
+from utils.profile_store import CustomerProfile
+from utils.metrics import counter
+from utils.rate_limiter import request_priority, BACKGROUND
+from utils.tracing import start_span
+
+console = Console()
+
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+WARMUP_CONNECTION_SECONDS = float(os.getenv("WARMUP_CONNECTION_SECONDS", 60))
+WARMUP_SPECULATIVE_QUERIES = int(os.getenv("WARMUP_SPECULATIVE_QUERIES", 0))
+
+WARMUP_TASKS = counter(
+    "warmup_tasks_total",
+    "Warm-up tasks run on customer selection, by task and outcome.",
+    ("task", "outcome")
+)
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+_lock = threading.Lock()
+# route -> monotonic time of the last connection warm-up
+_connections_warmed: Dict[str, float] = {}
+# (customer, route) -> monotonic time of the last speculative expansion
+_speculated: Dict[tuple, float] = {}
+
+
+def likely_queries(profile: CustomerProfile, count: int) -> List[str]:
+    """
+    The customer's most likely searches, from the recent purchases in the profile digest:
+    the categories of the latest items first, then the item names, most recent first.
+    Only a customer without purchases falls back to preferred product types and interests.
+    """
+    digest = profile.digest or {}
+    candidates = list(digest.get("recent_categories") or []) + list(digest.get("recent_items") or [])
+    if not candidates:
+        candidates = list((digest.get("behavior") or {}).get("preferred_product_types") or []) + list(digest.get("interests") or [])
+    queries, seen = [], set()
+    for candidate in candidates:
+        if isinstance(candidate, str) and candidate.strip() and candidate.lower() not in seen:
+            seen.add(candidate.lower())
+            queries.append(candidate.strip())
+    return queries[:count]
+
+
+def _due(registry: Dict, key, interval: float) -> bool:
+    now = time.monotonic()
+    with _lock:
+        if now - registry.get(key, float("-inf")) < interval:
+            return False
+        registry[key] = now
+        return True
+
+
+def warm_connections(route: str):
+    model_info = get_model_instance(route)
+    if model_info.client is None:
+        model_info = instantiate_model(model_info)
+    for deployment in get_deployment_pool(model_info).deployments:
+        try:
+            deployment.client.with_options(max_retries=0, timeout=10).models.list()
+            WARMUP_TASKS.inc(task="llm_connection", outcome="ok")
+        except Exception as e:
+            WARMUP_TASKS.inc(task="llm_connection", outcome="error")
+            console.log(f"[yellow]Warm-up of {model_info.model_name} ({deployment.label}) failed: {e}[/yellow]")
+    try:
+        search_client.get_document_count()
+        WARMUP_TASKS.inc(task="search_connection", outcome="ok")
+    except Exception as e:
+        WARMUP_TASKS.inc(task="search_connection", outcome="error")
+        console.log(f"[yellow]Warm-up of the search index failed: {e}[/yellow]")
+
+
+def speculate_expansions(profile: CustomerProfile, route: str, count: int):
+    """
+    Precomputes the expansions of the customer's likely queries. The LLM calls run at
+    BACKGROUND priority, so the deployment's rate limiter serves searches first.
+    """
+    model_info = get_model_instance(route)
+    with request_priority(BACKGROUND):
+        for query in likely_queries(profile, count):
+            try:
+                expand_query(query, profile.prompt_text, model_info)
+                WARMUP_TASKS.inc(task="speculative_expansion", outcome="ok")
+            except Exception as e:
+                WARMUP_TASKS.inc(task="speculative_expansion", outcome="error")
+                console.log(f"[yellow]Speculative expansion of '{query}' failed: {e}[/yellow]")
+
+
+def _warm_up(profile: CustomerProfile, route: str):
+    try:
+        with start_span("customer_warmup", {"warmup.customer": profile.name, "warmup.route": route}):
+            if _due(_connections_warmed, route, WARMUP_CONNECTION_SECONDS):
+                warm_connections(route)
+            if WARMUP_SPECULATIVE_QUERIES > 0 and expansion_cache_seconds > 0 \
+                    and _due(_speculated, (profile.name, route), expansion_cache_seconds):
+                speculate_expansions(profile, route, WARMUP_SPECULATIVE_QUERIES)
+    except Exception as e:
+        # Warm-up is best effort; the search itself reports real failures
+        console.log(f"[yellow]Warm-up for {profile.name} failed: {e}[/yellow]")
+
+
+def warm_up_customer(profile: CustomerProfile, route: str = None):
+    """
+    Schedules the warm-up for a selected customer and returns at once.
+    """
+    if not WARMUP_ENABLED:
+        return None
+    return _executor.submit(_warm_up, profile, route or DEFAULT_ROUTE)
@@ -4,8 +4,9 @@ import json
 import time
 from typing import List, Dict, Union, Optional
 
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
@@ -21,8 +22,17 @@ load_dotenv()
 
 # Import the new search_processing function from the reorganized modules
 from search.search_processing import search_processing, search_no_llm
+from search.azure_search import vector_search_options
 
 from search.search_data_models import *
+from utils.metrics import stage_timer, render_metrics, METRICS_CONTENT_TYPE, SEARCH_STAGE_SECONDS
+from utils.tracing import traced, current_span
+from utils.retry_policy import request_deadline
+from utils.profile_store import get_profile_store, PROFILE_LIST_LIMIT
+from search.warmup import warm_up_customer
+
+# Upper bound for all LLM calls and retries made while serving one search request
+SEARCH_REQUEST_DEADLINE_SECONDS = float(os.getenv("SEARCH_REQUEST_DEADLINE_SECONDS", 240))
 
 app = FastAPI()
 
@@ -47,27 +57,32 @@ def serve_index():
 
 
 @app.get("/api/customers")
-def list_customers():
-    folder_path = "customer_profiles"
-    if not os.path.exists(folder_path):
-        return []
-    files = [f for f in os.listdir(folder_path) if f.endswith(".json")]
-    return files
+def list_customers(after: Optional[str] = None, limit: int = Query(PROFILE_LIST_LIMIT, ge=1, le=10000)):
+    """
+    Customer ids in sorted order, one page at a time: pass the last id of a page as
+    `after` to get the next one.
+    """
+    return get_profile_store().list(after=after, limit=limit)
 
 
 
 @app.get("/api/customer/{filename}")
-def get_customer_profile(filename: str):
-    folder_path = "customer_profiles"
-    file_path = os.path.join(folder_path, filename)
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+def get_customer_profile(filename: str, model: Optional[str] = None):
+    """
+    Profile summary for the UI. Selecting a customer also starts the warm-up for their
+    first search (search/warmup.py) on `model`'s route (default route if not given).
+    """
+    profile = get_profile_store().get(filename)
+    if profile is not None:
+        warm_up_customer(profile, model)
+        # Profiles imported by utils.profile_store are in the file shape; a profile file
+        # holding the bare customer_profile object is served as well
+        customer = profile.data.get("customer_profile", profile.data)
         return [
-            data["customer_profile"].get("gender", ""), 
-            data["customer_profile"].get("purchase_statistics", {}), 
-            data["customer_profile"].get("inferred_purchasing_behavior", {}),
-            data["customer_profile"].get("additional_notes", "")
+            customer.get("gender", ""), 
+            customer.get("purchase_statistics", {}), 
+            customer.get("inferred_purchasing_behavior", {}),
+            customer.get("additional_notes", "")
         ]
     else:
         return JSONResponse(content={"error": "Customer profile not found."}, status_code=404)
@@ -75,17 +90,16 @@ def get_customer_profile(filename: str):
 
 
 def get_customer(customer: str):
-    folder_path = "customer_profiles"
-    file_path = os.path.join(folder_path, customer)
-    if not os.path.exists(file_path):
+    """
+    The customer's CustomerProfile from the profile store, or a 404 response.
+    """
+    profile = get_profile_store().get(customer)
+    if profile is None:
         return JSONResponse(
             content={"error": f"Customer profile '{customer}' not found."},
             status_code=404
         )
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        customer_profile = json.load(f)
-    return customer_profile
+    return profile
 
 
 
@@ -94,30 +108,43 @@ def retail_search(payload: RetailSearch):
     """
     Accepts search parameters and returns search results.
     """
-    return search_processing(payload.query, payload.model_name, get_customer(payload.customer))
+    profile = get_customer(payload.customer)
+    if isinstance(profile, JSONResponse):
+        return profile
+    return search_processing(payload.query, payload.model_name, profile.data, profile.prompt_text,
+                             customer_profile_digest=profile.digest)
 
      
 
 @app.post("/api/search")
+@traced("search_endpoint")
+@request_deadline(SEARCH_REQUEST_DEADLINE_SECONDS)
 def search_endpoint(payload: SearchRequest):
     """
     Accepts search parameters and returns search results from both sides.
     """
     console.print(payload)
     start_time = time.time()
-    customer_profile = get_customer(payload.customer)
-
-    right_results = search_processing(payload.query, payload.reasoning_effort, customer_profile)
+    profile = get_customer(payload.customer)
+    if isinstance(profile, JSONResponse):
+        return profile
+
+    with vector_search_options(exhaustive=payload.exhaustive_knn, k=payload.knn_k):
+        right_results = search_processing(payload.query, payload.reasoning_effort, profile.data, profile.prompt_text,
+                                          pipelined=payload.pipelined_phase2, customer_profile_digest=profile.digest,
+                                          phase2_ranker=payload.phase2_ranker)
     right_results = {
         "expansion_result_right": right_results['expansion_result'],
         "recommended_right": right_results['recommended'],
         "justification_right": right_results['justification'],
-        "num_recommended_right": right_results['num_recommended']
+        "num_recommended_right": right_results['num_recommended'],
+        "route_right": right_results.get('route')
     }
 
     if payload.compare:
         if payload.left_model == "no-llm":
-            recommended = search_no_llm(payload.query)
+            with stage_timer("no_llm_search"), vector_search_options(exhaustive=payload.exhaustive_knn, k=payload.knn_k):
+                recommended = search_no_llm(payload.query)
             num_recommended = len(recommended)
 
             left_results = {
@@ -127,18 +154,32 @@ def search_endpoint(payload: SearchRequest):
                 "num_recommended_left": num_recommended
             }
         else:
-            left_results = search_processing(payload.query, payload.left_model, customer_profile)
+            with vector_search_options(exhaustive=payload.exhaustive_knn, k=payload.knn_k):
+                left_results = search_processing(payload.query, payload.left_model, profile.data, profile.prompt_text,
+                                                 pipelined=payload.pipelined_phase2, customer_profile_digest=profile.digest,
+                                                 phase2_ranker=payload.phase2_ranker)
             left_results = {
                 "expansion_result_left": left_results['expansion_result'],
                 "recommended_left": left_results['recommended'],
                 "justification_left": left_results['justification'],
-                "num_recommended_left": left_results['num_recommended']
+                "num_recommended_left": left_results['num_recommended'],
+                "route_left": left_results.get('route')
             }
     else:
         left_results = {}
 
     end_time = time.time()
     elapsed_ms = int(end_time - start_time)
+    SEARCH_STAGE_SECONDS.observe(end_time - start_time, stage="search_total")
+    current_span().set_attributes({
+        "search.query": payload.query,
+        "search.customer": str(payload.customer),
+        "search.reasoning_effort": payload.reasoning_effort,
+        "search.compare": payload.compare,
+        "search.left_model": payload.left_model,
+        "search.num_recommended_right": right_results.get("num_recommended_right", 0),
+        "search.num_recommended_left": left_results.get("num_recommended_left", 0),
+    })
 
 
     response_data = {
@@ -151,10 +192,24 @@ def search_endpoint(payload: SearchRequest):
         "num_recommended_right": right_results.get("num_recommended_right", 0),
         "num_recommended_left": left_results.get("num_recommended_left", 0),
         "search_results_right": right_results.get("recommended_right", []),
-        "search_results_left": left_results.get("recommended_left", [])
+        "search_results_left": left_results.get("recommended_left", []),
+        "route_right": right_results.get("route_right"),
+        "route_left": left_results.get("route_left")
     }
 
-    return response_data
+    with stage_timer("response_serialization"):
+        response = JSONResponse(content=jsonable_encoder(response_data))
+
+    return response
+
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Exposes stage latencies, LLM token counts and cost in the Prometheus text format.
+    """
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 
 
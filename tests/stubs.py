@@ -0,0 +1,40 @@
+# tests/stubs.py
+"""
+Stand-ins for the Azure Search indexing request and the embedding service, so the
+catalog scripts run with the real SearchIndexingBufferedSender batching and callbacks.
+"""
+import numpy as np
+from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchIndexingBufferedSender
+from azure.search.documents.models import IndexingResult
+
+
+class StubEmbeddingService:
+    def embed_many(self, texts, batch_size=None):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class StubSender(SearchIndexingBufferedSender):
+    """
+    Acknowledges every action except those whose id is in `failing` (non-retryable 400).
+    `sent` collects the actions as dicts and `requests` the size of each indexing request.
+    """
+    failing = set()
+    sent = []
+    requests = []
+
+    def __init__(self, **kwargs):
+        kwargs.update(endpoint="https://stub.search.windows.net", index_name="products", credential=AzureKeyCredential("key"))
+        super().__init__(**kwargs)
+        self._index_key = "id"
+
+    @classmethod
+    def reset(cls, failing=()):
+        cls.failing, cls.sent, cls.requests = set(failing), [], []
+
+    def _index_documents_actions(self, actions, **kwargs):
+        StubSender.sent.extend(dict(action.items()) for action in actions)
+        StubSender.requests.append(len(actions))
+        return [IndexingResult(key=action.get("id"), succeeded=action.get("id") not in self.failing,
+                               status_code=400 if action.get("id") in self.failing else 200)
+                for action in actions]
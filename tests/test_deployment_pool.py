@@ -0,0 +1,59 @@
+# tests/test_deployment_pool.py
+"""
+Hedging across deployments (utils.deployment_pool).
+
+    python -m pytest tests/test_deployment_pool.py
+"""
+import httpx
+import openai
+import pytest
+
+from utils.deployment_pool import Deployment, DeploymentPool
+
+
+class FakeModelInfo:
+    def __init__(self, endpoint: str = ""):
+        self.endpoint = endpoint
+
+    def model_copy(self, update):
+        return FakeModelInfo(update["endpoint"])
+
+
+def make_pool():
+    return DeploymentPool("pool-test", [
+        Deployment(label, f"https://{label}.openai.azure.com", "key", "o3-mini", "2024-12-01-preview", None)
+        for label in ("east", "west")
+    ])
+
+
+def bad_request():
+    request = httpx.Request("POST", "https://east.openai.azure.com/openai/deployments/o3-mini/chat/completions")
+    return openai.BadRequestError("invalid messages", response=httpx.Response(400, request=request), body=None)
+
+
+def test_non_retryable_error_is_raised_without_a_hedge():
+    calls = []
+
+    def fn(model_info):
+        calls.append(model_info.endpoint)
+        raise bad_request()
+
+    with pytest.raises(openai.BadRequestError):
+        make_pool().call(fn, FakeModelInfo())
+
+    assert len(calls) == 1
+
+
+def test_retryable_error_is_hedged_to_the_other_deployment():
+    calls = []
+
+    def fn(model_info):
+        calls.append(model_info.endpoint)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return model_info.endpoint
+
+    result = make_pool().call(fn, FakeModelInfo())
+
+    assert len(calls) == 2
+    assert result == calls[1] != calls[0]
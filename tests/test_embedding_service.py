@@ -0,0 +1,63 @@
+# tests/test_embedding_service.py
+"""
+Deadlines of callers whose texts are merged into one embeddings call
+(utils.embedding_service.EmbeddingService).
+
+    python -m pytest tests/test_embedding_service.py
+"""
+import threading
+import time
+
+import numpy as np
+from openai import AzureOpenAI
+
+from utils.embedding_service import EmbeddingService
+from utils.openai_data_models import EmbeddingModelnfo
+from utils.retry_policy import remaining_time, request_deadline
+
+
+class SlowEmbeddingService(EmbeddingService):
+    """
+    Embeds after `seconds` and records the time left of the deadline the call ran with.
+    """
+    seconds = 0.5
+
+    def __init__(self):
+        client = AzureOpenAI(azure_endpoint="https://stub.openai.azure.com", api_key="key", api_version="2024-12-01-preview")
+        super().__init__(EmbeddingModelnfo(client=client), cache_dir=None, batch_wait_ms=200)
+        self.remaining = []
+
+    def _request(self, texts):
+        self.remaining.append(remaining_time())
+        time.sleep(self.seconds)
+        return np.ones((len(texts), self.dimensions), dtype=np.float32)
+
+
+def test_each_caller_waits_until_its_own_deadline():
+    service = SlowEmbeddingService()
+    results = {}
+
+    def embed(name, seconds):
+        with request_deadline(seconds):
+            try:
+                results[name] = service.embed_one(name).shape
+            except TimeoutError:
+                results[name] = "timeout"
+
+    callers = [threading.Thread(target=embed, args=("short", 0.3)), threading.Thread(target=embed, args=("long", 5.0))]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    assert results == {"short": "timeout", "long": (1536,)}
+    # One merged call, bounded by the later deadline rather than the first caller's
+    assert len(service.remaining) == 1
+    assert service.remaining[0] > 1.0
+
+
+def test_without_a_deadline_the_caller_waits_for_the_batch():
+    service = SlowEmbeddingService()
+
+    assert service.embed(["a", "b", "a"]).shape == (3, 1536)
+    assert service.remaining == [None]
@@ -0,0 +1,46 @@
+# tests/test_embedding_store.py
+"""
+utils.embedding_service.EmbeddingStore recovery from torn appends and sharing of the
+cache files between stores (as between the server and the catalog CLIs).
+
+    python -m pytest tests/test_embedding_store.py
+"""
+import numpy as np
+
+from utils.embedding_service import EmbeddingStore
+
+
+def vectors(*values):
+    return np.asarray([[v] * 4 for v in values], dtype=np.float32)
+
+
+def test_torn_index_tail_is_dropped_and_truncated(tmp_path):
+    path = str(tmp_path / "model-4")
+    EmbeddingStore(path, 4).put_many(["a", "b"], vectors(1, 2))
+    # Interrupted appends: a line without its vector, then a partial line
+    with open(path + ".idx", "ab") as f:
+        f.write(b"c\nd")
+
+    store = EmbeddingStore(path, 4)
+
+    assert len(store) == 2
+    with open(path + ".idx", "rb") as f:
+        assert f.read() == b"a\nb\n"
+    store.put_many(["e"], vectors(5))
+    a, b, e = store.get_many(["a", "b", "e"])
+    assert (a[0], b[0], e[0]) == (1, 2, 5)
+    assert len(EmbeddingStore(path, 4)) == 3
+
+
+def test_stores_sharing_files_append_after_each_other(tmp_path):
+    path = str(tmp_path / "model-4")
+    server, cli = EmbeddingStore(path, 4), EmbeddingStore(path, 4)
+
+    server.put_many(["a"], vectors(1))
+    cli.put_many(["b", "a"], vectors(2, 1))
+    server.put_many(["c"], vectors(3))
+
+    assert [v[0] for v in server.get_many(["a", "b", "c"])] == [1, 2, 3]
+    assert [v[0] for v in cli.get_many(["a", "b"])] == [1, 2]
+    reloaded = EmbeddingStore(path, 4)
+    assert [v[0] for v in reloaded.get_many(["a", "b", "c"])] == [1, 2, 3]
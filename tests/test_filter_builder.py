@@ -0,0 +1,30 @@
+# tests/test_filter_builder.py
+"""
+Length capping of the phase1 filter (search.filter_builder.build_filter).
+
+    python -m pytest tests/test_filter_builder.py
+"""
+from search.filter_builder import build_filter, build_filter_tree
+
+
+def test_longest_field_is_trimmed_first():
+    filter_obj = {
+        "description": [f"long description phrase number {i}" for i in range(8)],
+        "brand": ["Bosch", "Makita", "DeWalt", "Ryobi", "Metabo", "Hilti", "Festool", "Milwaukee"],
+    }
+    full = build_filter(filter_obj)
+    # Room for the full brand clause and a few description terms only
+    limit = len(full) - 120
+
+    expr = build_filter(filter_obj, max_length=limit)
+
+    assert len(expr) <= limit
+    assert all(brand in expr for brand in filter_obj["brand"])
+    assert "number 0" in expr and "number 7" not in expr
+    assert expr == build_filter_tree(filter_obj, field_limits={"description": expr.count("long description")}).render()
+
+
+def test_filter_within_limit_is_unchanged():
+    filter_obj = {"title": ["cordless drill", "Cordless  Drill"], "categories": ["Tools"]}
+
+    assert build_filter(filter_obj) == build_filter_tree(filter_obj).render()
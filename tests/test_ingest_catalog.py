@@ -0,0 +1,51 @@
+# tests/test_ingest_catalog.py
+"""
+Drives search.ingest_catalog.ingest() against a stubbed indexing sender and embedding
+service (tests/stubs.py).
+
+    python -m pytest tests/test_ingest_catalog.py
+"""
+import os
+import json
+
+import pytest
+
+import search.ingest_catalog as ingest_catalog
+from tests.stubs import StubEmbeddingService, StubSender
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_catalog, "SearchIndexingBufferedSender", StubSender)
+    monkeypatch.setattr(ingest_catalog, "get_embedding_service", lambda model: StubEmbeddingService())
+    StubSender.reset()
+    path = tmp_path / "catalog.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(25):
+            f.write(json.dumps({"id": f"p{i}", "title": f"Product {i}", "brand": "Sony", "price": i + 1}) + "\n")
+    return str(path), str(tmp_path / "ingest.checkpoint.json")
+
+
+def test_chunks_are_sent_in_upload_batches_and_failures_are_recorded(catalog):
+    path, checkpoint_path = catalog
+    StubSender.reset(failing={"p3", "p17"})
+
+    stats = ingest_catalog.ingest(path, chunk_size=10, upload_workers=2, checkpoint_path=checkpoint_path, upload_batch_size=4)
+
+    assert max(StubSender.requests) <= 4 and sum(StubSender.requests) == 25
+    assert (stats.uploaded, stats.failed) == (23, 2)
+    with open(checkpoint_path + ".errors.jsonl", "r", encoding="utf-8") as f:
+        errors = [json.loads(line) for line in f]
+    assert sorted(e["id"] for e in errors) == ["p17", "p3"]
+    assert all("@search.action" not in e and "titleVector" not in e for e in errors)
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["records"] == 25
+
+
+def test_dry_run_leaves_the_checkpoint_alone(catalog):
+    path, checkpoint_path = catalog
+
+    stats = ingest_catalog.ingest(path, chunk_size=10, checkpoint_path=checkpoint_path, dry_run=True)
+
+    assert stats.embedded == 25 and not StubSender.sent
+    assert not os.path.exists(checkpoint_path)
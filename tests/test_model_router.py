@@ -0,0 +1,34 @@
+# tests/test_model_router.py
+"""
+Phase2 re-check against the SLO and the request deadline (search.model_router).
+
+    python -m pytest tests/test_model_router.py
+"""
+from search.model_router import ModelRouter
+from search.search_data_models import RouteDecision
+from utils.retry_policy import request_deadline
+
+
+def make_router(phase2_seconds: float) -> ModelRouter:
+    router = ModelRouter(slo_seconds=30.0)
+    for _ in range(10):
+        router.record("o3-mini", "phase2", phase2_seconds)
+    return router
+
+
+def test_phase1_time_is_not_counted_twice_against_the_deadline():
+    router = make_router(phase2_seconds=15.0)
+    decision = RouteDecision(requested_model="o3-mini", model="o3-mini")
+
+    # 10 s of phase1 already spent: 20 s left of both the SLO and the request deadline
+    with request_deadline(20.0):
+        assert router.should_run_phase2(decision, elapsed=10.0)
+
+
+def test_phase2_is_dropped_when_the_deadline_is_closer_than_the_slo():
+    router = make_router(phase2_seconds=15.0)
+    decision = RouteDecision(requested_model="o3-mini", model="o3-mini")
+
+    with request_deadline(10.0):
+        assert not router.should_run_phase2(decision, elapsed=1.0)
+    assert "phase2 skipped" in decision.reason
@@ -0,0 +1,64 @@
+# tests/test_profile_store.py
+"""
+JSON-lines import into the SQLite profile store (utils.profile_store): record shapes,
+customer ids and cache invalidation after a re-import.
+
+    python -m pytest tests/test_profile_store.py
+"""
+import json
+import threading
+
+import pytest
+
+from utils.profile_store import SqliteProfileStore, import_profiles, read_profiles
+
+
+PROFILE = {"name": "Emily Davis", "gender": "female", "purchase_statistics": {"total_spent": 120.0},
+           "inferred_purchasing_behavior": {}, "additional_notes": ""}
+
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def test_flat_and_file_shaped_records_are_stored_in_the_file_shape(tmp_path):
+    source, db = tmp_path / "profiles.jsonl", str(tmp_path / "profiles.sqlite")
+    write_jsonl(source, [
+        dict(PROFILE, customer_id="c1"),
+        {"customer_id": "c2", "customer_profile": dict(PROFILE, name="Jon Max")},
+    ])
+
+    assert import_profiles(str(source), db) == 2
+
+    store = SqliteProfileStore(db)
+    assert store.list() == ["c1", "c2"]
+    assert store.get("c1").data["customer_profile"]["gender"] == "female"
+    assert store.get("c2").data["customer_profile"]["name"] == "Jon Max"
+
+
+def test_id_field_is_found_inside_customer_profile(tmp_path):
+    source = tmp_path / "profiles.jsonl"
+    write_jsonl(source, [{"customer_profile": PROFILE}, PROFILE])
+
+    assert [customer_id for customer_id, _ in read_profiles(str(source), id_field="name")] == ["Emily Davis"] * 2
+    with pytest.raises(ValueError, match="no 'customer_id' field"):
+        list(read_profiles(str(source)))
+
+
+def test_reimport_is_seen_by_a_thread_that_has_not_read_before(tmp_path):
+    source, db = tmp_path / "profiles.jsonl", str(tmp_path / "profiles.sqlite")
+    write_jsonl(source, [dict(PROFILE, customer_id="c1")])
+    import_profiles(str(source), db)
+    store = SqliteProfileStore(db, reload_seconds=0.0)
+    assert store.get("c1").data["customer_profile"]["name"] == "Emily Davis"
+
+    write_jsonl(source, [dict(PROFILE, customer_id="c1", name="Emily Clark")])
+    import_profiles(str(source), db)
+
+    names = []
+    reader = threading.Thread(target=lambda: names.append(store.get("c1").data["customer_profile"]["name"]))
+    reader.start()
+    reader.join()
+    assert names == ["Emily Clark"]
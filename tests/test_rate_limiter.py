@@ -0,0 +1,31 @@
+# tests/test_rate_limiter.py
+"""
+Limiter lookup per deployment and resource (utils.rate_limiter, utils.openai_helpers).
+
+    python -m pytest tests/test_rate_limiter.py
+"""
+from types import SimpleNamespace
+
+from utils.openai_helpers import rate_limited_llm_call
+from utils.rate_limiter import get_rate_limiter, observe_response
+
+
+def test_same_deployment_name_in_two_resources_gets_two_limiters():
+    east = get_rate_limiter("pool-test-o3-mini", tokens_per_minute=1000, endpoint="https://east.openai.azure.com")
+    west = get_rate_limiter("pool-test-o3-mini", tokens_per_minute=1000, endpoint="https://west.openai.azure.com")
+
+    assert east is not west
+    assert get_rate_limiter("pool-test-o3-mini", endpoint="https://east.openai.azure.com") is east
+
+
+def test_throttling_one_resource_leaves_the_other_alone():
+    @rate_limited_llm_call
+    def call(messages, model_info):
+        observe_response(SimpleNamespace(status_code=429, headers={"retry-after": "30"}))
+
+    east = SimpleNamespace(model="pool-test-gpt-4o", endpoint="https://east.openai.azure.com")
+    west = SimpleNamespace(model="pool-test-gpt-4o", endpoint="https://west.openai.azure.com")
+    call([{"role": "user", "content": "hi"}], east)
+
+    assert get_rate_limiter("pool-test-gpt-4o", endpoint=east.endpoint).rate_factor < 1.0
+    assert get_rate_limiter("pool-test-gpt-4o", endpoint=west.endpoint).rate_factor == 1.0
@@ -0,0 +1,78 @@
+# tests/test_sync_catalog.py
+"""
+Drives search.sync_catalog.sync() against a stubbed indexing sender and embedding
+service: the real SearchIndexingBufferedSender batching and callbacks run, only the
+indexing request and the embeddings are replaced.
+
+    python -m pytest tests/test_sync_catalog.py
+"""
+import json
+
+import pytest
+
+import search.sync_catalog as sync_catalog
+from tests.stubs import StubEmbeddingService, StubSender
+
+
+def write_catalog(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_catalog, "SearchIndexingBufferedSender", StubSender)
+    monkeypatch.setattr(sync_catalog, "get_embedding_service", lambda model: StubEmbeddingService())
+    StubSender.reset()
+    records = [{"id": f"p{i}", "title": f"Product {i}", "brand": "Sony", "description": "Headphones", "price": 10.0 * i}
+               for i in range(1, 4)]
+    path = tmp_path / "catalog.jsonl"
+    write_catalog(path, records)
+    return path, records
+
+
+def read_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_failed_documents_are_retried_on_the_next_sync(catalog, tmp_path):
+    path, _ = catalog
+    manifest_path = str(tmp_path / "catalog.manifest.json")
+    StubSender.reset(failing={"p2"})
+
+    counts = sync_catalog.sync(str(path), manifest_path=manifest_path)
+
+    assert counts == {"embedded": 3, "merged": 0, "deleted": 0, "failed": 1}
+    assert all(action["@search.action"] == "mergeOrUpload" and "titleVector" in action for action in StubSender.sent)
+    manifest = read_manifest(manifest_path)
+    assert sorted(manifest["documents"]) == ["p1", "p3"]
+    assert manifest["catalog_md5"] is None
+
+    StubSender.reset()
+    counts = sync_catalog.sync(str(path), manifest_path=manifest_path)
+
+    assert counts == {"embedded": 1, "merged": 0, "deleted": 0, "failed": 0}
+    assert [action["id"] for action in StubSender.sent] == ["p2"]
+    manifest = read_manifest(manifest_path)
+    assert sorted(manifest["documents"]) == ["p1", "p2", "p3"]
+    assert manifest["catalog_md5"] is not None
+
+
+def test_price_change_merges_without_vectors_and_removed_ids_are_deleted(catalog, tmp_path):
+    path, records = catalog
+    manifest_path = str(tmp_path / "catalog.manifest.json")
+    sync_catalog.sync(str(path), manifest_path=manifest_path)
+
+    records[0]["price"] = 99.0
+    write_catalog(path, records[:2])
+    StubSender.reset()
+    counts = sync_catalog.sync(str(path), manifest_path=manifest_path)
+
+    assert counts == {"embedded": 0, "merged": 1, "deleted": 1, "failed": 0}
+    merged, deleted = StubSender.sent
+    assert merged["@search.action"] == "merge" and merged["id"] == "p1" and merged["price"] == 99.0
+    assert not any(field in merged for field in sync_catalog.VECTOR_SOURCES)
+    assert deleted == {"@search.action": "delete", "id": "p3"}
+    assert sorted(read_manifest(manifest_path)["documents"]) == ["p1", "p2"]
@@ -0,0 +1,67 @@
+# tests/test_tracing.py
+"""
+OTLP export off the request path (utils.tracing.OtlpHttpSpanExporter).
+
+    python -m pytest tests/test_tracing.py
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.tracing import OtlpHttpSpanExporter, Span
+
+
+class SlowCollector(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        time.sleep(0.5)
+        SlowCollector.received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def collector():
+    SlowCollector.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowCollector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def finished_span(name: str) -> Span:
+    span = Span(name, trace_id="0" * 32)
+    span.end()
+    return span
+
+
+def test_export_does_not_wait_for_the_collector(collector):
+    exporter = OtlpHttpSpanExporter(collector)
+
+    start = time.perf_counter()
+    exporter.export([finished_span("search")])
+    assert time.perf_counter() - start < 0.1
+
+    exporter.flush()
+    spans = SlowCollector.received[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["search"]
+
+
+def test_traces_beyond_the_queue_size_are_dropped(collector):
+    exporter = OtlpHttpSpanExporter(collector, queue_size=1)
+
+    exporter.export([finished_span("a")])
+    time.sleep(0.1)
+    for name in ("b", "c", "d"):
+        exporter.export([finished_span(name)])
+    exporter.flush()
+
+    # "a" in flight and "b" queued; the others were dropped
+    assert len(SlowCollector.received) == 2
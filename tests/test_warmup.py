@@ -0,0 +1,60 @@
+# tests/test_warmup.py
+"""
+Speculative expansions on customer selection (search.warmup): the likely queries come
+from recent purchases, and a first search for one of them is an expansion cache hit.
+
+    python -m pytest tests/test_warmup.py
+"""
+import search.retail_search_ai as retail_search_ai
+from search.search_data_models import ExpandedSearch
+from search.search_processing import get_model_instance
+from search.warmup import likely_queries, speculate_expansions
+from utils.profile_store import CustomerProfile
+
+
+PROFILE = {"customer_profile": {
+    "name": "Emily Davis",
+    "latest_5_transactions": [
+        {"purchase_date": "2024-05-02", "items": [{"name": "Bamboo Cutting Board", "category": "Kitchenware", "price": 25.0}]},
+        {"purchase_date": "2024-06-12", "items": [
+            {"name": "Ceramic Plant Pot", "category": "Indoor gardening", "price": 18.0},
+            {"name": "Chef Knife", "category": "Kitchenware", "price": 60.0},
+        ]},
+    ],
+    "inferred_purchasing_behavior": {"preferred_product_types": ["Home decor"]},
+    "additional_notes": {"likely_future_interests": ["Seasonal home decor collections"]},
+}}
+
+
+def test_likely_queries_follow_the_recent_purchases():
+    profile = CustomerProfile("emily_davis.json", PROFILE)
+
+    assert likely_queries(profile, 4) == ["Kitchenware", "Indoor gardening", "Chef Knife", "Ceramic Plant Pot"]
+
+
+def test_likely_queries_without_purchases_use_the_inferred_behavior():
+    profile = CustomerProfile("emily_davis.json", {"customer_profile": dict(PROFILE["customer_profile"], latest_5_transactions=[])})
+
+    assert likely_queries(profile, 2) == ["Home decor", "Seasonal home decor collections"]
+
+
+def test_first_search_after_warmup_hits_the_expansion_cache(monkeypatch):
+    expansions = []
+
+    def fake_expansion(prompt, response_format, model_info):
+        expansions.append(prompt)
+        return ExpandedSearch(expanded_terms=["knife"])
+
+    monkeypatch.setattr(retail_search_ai, "call_llm_structured_outputs", fake_expansion)
+    monkeypatch.setattr(retail_search_ai, "expansion_cache_seconds", 600.0)
+    retail_search_ai._expansion_cache.clear()
+    profile = CustomerProfile("emily_davis.json", PROFILE)
+    model_info = get_model_instance("o3-mini-high")
+
+    speculate_expansions(profile, "o3-mini-high", 3)
+    assert len(expansions) == 3
+
+    hits = retail_search_ai.EXPANSION_CACHE_LOOKUPS.value(result="hit")
+    retail_search_ai.expand_query("kitchenware", profile.prompt_text, model_info)
+    assert len(expansions) == 3
+    assert retail_search_ai.EXPANSION_CACHE_LOOKUPS.value(result="hit") == hits + 1
@@ -0,0 +1,228 @@
+# utils/deployment_pool.py
+"""
+Multiple Azure OpenAI deployments per logical model, with health-weighted load
+balancing and hedged requests.
+
+Additional deployments of a model are configured with numbered variants of its
+environment variables, e.g. for o3-mini:
+    AZURE_OPENAI_RESOURCE_O3_MINI_2, AZURE_OPENAI_KEY_O3_MINI_2,
+    AZURE_OPENAI_MODEL_O3_MINI_2, AZURE_OPENAI_API_VERSION_O3_MINI_2   (up to _9)
+The model and API version default to those of the primary deployment.
+
+Every call goes to a deployment picked at random, weighted by its health (recent
+error rate and latency). With more than one deployment the call is hedged: if it
+has not answered by that deployment's p90 latency, a duplicate is sent to another
+deployment and whichever answers first wins. A primary that fails early with a
+retryable error (utils.retry_policy.is_retryable) is hedged at once; other errors
+(400, 401, 422, ...) are raised as they are. The losing leg stops retrying at once;
+a request it already has in flight cannot be aborted with the synchronous SDK and
+its result is discarded when it completes.
+Hedges are drawn from a budget (LLM_HEDGE_BUDGET_RATIO, default 0.1 per call) so
+they add at most ~10% load.
+
+Configuration (environment variables):
+    LLM_HEDGING                 set to 0 to disable hedging (default 1)
+    LLM_HEDGE_DEFAULT_DELAY     hedge delay in seconds until a deployment has latency samples (default 30)
+    LLM_HEDGE_BUDGET_RATIO      hedges earned per call (default 0.1)
+"""
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from rich.console import Console
+
+from utils.openai_data_models import deployment_env_suffix, get_secondary_deployments, create_client
+from utils.metrics import counter
+from utils.retry_policy import RetryBudget, cancellation_scope, is_retryable
+from utils.tracing import current_span
+
+console = Console()
+
+
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "1") != "0"
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 30))
+HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", 0.1))
+
+MIN_LATENCY_SAMPLES = 5
+# Weight of the latest outcome in the exponentially weighted error rate
+ERROR_EWMA_ALPHA = 0.2
+
+
+LLM_DEPLOYMENT_CALLS = counter(
+    "llm_deployment_calls_total",
+    "LLM calls per deployment, by outcome.",
+    ("model", "deployment", "outcome")
+)
+LLM_HEDGES = counter(
+    "llm_hedges_total",
+    "Hedged LLM calls, by which request answered first.",
+    ("model", "winner")
+)
+
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", 32)), thread_name_prefix="llm-hedge")
+
+
+class Deployment:
+    """
+    One deployment of a model and its recent health.
+    """
+
+    def __init__(self, label: str, endpoint: str, key: str, model: str, api_version: str, client):
+        self.label = label
+        self.endpoint = endpoint
+        self.key = key
+        self.model = model
+        self.api_version = api_version
+        self.client = client
+        self.latencies = deque(maxlen=50)
+        self.error_rate = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.latencies.append(seconds)
+            self.error_rate = (1 - ERROR_EWMA_ALPHA) * self.error_rate + ERROR_EWMA_ALPHA * (0.0 if ok else 1.0)
+
+    def p90(self) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            return float(np.percentile(list(self.latencies), 90))
+
+    def weight(self, default_latency: float) -> float:
+        with self._lock:
+            latency = float(np.mean(self.latencies)) if self.latencies else default_latency
+            health = (1.0 - self.error_rate) ** 2
+        return max(health, 0.01) / max(latency, 0.1)
+
+
+class DeploymentPool:
+    """
+    The deployments of one logical model. `call` runs a function against one of them,
+    hedging to a second deployment when the first is slow.
+    """
+
+    def __init__(self, model_name: str, deployments: List[Deployment]):
+        self.model_name = model_name
+        self.deployments = deployments
+        self.hedge_budget = RetryBudget(ratio=HEDGE_BUDGET_RATIO, min_per_second=0.0, max_tokens=5.0)
+
+    def pick(self, exclude: Optional[Deployment] = None) -> Deployment:
+        candidates = [d for d in self.deployments if d is not exclude] or self.deployments
+        means = [float(np.mean(d.latencies)) for d in candidates if d.latencies]
+        default_latency = float(np.mean(means)) if means else 1.0
+        weights = [d.weight(default_latency) for d in candidates]
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    def _run(self, deployment: Deployment, fn: Callable, model_info):
+        start = time.perf_counter()
+        try:
+            result = fn(model_info.model_copy(update={
+                "endpoint": deployment.endpoint,
+                "key": deployment.key,
+                "model": deployment.model,
+                "api_version": deployment.api_version,
+                "client": deployment.client,
+            }))
+        except Exception:
+            deployment.record(time.perf_counter() - start, ok=False)
+            LLM_DEPLOYMENT_CALLS.inc(model=self.model_name, deployment=deployment.label, outcome="error")
+            raise
+        deployment.record(time.perf_counter() - start, ok=True)
+        LLM_DEPLOYMENT_CALLS.inc(model=self.model_name, deployment=deployment.label, outcome="ok")
+        return result
+
+    def _run_leg(self, deployment: Deployment, fn: Callable, model_info, cancelled: threading.Event):
+        with cancellation_scope(cancelled):
+            return self._run(deployment, fn, model_info)
+
+    def _submit(self, deployment: Deployment, fn: Callable, model_info, cancelled: threading.Event):
+        # Each leg runs with a copy of the caller's context (span, deadline, priority)
+        context = contextvars.copy_context()
+        return _executor.submit(context.run, self._run_leg, deployment, fn, model_info, cancelled)
+
+    def call(self, fn: Callable, model_info):
+        """
+        Calls `fn(model_info_for_deployment)` and returns the first successful result.
+        """
+        primary = self.pick()
+        if len(self.deployments) == 1 or not HEDGING_ENABLED:
+            return self._run(primary, fn, model_info)
+
+        self.hedge_budget.deposit()
+        hedge_delay = primary.p90() or HEDGE_DEFAULT_DELAY
+        cancelled = threading.Event()
+        legs = {self._submit(primary, fn, model_info, cancelled): "primary"}
+
+        done, _ = wait(legs, timeout=hedge_delay)
+        first_failed = False
+        if done:
+            error = next(iter(done)).exception()
+            if error is None:
+                return next(iter(done)).result()
+            # A bad request or key fails on every deployment: no duplicate for those
+            if not is_retryable(error):
+                raise error
+            first_failed = True
+
+        # The primary is slow (or failed): send a duplicate to another deployment
+        if first_failed or self.hedge_budget.try_withdraw():
+            secondary = self.pick(exclude=primary)
+            current_span().add_event("hedge", {
+                "llm.model": self.model_name,
+                "hedge.primary": primary.label,
+                "hedge.secondary": secondary.label,
+                "hedge.reason": "primary_failed" if first_failed else "primary_slow",
+                "hedge.delay_seconds": round(hedge_delay, 3),
+            })
+            legs[self._submit(secondary, fn, model_info, cancelled)] = "secondary"
+
+        pending = set(legs)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Stops the other leg from retrying; a request already in flight finishes in the background
+                    cancelled.set()
+                    for other in pending:
+                        other.cancel()
+                    if len(legs) > 1:
+                        LLM_HEDGES.inc(model=self.model_name, winner=legs[future])
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+
+_pools: Dict[Tuple[str, str, str], DeploymentPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_deployment_pool(model_info) -> DeploymentPool:
+    """
+    Returns the pool of an instantiated model info: its own deployment as the primary,
+    plus any numbered secondary deployments configured in the environment.
+    """
+    key = (model_info.model_name, model_info.endpoint, model_info.model)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            deployments = [Deployment("primary", model_info.endpoint, model_info.key, model_info.model,
+                                      model_info.api_version, model_info.client)]
+            if model_info.provider == "azure":
+                for label, endpoint, api_key, model, api_version in get_secondary_deployments(model_info):
+                    client = create_client(model_info.provider, endpoint, api_key, api_version)
+                    deployments.append(Deployment(label, endpoint, api_key, model, api_version, client))
+            if len(deployments) > 1:
+                console.log(f"{model_info.model_name}: {len(deployments)} deployments configured ({deployment_env_suffix(model_info.model_name)}_2..)")
+            pool = DeploymentPool(model_info.model_name, deployments)
+            _pools[key] = pool
+        return pool
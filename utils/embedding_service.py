@@ -0,0 +1,317 @@
+# utils/embedding_service.py
+"""
+Batched, cached text embeddings.
+
+`EmbeddingService.embed` queues texts for a background worker that collects the
+requests of concurrent callers for up to EMBEDDING_BATCH_WAIT_MS and sends them as
+one embeddings call with up to EMBEDDING_BATCH_SIZE inputs. Vectors are returned as
+float32 NumPy arrays. A merged call runs outside any caller's context, with the
+latest deadline and the most urgent priority of its callers; each caller stops
+waiting at its own request deadline.
+
+Every vector is also written to an on-disk cache, so a text is embedded once per
+model across requests and restarts. The cache of a model is two append-only files:
+    <EMBEDDING_CACHE_DIR>/<model>-<dims>.f32   the vectors, float32 rows, read through np.memmap
+    <EMBEDDING_CACHE_DIR>/<model>-<dims>.idx   one sha1 of the text per row
+The server and the catalog CLIs share these files: appends hold an exclusive lock on
+<model>-<dims>.lock and first pick up the rows other processes appended, and a torn
+tail left by an interrupted append (partial .idx line, .idx line without its vector)
+is cut off the .idx file.
+
+The same service serves query-time vectorization (`embed_one`) and bulk
+re-embedding (`embed_many`, which bypasses the queue and sends full batches).
+
+Configuration (environment variables):
+    EMBEDDING_CACHE_DIR         cache directory (default embedding_cache); set to "" to disable the disk cache
+    EMBEDDING_BATCH_SIZE        inputs per embeddings call (default 64)
+    EMBEDDING_BATCH_WAIT_MS     how long the worker waits for more requests before sending a batch (default 5)
+"""
+import os
+import re
+import time
+import queue
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rich.console import Console
+
+from utils.openai_data_models import EmbeddingModelnfo, instantiate_model
+from utils.metrics import counter, histogram
+from utils.rate_limiter import current_priority, request_priority
+from utils.retry_policy import remaining_time, request_deadline
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+console = Console()
+
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+
+
+EMBEDDING_CACHE_LOOKUPS = counter(
+    "embedding_cache_total",
+    "Embedding cache lookups, by result.",
+    ("model", "result")
+)
+EMBEDDING_BATCH_SIZES = histogram(
+    "embedding_batch_size",
+    "Inputs per embeddings API call.",
+    ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+)
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path: str):
+    """
+    Exclusive lock on path across processes, held for the with block.
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingStore:
+    """
+    Append-only float32 vector cache keyed by text hash, memory-mapped for reads.
+    Row n of the .f32 file belongs to line n of the .idx file.
+    """
+
+    def __init__(self, path: str, dimensions: int):
+        self.dimensions = dimensions
+        self.vectors_path = path + ".f32"
+        self.index_path = path + ".idx"
+        self.lock_path = path + ".lock"
+        self._rows: Dict[str, int] = {}
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._count = 0
+        # Bytes of the .idx file already read into _rows
+        self._index_offset = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _file_lock(self.lock_path):
+            self._refresh()
+
+    def _refresh(self):
+        """
+        Reads the .idx lines appended since the last refresh, by this or another process.
+        Only complete lines whose vector is fully written count; anything after them is
+        a torn append and is truncated, so the next append starts on a line boundary.
+        Must be called with the file lock held.
+        """
+        if not os.path.exists(self.index_path):
+            return
+        stored_rows = os.path.getsize(self.vectors_path) // (4 * self.dimensions) if os.path.exists(self.vectors_path) else 0
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            appended = f.read()
+        lines = appended[:appended.rfind(b"\n") + 1].splitlines(keepends=True)
+        for line in lines[:max(stored_rows - self._count, 0)]:
+            self._rows[line.strip().decode("ascii")] = self._count
+            self._count += 1
+            self._index_offset += len(line)
+        if self._index_offset < os.path.getsize(self.index_path):
+            with open(self.index_path, "r+b") as f:
+                f.truncate(self._index_offset)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _mapped(self) -> Optional[np.memmap]:
+        if self._count == 0:
+            return None
+        if self._map is None or self._map.shape[0] < self._count:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dimensions))
+        return self._map
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            rows = [self._rows.get(key) for key in keys]
+            vectors = self._mapped()
+            return [np.array(vectors[row]) if row is not None else None for row in rows]
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        with self._lock:
+            if all(key in self._rows for key in keys):
+                return
+            with _file_lock(self.lock_path):
+                # Rows appended by other processes come first, so ours go after them
+                self._refresh()
+                new = list({key: vector for key, vector in zip(keys, vectors) if key not in self._rows}.items())
+                if not new:
+                    return
+                # Vectors are written before their index lines, so the index never points past the data
+                with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                    f.seek(self._count * 4 * self.dimensions)
+                    f.write(np.asarray([v for _, v in new], dtype=np.float32).tobytes())
+                lines = "".join(key + "\n" for key, _ in new).encode("ascii")
+                with open(self.index_path, "ab") as f:
+                    f.write(lines)
+                self._index_offset += len(lines)
+                for key, _ in new:
+                    self._rows[key] = self._count
+                    self._count += 1
+
+
+class EmbeddingService:
+    """
+    Embeds texts with one model, batching concurrent requests and caching the vectors.
+    """
+
+    def __init__(self, model_info: EmbeddingModelnfo, cache_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        if model_info.client is None:
+            model_info = instantiate_model(model_info)
+        self.model_info = model_info
+        self.dimensions = model_info.dimensions
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.store = None
+        if cache_dir:
+            name = re.sub(r"[^A-Za-z0-9._-]", "_", model_info.model_name)
+            self.store = EmbeddingStore(os.path.join(cache_dir, f"{name}-{model_info.dimensions}"), model_info.dimensions)
+        # (text, future, caller's deadline on the time.monotonic clock or None, caller's priority)
+        self._queue: "queue.Queue[Tuple[str, Future, Optional[float], int]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"embeddings-{model_info.model_name}", daemon=True)
+        self._worker.start()
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        from utils.openai_helpers import embed_batch
+
+        EMBEDDING_BATCH_SIZES.observe(len(texts), model=self.model_info.model_name)
+        vectors = np.asarray(embed_batch(texts, self.model_info), dtype=np.float32)
+        if self.store is not None:
+            self.store.put_many([text_key(t) for t in texts], vectors)
+        return vectors
+
+    def _cached(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        if self.store is None:
+            return [None] * len(texts)
+        found = self.store.get_many([text_key(t) for t in texts])
+        hits = sum(v is not None for v in found)
+        if hits:
+            EMBEDDING_CACHE_LOOKUPS.inc(hits, model=self.model_info.model_name, result="hit")
+        if hits < len(texts):
+            EMBEDDING_CACHE_LOOKUPS.inc(len(texts) - hits, model=self.model_info.model_name, result="miss")
+        return found
+
+    def _request_batch(self, texts: List[str], deadline: Optional[float], priority: int) -> np.ndarray:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        with request_priority(priority), (nullcontext() if timeout is None else request_deadline(timeout)):
+            return self._request(texts)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                pass
+
+            # Identical texts of concurrent callers are embedded once
+            texts = list(dict.fromkeys(text for text, _, _, _ in batch))
+            # The call serves every caller of the batch: it runs in a fresh context, until the
+            # latest of their deadlines (none if one of them has none) and at the most urgent priority
+            deadlines = [deadline for _, _, deadline, _ in batch]
+            deadline = None if None in deadlines else max(deadlines)
+            priority = min(priority for _, _, _, priority in batch)
+            try:
+                vectors = contextvars.Context().run(self._request_batch, texts, deadline, priority)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    future.set_exception(e)
+                continue
+            by_text = dict(zip(texts, vectors))
+            for text, future, _, _ in batch:
+                future.set_result(by_text[text])
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Returns a (len(texts), dimensions) float32 array. Uncached texts are queued for
+        the batching worker together with those of other callers. Raises TimeoutError
+        when the request deadline passes before the batch has been embedded.
+        """
+        texts = list(texts)
+        found = self._cached(texts)
+        left = remaining_time()
+        deadline = None if left is None else time.monotonic() + left
+        priority = current_priority()
+        pending = {}
+        for text, vector in zip(texts, found):
+            if vector is None and text not in pending:
+                future = Future()
+                self._queue.put((text, future, deadline, priority))
+                pending[text] = future
+        vectors = [v if v is not None else self._result(pending[t], deadline) for t, v in zip(texts, found)]
+        return np.vstack(vectors) if vectors else np.empty((0, self.dimensions), dtype=np.float32)
+
+    @staticmethod
+    def _result(future: Future, deadline: Optional[float]) -> np.ndarray:
+        # The batch may run on for callers with a later deadline; this caller stops at its own
+        return future.result(timeout=None if deadline is None else max(deadline - time.monotonic(), 0.0))
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def embed_many(self, texts: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Bulk variant for re-embedding: sends uncached texts in full batches directly,
+        without waiting on the request queue.
+        """
+        texts = list(texts)
+        batch_size = batch_size or self.batch_size
+        found = self._cached(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+        embedded = {}
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            embedded.update(zip(chunk, self._request(chunk)))
+        vectors = [v if v is not None else embedded[t] for t, v in zip(texts, found)]
+        return np.vstack(vectors) if vectors else np.empty((0, self.dimensions), dtype=np.float32)
+
+
+_services: Dict[Tuple[str, str, int], EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_info: EmbeddingModelnfo = None) -> EmbeddingService:
+    """
+    Returns the process-wide service of an embedding model, creating it on first use.
+    """
+    model_info = model_info or EmbeddingModelnfo()
+    key = (model_info.provider, model_info.model_name, model_info.dimensions)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = EmbeddingService(model_info)
+            _services[key] = service
+        return service
@@ -0,0 +1,245 @@
+# utils/metrics.py
+"""
+Process-wide Prometheus-style metrics for the search pipeline.
+
+Counters and histograms live in a single registry and are rendered in the
+Prometheus text exposition format by `render_metrics()`, which `server.py`
+serves at `/metrics`; the backend loads this module by path and serves it from
+`backend/main.py` (see backend/utils/shared.py). Stage latencies are recorded with `stage_timer`, and LLM
+token counts and cost with `record_llm_usage`.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, Sequence, Optional, Any
+
+from utils.model_pricing import calculate_cost
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Searches routinely take 10-30s end to end, so the upper buckets are wide.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape_label_value(v)}"' for k, v in zip(labelnames, labelvalues)]
+    if extra:
+        pairs += [f'{k}="{_escape_label_value(v)}"' for k, v in extra.items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines += self._render_samples()
+        return "\n".join(lines)
+
+    def _render_samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing counter, optionally partitioned by labels.
+    """
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts")
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0.0)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative histogram with fixed buckets, optionally partitioned by labels.
+    """
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._label_values(labels))
+        return series[len(self.buckets)] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._series.get(self._label_values(labels))
+        return series[-1] if series else 0.0
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': _format_value(bound)})} {series[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {series[len(self.buckets)]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[len(self.buckets)]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds every metric of the process, keyed by name.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, metric_cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.get_or_create(Counter, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+SEARCH_STAGE_SECONDS = histogram(
+    "search_stage_duration_seconds",
+    "Time spent in each stage of the search pipeline.",
+    ("stage",)
+)
+SEARCH_STAGE_ERRORS = counter(
+    "search_stage_errors_total",
+    "Number of pipeline stages that raised an exception.",
+    ("stage",)
+)
+LLM_TOKENS = counter(
+    "llm_tokens_total",
+    "Tokens consumed by LLM calls, split into prompt and completion tokens.",
+    ("model", "type")
+)
+LLM_COST_USD = counter(
+    "llm_cost_usd_total",
+    "Estimated cost of LLM calls in USD.",
+    ("model",)
+)
+LLM_REQUESTS = counter(
+    "llm_requests_total",
+    "Number of successful LLM calls.",
+    ("model",)
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Times the enclosed block and records it in `search_stage_duration_seconds`.
+    The duration is recorded even if the block raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SEARCH_STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        SEARCH_STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_llm_usage(model: str, usage) -> Optional[Dict[str, Any]]:
+    """
+    Records token counts and estimated cost of one LLM response.
+
+    Args:
+        model: Deployment or model name used for the call.
+        usage: The `usage` object of an OpenAI response, or an equivalent dict.
+
+    Returns:
+        The cost breakdown, or None if the response carried no usage.
+    """
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+        }
+    model = model or "unknown"
+    cost_info = calculate_cost(model, usage)
+    LLM_REQUESTS.inc(model=model)
+    LLM_TOKENS.inc(cost_info["input_tokens"], model=model, type="prompt")
+    LLM_TOKENS.inc(cost_info["output_tokens"], model=model, type="completion")
+    LLM_COST_USD.inc(cost_info["total_cost"], model=model)
+    return cost_info
@@ -0,0 +1,68 @@
+# utils/model_pricing.py
+"""
+Prices of the OpenAI models and the cost of a call from its token usage.
+
+The one price table of the repository: the root app's metrics and the backend (which
+loads this file by path, see backend/utils/shared.py) both price calls with
+`calculate_cost`. No imports beyond the standard library, so it loads in either app.
+"""
+from typing import Any, Dict, Optional
+
+
+# Prices per million tokens, in USD
+model_pricing = {
+    "gpt-4.5": {"input": 75.0, "output": 150.0},
+    "gpt-45": {"input": 75.0, "output": 150.0},
+    "gpt-4o": {"input": 2.5, "output": 10.0},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+    "gpt-4": {"input": 30.0, "output": 60.0},
+    "gpt-3.5-turbo": {"input": 0.5, "output": 1.5},
+    "o1": {"input": 15.0, "output": 60.0},
+    "o1-mini": {"input": 1.1, "output": 4.4},
+    "o3-mini": {"input": 1.1, "output": 4.4},
+    "o3": {"input": 10.0, "output": 40.0},
+    "text-embedding-3-small": {"input": 0.02, "output": 0.0},
+    "text-embedding-3-large": {"input": 0.13, "output": 0.0},
+    "text-embedding-ada-002": {"input": 0.1, "output": 0.0},
+}
+
+# Used for models without a price
+FALLBACK_PRICING = {"input": 1.0, "output": 2.0}
+
+
+def calculate_cost(model: str, usage: dict, pricing_config: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
+    """
+    Calculates the cost of a call from its token usage, matching the model name
+    against the longest known pricing prefix (so "gpt-4o-mini" is not priced as "gpt-4o").
+    pricing_config replaces model_pricing if given.
+    """
+    pricing_config = pricing_config or model_pricing
+    pricing_model = None
+    for prefix in sorted(pricing_config, key=len, reverse=True):
+        if model.startswith(prefix):
+            pricing_model = prefix
+            break
+
+    pricing = pricing_config.get(pricing_model, FALLBACK_PRICING)
+
+    input_tokens = usage.get("prompt_tokens", 0) or 0
+    output_tokens = usage.get("completion_tokens", 0) or 0
+    total_tokens = usage.get("total_tokens", 0) or (input_tokens + output_tokens)
+
+    input_cost = (input_tokens / 1_000_000) * pricing["input"]
+    output_cost = (output_tokens / 1_000_000) * pricing["output"]
+
+    return {
+        "model": model,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens,
+        "input_cost": input_cost,
+        "output_cost": output_cost,
+        "total_cost": input_cost + output_cost,
+        "currency": "USD",
+        "pricing_details": {
+            "input_price_per_million": pricing["input"],
+            "output_price_per_million": pricing["output"]
+        }
+    }
@@ -2,10 +2,12 @@ import os
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List, Literal, Type, Union
 from pathlib import Path
-from openai import AzureOpenAI, OpenAI
+from openai import AzureOpenAI, OpenAI, DefaultHttpxClient
 from dotenv import load_dotenv
 load_dotenv()
 
+from utils.rate_limiter import observe_response
+
 
 from rich.console import Console
 console = Console()
@@ -175,6 +177,55 @@ class EmbeddingModelnfo(BaseModel):
 
 
 
+def create_client(provider: str, endpoint: str, key: str, api_version: str):
+    # Retries are handled by utils.retry_policy, not by the SDK; rate-limit headers
+    # of every response are fed back into utils.rate_limiter
+    http_client = DefaultHttpxClient(event_hooks={"response": [observe_response]})
+    if provider == "azure":
+        return AzureOpenAI(azure_endpoint=endpoint, 
+                           api_key=key, 
+                           api_version=api_version,
+                           max_retries=0,
+                           http_client=http_client)
+    return OpenAI(api_key=key, max_retries=0, http_client=http_client)
+
+
+# Environment variable suffix of each model's Azure deployment settings
+deployment_env_suffixes = {
+    "gpt-4o": "4O",
+    "gpt-45": "45",
+    "o1": "O1",
+    "o1-mini": "O1_MINI",
+    "o3": "O3",
+    "o3-mini": "O3_MINI",
+}
+
+
+def deployment_env_suffix(model_name: str) -> str:
+    return deployment_env_suffixes.get(model_name, model_name.upper().replace("-", "_"))
+
+
+def get_secondary_deployments(model_info, max_deployments: int = 9):
+    """
+    Reads the additional deployments of a model from numbered environment variables,
+    e.g. AZURE_OPENAI_RESOURCE_O3_MINI_2. Returns (label, endpoint, key, model, api_version) tuples.
+    """
+    suffix = deployment_env_suffix(model_info.model_name)
+    deployments = []
+    for i in range(2, max_deployments + 1):
+        resource = os.getenv(f"AZURE_OPENAI_RESOURCE_{suffix}_{i}")
+        if not resource:
+            break
+        deployments.append((
+            f"deployment_{i}",
+            get_azure_endpoint(resource),
+            os.getenv(f"AZURE_OPENAI_KEY_{suffix}_{i}", model_info.key),
+            os.getenv(f"AZURE_OPENAI_MODEL_{suffix}_{i}", model_info.model),
+            os.getenv(f"AZURE_OPENAI_API_VERSION_{suffix}_{i}", model_info.api_version),
+        ))
+    return deployments
+
+
 def instantiate_model(model_info: Union[MulitmodalProcessingModelInfo, 
                                    TextProcessingModelnfo, 
                                    EmbeddingModelnfo]):
@@ -264,12 +315,7 @@ def instantiate_model(model_info: Union[MulitmodalProcessingModelInfo,
             model_info.model = openai_embedding_model_info["MODEL"]
             model_info.dimensions = openai_embedding_model_info["DIMS"]
 
-    if model_info.provider == "azure":
-        model_info.client = AzureOpenAI(azure_endpoint=model_info.endpoint, 
-                                        api_key=model_info.key, 
-                                        api_version=model_info.api_version)
-    else:
-        model_info.client = OpenAI(api_key=model_info.key)
+    model_info.client = create_client(model_info.provider, model_info.endpoint, model_info.key, model_info.api_version)
 
 
     # console.print("Requested", model_info)
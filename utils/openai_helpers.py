@@ -7,15 +7,10 @@ import base64
 import tiktoken
 import requests
 import json
+import inspect
+from functools import wraps
 from typing import List
 from PIL import Image
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_random_exponential,
-    stop_after_delay,
-    after_log
-)
 from rich.console import Console
 console = Console()
 
@@ -23,6 +18,94 @@ console = Console()
 
 from utils.openai_data_models import *
 from utils.file_utils import convert_png_to_jpg, get_image_base64
+from utils.metrics import record_llm_usage
+from utils.tracing import start_span, current_span
+from utils.retry_policy import llm_retry, remaining_time
+from utils.deployment_pool import get_deployment_pool
+from utils.rate_limiter import get_rate_limiter, estimate_tokens, current_priority, active_limiter
+
+
+
+def _record_usage(model, usage):
+    """
+    Records token usage of a response in the metrics registry and on the current span.
+    """
+    cost_info = record_llm_usage(model, usage)
+    if cost_info is not None:
+        current_span().set_attributes({
+            "llm.usage.prompt_tokens": cost_info["input_tokens"],
+            "llm.usage.completion_tokens": cost_info["output_tokens"],
+            "llm.cost_usd": round(cost_info["total_cost"], 6),
+        })
+
+
+def _bind_llm_arguments(signature, args, kwargs):
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def _deployment_of(arguments):
+    model_info = arguments.get("model_info")
+    return arguments.get("model") or getattr(model_info, "model", None) or getattr(model_info, "model_name", None) or "unknown"
+
+
+def _endpoint_of(arguments):
+    return getattr(arguments.get("model_info"), "endpoint", None) or None
+
+
+def traced_llm_call(func):
+    """
+    Runs every attempt of an LLM call in its own span. Apply it below `@llm_retry`
+    so that each retry attempt shows up as a separate sibling span.
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = _bind_llm_arguments(signature, args, kwargs)
+        model_info = arguments.get("model_info")
+
+        attributes = {
+            "llm.function": func.__name__,
+            "llm.model": arguments.get("model") or getattr(model_info, "model", None),
+            "llm.reasoning_effort": arguments.get("reasoning_effort") or getattr(model_info, "reasoning_efforts", None),
+        }
+        messages = arguments.get("messages")
+        if messages is not None:
+            attributes["llm.messages"] = len(messages)
+
+        attempt = current_span().next_child_index(func.__name__)
+        with start_span(func.__name__, attributes) as span:
+            span.set_attribute("llm.attempt", attempt)
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def rate_limited_llm_call(func):
+    """
+    Waits for TPM/RPM capacity on the call's deployment before every attempt, and
+    feeds the response's rate-limit headers back into the deployment's limiter.
+    Apply it below `@traced_llm_call` so the wait shows up in the attempt's span.
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = _bind_llm_arguments(signature, args, kwargs)
+        # The pool (utils.deployment_pool) passes each leg the model info of its own resource
+        limiter = get_rate_limiter(_deployment_of(arguments), endpoint=_endpoint_of(arguments))
+        if "messages" in arguments:
+            tokens = estimate_tokens(arguments["messages"])
+        else:
+            # Embeddings: the input texts only, no completion
+            tokens = estimate_tokens([{"content": str(text)} for text in arguments.get("texts", [])], max_completion_tokens=0)
+
+        waited = limiter.acquire(tokens, priority=current_priority(), timeout=remaining_time())
+        current_span().set_attributes({"llm.estimated_tokens": tokens, "llm.rate_limit_wait_ms": round(waited * 1000, 1)})
+        with active_limiter(limiter):
+            return func(*args, **kwargs)
+    return wrapper
 
 
 
@@ -70,10 +153,25 @@ def prepare_image_messages(imgs):
     return img_msgs
 
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))             
-def get_embeddings(text : str, model_info: EmbeddingModelnfo = EmbeddingModelnfo()):
+def get_embeddings(text : str, model_info: EmbeddingModelnfo = None):
+    """
+    Embedding of one text as a list of floats, through the batching, caching embedding service.
+    """
+    from utils.embedding_service import get_embedding_service
+    return get_embedding_service(model_info).embed_one(text).tolist()
+
+
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
+def embed_batch(texts : List[str], model_info: EmbeddingModelnfo):
+    """
+    One embeddings request for all `texts`; returns their vectors in input order.
+    """
     if model_info.client is None: model_info = instantiate_model(model_info)
-    return model_info.client.embeddings.create(input=[text], model=model_info.model_name).data[0].embedding
+    response = model_info.client.embeddings.create(input=texts, model=model_info.model or model_info.model_name)
+    _record_usage(model_info.model_name, response.usage)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
 
 
@@ -87,6 +185,10 @@ def call_llm(prompt: str, model_info: Union[MulitmodalProcessingModelInfo, TextP
     
     if model_info.client is None: model_info = instantiate_model(model_info)
 
+    return get_deployment_pool(model_info).call(lambda deployment_info: _call_llm_deployment(messages, deployment_info, temperature), model_info)
+
+
+def _call_llm_deployment(messages, model_info, temperature = 0.2):
     if (model_info.model_name == "gpt-4o") or ((model_info.model_name == "gpt-45")):
         return call_4(messages, model_info.client, model_info.model, temperature)
     elif model_info.model_name == "o1":
@@ -101,34 +203,49 @@ def call_llm(prompt: str, model_info: Union[MulitmodalProcessingModelInfo, TextP
         return call_4(messages, model_info.client, model_info.model, temperature)
 
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_4(messages, client, model, temperature = 0.2):
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     result = client.chat.completions.create(model = model, temperature = temperature, messages = messages)
+    _record_usage(model, result.usage)
     return result.choices[0].message.content
       
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_o1(messages,  client, model, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort)
+    _record_usage(model, response.usage)
     return response.model_dump()['choices'][0]['message']['content']
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_o1_mini(messages,  client, model): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.chat.completions.create(model=model, messages=messages)
+    _record_usage(model, response.usage)
     return response.model_dump()['choices'][0]['message']['content']
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))       
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_o3(messages,  client, model, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort)
+    _record_usage(model, response.usage)
     return response.model_dump()['choices'][0]['message']['content']
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_o3_mini(messages,  client, model, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url} - Reasoning Effort: {reasoning_effort}\n")
     response = client.chat.completions.create(model=model, messages=messages, reasoning_effort=reasoning_effort)
+    _record_usage(model, response.usage)
     return response.model_dump()['choices'][0]['message']['content']
 
 
@@ -142,6 +259,10 @@ def call_llm_structured_outputs(prompt: str, model_info: Union[MulitmodalProcess
 
     if model_info.client is None: model_info = instantiate_model(model_info)
 
+    return get_deployment_pool(model_info).call(lambda deployment_info: _call_llm_structured_deployment(messages, deployment_info, response_format), model_info)
+
+
+def _call_llm_structured_deployment(messages, model_info, response_format):
     if (model_info.model_name == "gpt-4o") or ((model_info.model_name == "gpt-45")):
         return call_llm_structured_4(messages, model_info.client, model_info.model, response_format)
     elif model_info.model_name == "o1":
@@ -156,34 +277,49 @@ def call_llm_structured_outputs(prompt: str, model_info: Union[MulitmodalProcess
         return call_llm_structured_4(messages, model_info.client, model_info.model, response_format)
 
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_structured_4(messages, client, model, response_format):
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     completion = client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format)
+    _record_usage(model, completion.usage)
     return completion.choices[0].message.parsed
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_structured_o1(messages, client, model, response_format, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format)
+    _record_usage(model, response.usage)
     return response.choices[0].message.parsed
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_structured_o1_mini(messages, client, model, response_format): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.beta.chat.completions.parse(model=model, messages=messages, response_format=response_format)
+    _record_usage(model, response.usage)
     return response.choices[0].message.parsed
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_structured_o3(messages, client, model, response_format, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format)
+    _record_usage(model, response.usage)
     return response.choices[0].message.parsed
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_structured_o3_mini(messages, client, model, response_format, reasoning_effort ="medium"): 
     # print(f"\nCalling OpenAI APIs with {len(messages)} messages - Model: {model} - Endpoint: {client._base_url}\n")
     response = client.beta.chat.completions.parse(model=model, messages=messages, reasoning_effort=reasoning_effort, response_format=response_format)
+    _record_usage(model, response.usage)
     return response.choices[0].message.parsed
 
 
@@ -288,7 +424,9 @@ def call_llm_functions(prompt_or_messages, tools, functions={}, temperature=0.2,
         return call_llm_functions_4(messages, model_info, tools, functions, temperature)
 
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_functions_4(messages, model_info, tools, functions, temperature):
     """
     Calls the LLM (gpt-4o) with function calling enabled.
@@ -302,9 +440,12 @@ def call_llm_functions_4(messages, model_info, tools, functions, temperature):
         messages=messages,
         functions=tools
     )
+    _record_usage(model_info.model, result.usage)
     return process_function_call_result(result, functions)
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_functions_o1(messages, model_info, tools, functions):
     """
     Calls the LLM (o1) with function calling enabled.
@@ -319,9 +460,12 @@ def call_llm_functions_o1(messages, model_info, tools, functions):
         functions=tools,
         reasoning_effort=model_info.reasoning_efforts
     )
+    _record_usage(model_info.model, response.usage)
     return process_function_call_result(response, functions)
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_functions_o1_mini(messages, model_info, tools, functions):
     """
     Calls the LLM (o1-mini) with function calling enabled.
@@ -335,9 +479,12 @@ def call_llm_functions_o1_mini(messages, model_info, tools, functions):
         messages=messages,
         functions=tools
     )
+    _record_usage(model_info.model, response.usage)
     return process_function_call_result(response, functions)
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_functions_o3(messages, model_info, tools, functions):
     """
     Calls the LLM (o3) with function calling enabled.
@@ -352,9 +499,12 @@ def call_llm_functions_o3(messages, model_info, tools, functions):
         functions=tools,
         reasoning_effort=model_info.reasoning_efforts
     )
+    _record_usage(model_info.model, response.usage)
     return process_function_call_result(response, functions)
 
-@retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(10))
+@llm_retry
+@traced_llm_call
+@rate_limited_llm_call
 def call_llm_functions_o3_mini(messages, model_info, tools, functions):
     """
     Calls the LLM (o3-mini) with function calling enabled.
@@ -369,4 +519,5 @@ def call_llm_functions_o3_mini(messages, model_info, tools, functions):
         functions=tools,
         reasoning_effort=model_info.reasoning_efforts
     )
+    _record_usage(model_info.model, response.usage)
     return process_function_call_result(response, functions)
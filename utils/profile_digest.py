@@ -0,0 +1,162 @@
+# utils/profile_digest.py
+"""
+Compact customer profile digests for the prompts.
+
+A digest keeps what the expansion and recommender prompts use to personalize results
+and drops the rest of the profile (address, transaction and item ids, per-line
+totals, communication preferences):
+    purchases           counts, spend, average transaction and item price, last purchase date
+    price_bands         25th percentile / median / 75th percentile / max of the item prices paid
+    brand_affinities    share of spend per brand, top brands first
+    recent_items        names of the most recently bought items
+    recent_categories   categories of the most recently bought items (when the items carry one)
+    behavior            the profile's inferred_purchasing_behavior
+    interests           the profile's likely_future_interests
+
+Digests are versioned (DIGEST_VERSION) and can be built offline for all profiles:
+
+    python -m utils.profile_digest build [--profiles customer_profiles] [--out profile_digests]
+
+which writes <out>/<profile file name> with the digest and the MD5 of the source file.
+utils.profile_store uses a stored digest when its version and MD5 match the profile,
+and builds the digest itself otherwise.
+"""
+import os
+import json
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+
+console = Console()
+
+
+# Bump when the digest layout changes; stored digests of another version are rebuilt
+DIGEST_VERSION = 2
+MAX_BRANDS = 5
+MAX_RECENT_ITEMS = 10
+MAX_RECENT_CATEGORIES = 5
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return round(sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low), 2)
+
+
+def _transactions(profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    transactions = []
+    for key, value in profile.items():
+        if key.endswith("transactions") and isinstance(value, list):
+            transactions.extend(t for t in value if isinstance(t, dict))
+    return sorted(transactions, key=lambda t: str(t.get("purchase_date", "")))
+
+
+def build_profile_digest(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Digest of a profile file's content ({"customer_profile": {...}}, or the inner dict).
+    """
+    profile = data.get("customer_profile", data)
+    transactions = _transactions(profile)
+
+    prices, brand_spend, recent_items, recent_categories = [], defaultdict(float), [], []
+    items_bought, total_spent = 0, 0.0
+    for transaction in transactions:
+        for item in transaction.get("items", []):
+            price = float(item.get("price") or 0)
+            quantity = int(item.get("quantity") or 1)
+            line_total = float(item.get("line_total") or price * quantity)
+            prices.extend([price] * quantity)
+            items_bought += quantity
+            total_spent += line_total
+            if item.get("brand"):
+                brand_spend[item["brand"]] += line_total
+            if item.get("name"):
+                recent_items.append(item["name"])
+            if isinstance(item.get("category"), str) and item["category"].strip():
+                recent_categories.append(item["category"].strip())
+    prices.sort()
+
+    digest = {
+        "digest_version": DIGEST_VERSION,
+        "name": profile.get("name", ""),
+        "gender": profile.get("gender", ""),
+        "purchases": {
+            "transactions": len(transactions),
+            "items": items_bought,
+            "total_spent": round(total_spent, 2),
+            "avg_transaction": round(total_spent / len(transactions), 2) if transactions else 0,
+            "avg_item_price": round(total_spent / items_bought, 2) if items_bought else 0,
+            "last_purchase": transactions[-1].get("purchase_date", "") if transactions else "",
+        },
+    }
+    if prices:
+        digest["price_bands"] = {
+            "p25": _percentile(prices, 0.25),
+            "median": _percentile(prices, 0.5),
+            "p75": _percentile(prices, 0.75),
+            "max": prices[-1],
+        }
+    if brand_spend:
+        top = sorted(brand_spend.items(), key=lambda b: -b[1])[:MAX_BRANDS]
+        digest["brand_affinities"] = {brand: round(spend / total_spent, 2) if total_spent else 0 for brand, spend in top}
+    if recent_items:
+        digest["recent_items"] = recent_items[::-1][:MAX_RECENT_ITEMS]
+    if recent_categories:
+        digest["recent_categories"] = list(dict.fromkeys(recent_categories[::-1]))[:MAX_RECENT_CATEGORIES]
+    if profile.get("inferred_purchasing_behavior"):
+        digest["behavior"] = profile["inferred_purchasing_behavior"]
+    notes = profile.get("additional_notes")
+    if isinstance(notes, dict) and notes.get("likely_future_interests"):
+        digest["interests"] = notes["likely_future_interests"]
+    return digest
+
+
+def load_stored_digest(digest_dir: str, name: str, source_md5: str) -> Optional[Dict[str, Any]]:
+    """
+    The digest built offline for profile file `name`, if it is current.
+    """
+    path = os.path.join(digest_dir, name)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get("digest_version") != DIGEST_VERSION or stored.get("source_md5") != source_md5:
+        return None
+    return stored.get("digest")
+
+
+def build_digests(profiles_dir: str, digest_dir: str) -> int:
+    os.makedirs(digest_dir, exist_ok=True)
+    count = 0
+    for name in sorted(os.listdir(profiles_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(profiles_dir, name), "rb") as f:
+            content = f.read()
+        digest = build_profile_digest(json.loads(content))
+        tmp = os.path.join(digest_dir, name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"digest_version": DIGEST_VERSION, "source_md5": hashlib.md5(content).hexdigest(), "digest": digest}, f)
+        os.replace(tmp, os.path.join(digest_dir, name))
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--profiles", default=os.getenv("CUSTOMER_PROFILES_DIR", "customer_profiles"))
+    parser.add_argument("--out", default=os.getenv("PROFILE_DIGEST_DIR", "profile_digests"))
+    args = parser.parse_args()
+
+    count = build_digests(args.profiles, args.out)
+    console.log(f"{count} profile digests (version {DIGEST_VERSION}) written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# utils/profile_store.py
+"""
+In-memory store of the customer profiles in customer_profiles/*.json.
+
+Profiles are parsed once and served from memory. At most every PROFILE_RELOAD_SECONDS
+the directory is re-scanned (one os.scandir, no file reads) and only files that are
+new or have a new mtime are parsed again; deleted files disappear from the store.
+
+Each profile also carries its digest (utils/profile_digest.py) and its prompt
+serialization (compact JSON of the digest, or of the full profile with
+PROFILE_PROMPT_MODE=full), computed when the file is loaded, so phase1/phase2 do not
+serialize the profile for every request.
+
+With PROFILE_BACKEND=sqlite, profiles are served from an SQLite database instead
+(SqliteProfileStore): one row per customer id holding the profile and its digest,
+looked up by primary key, with an LRU cache of the hot set in front. The database is
+filled in batches from JSON lines or a profile directory:
+
+    python -m utils.profile_store import profiles.jsonl [--db customer_profiles.sqlite] [--id-field customer_id]
+    python -m utils.profile_store import customer_profiles/
+
+A profile has the shape of the files in customer_profiles/:
+    {"customer_profile": {"name": ..., "gender": ..., "purchase_statistics": {...}, ...}}
+A JSON-lines record is either such an object or the bare "customer_profile" object
+(flat record); flat records are wrapped on import, so every stored profile has the
+file shape. The customer id is the record's `--id-field`, looked up at the top level
+and then inside "customer_profile" (the bundled profiles have no id field; use
+--id-field name for them).
+
+Both stores list customer ids in pages (`list(after=..., limit=...)`).
+
+Configuration (environment variables):
+    PROFILE_BACKEND             "directory" (default) or "sqlite"
+    CUSTOMER_PROFILES_DIR       profile directory (default customer_profiles)
+    PROFILE_DB_PATH             SQLite database (default customer_profiles.sqlite)
+    PROFILE_CACHE_SIZE          profiles kept in the SQLite store's LRU cache (default 10000)
+    PROFILE_RELOAD_SECONDS      minimum interval between directory scans / database change checks (default 2)
+    PROFILE_PROMPT_MODE         "digest" (default) or "full": what the prompts carry
+    PROFILE_DIGEST_DIR          digests built offline by python -m utils.profile_digest build (default profile_digests)
+"""
+import os
+import json
+import time
+import bisect
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from rich.console import Console
+
+from utils.profile_digest import DIGEST_VERSION, build_profile_digest, load_stored_digest
+
+console = Console()
+
+
+PROFILE_PROMPT_MODE = os.getenv("PROFILE_PROMPT_MODE", "digest")
+PROFILE_DIGEST_DIR = os.getenv("PROFILE_DIGEST_DIR", "profile_digests")
+PROFILE_LIST_LIMIT = 1000
+
+
+def profile_prompt_text(profile: dict) -> str:
+    """
+    Serialization of a customer profile used in the prompts.
+    """
+    return json.dumps(profile, separators=(",", ":"), ensure_ascii=False)
+
+
+class CustomerProfile:
+    """
+    A parsed profile file: `data` is the JSON content, `digest` its profile digest and
+    `prompt_text` the prompt serialization.
+    """
+
+    def __init__(self, name: str, data: dict, mtime_ns: int = 0, digest: dict = None):
+        self.name = name
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.digest = digest if digest is not None else build_profile_digest(data)
+        self.prompt_text = profile_prompt_text(data if PROFILE_PROMPT_MODE == "full" else self.digest)
+
+
+class ProfileStore:
+    """
+    Customer profiles by id. Subclasses implement `get` and `list`.
+    """
+
+    def get(self, name: str) -> Optional[CustomerProfile]:
+        raise NotImplementedError
+
+    def list(self, after: Optional[str] = None, limit: int = PROFILE_LIST_LIMIT) -> List[str]:
+        """
+        Up to `limit` customer ids in sorted order, starting after the id `after`
+        (pass the last id of the previous page to get the next one).
+        """
+        raise NotImplementedError
+
+
+class DirectoryProfileStore(ProfileStore):
+    """
+    Profiles are the *.json files of a directory; the file name is the customer id.
+    """
+
+    def __init__(self, directory: str, reload_seconds: float = 2.0):
+        self.directory = directory
+        self.reload_seconds = reload_seconds
+        self._profiles: Dict[str, CustomerProfile] = {}
+        self._names: List[str] = []
+        # name -> mtime of files that failed to parse, so they are not retried until changed
+        self._invalid: Dict[str, int] = {}
+        self._checked: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                files = {e.name: e.stat().st_mtime_ns for e in entries if e.name.endswith(".json") and e.is_file()}
+        except FileNotFoundError:
+            files = {}
+
+        profiles = {}
+        for name, mtime_ns in files.items():
+            current = self._profiles.get(name)
+            if (current is not None and current.mtime_ns == mtime_ns) or self._invalid.get(name) == mtime_ns:
+                if current is not None:
+                    profiles[name] = current
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    content = f.read()
+                digest = load_stored_digest(PROFILE_DIGEST_DIR, name, hashlib.md5(content).hexdigest())
+                profiles[name] = CustomerProfile(name, json.loads(content), mtime_ns, digest)
+            except (OSError, ValueError) as e:
+                # Keep serving the previous version of a file that is being rewritten
+                console.log(f"[yellow]Could not load customer profile {name}: {e}[/yellow]")
+                self._invalid[name] = mtime_ns
+                if current is not None:
+                    profiles[name] = current
+        self._profiles = profiles
+        self._names = sorted(profiles)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            if self._checked is not None and now - self._checked < self.reload_seconds:
+                return
+            self._scan()
+            self._checked = time.monotonic()
+
+    def list(self, after: Optional[str] = None, limit: int = PROFILE_LIST_LIMIT) -> List[str]:
+        self._refresh()
+        names = self._names
+        start = bisect.bisect_right(names, after) if after is not None else 0
+        return names[start:start + limit]
+
+    def get(self, name: str) -> Optional[CustomerProfile]:
+        self._refresh()
+        return self._profiles.get(name)
+
+
+class SqliteProfileStore(ProfileStore):
+    """
+    Profiles in an SQLite table keyed by customer id, with the digest stored next to
+    the profile. Lookups are primary-key reads (one connection per thread); the most
+    recently used profiles are kept parsed in an LRU cache, which is dropped when
+    another connection (e.g. an import) has changed the database. Changes are seen
+    through one store-wide connection, so every thread checks against the same version.
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000, reload_seconds: float = 2.0):
+        self.path = path
+        self.cache_size = cache_size
+        self.reload_seconds = reload_seconds
+        self._cache: "OrderedDict[str, CustomerProfile]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._checked: Optional[float] = None
+        self._version_lock = threading.Lock()
+        # Only used for PRAGMA data_version, always under _version_lock
+        self._version_connection = sqlite3.connect(path, check_same_thread=False)
+        with self._version_connection as connection:
+            create_profile_table(connection)
+        self._data_version = self._read_data_version()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            self._local.connection = connection
+        return connection
+
+    def _read_data_version(self) -> int:
+        # data_version is per connection: it changes when another connection commits
+        return self._version_connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_for_changes(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.reload_seconds:
+            return
+        with self._version_lock:
+            if self._checked is not None and now - self._checked < self.reload_seconds:
+                return
+            self._checked = now
+            data_version = self._read_data_version()
+            if data_version != self._data_version:
+                with self._cache_lock:
+                    self._cache.clear()
+                self._data_version = data_version
+
+    def get(self, name: str) -> Optional[CustomerProfile]:
+        self._check_for_changes()
+        with self._cache_lock:
+            profile = self._cache.get(name)
+            if profile is not None:
+                self._cache.move_to_end(name)
+                return profile
+
+        row = self._connection().execute(
+            "SELECT data, digest, digest_version FROM profiles WHERE customer_id = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, digest, digest_version = row
+        profile = CustomerProfile(name, json.loads(data), digest=json.loads(digest) if digest_version == DIGEST_VERSION else None)
+
+        with self._cache_lock:
+            self._cache[name] = profile
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return profile
+
+    def list(self, after: Optional[str] = None, limit: int = PROFILE_LIST_LIMIT) -> List[str]:
+        # Keyset paging: an index range scan, independent of how deep the page is
+        rows = self._connection().execute(
+            "SELECT customer_id FROM profiles WHERE customer_id > ? ORDER BY customer_id LIMIT ?",
+            ("" if after is None else after, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+def create_profile_table(connection: sqlite3.Connection):
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS profiles ("
+        "customer_id TEXT PRIMARY KEY, data TEXT NOT NULL, digest TEXT, digest_version INTEGER, updated REAL"
+        ") WITHOUT ROWID"
+    )
+
+
+def normalize_profile(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The profile in the file shape, {"customer_profile": {...}}: a flat record (the bare
+    customer_profile object) is wrapped, a record in the file shape is kept as is.
+    """
+    if isinstance(record.get("customer_profile"), dict):
+        return record
+    return {"customer_profile": record}
+
+
+def read_profiles(source: str, id_field: str = "customer_id") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (customer id, profile) pairs from a JSON-lines file or from a profile directory
+    (id = file name, as in DirectoryProfileStore). JSON-lines records are normalized
+    to the file shape; their id is `id_field` at the top level or in "customer_profile".
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".json"):
+                with open(os.path.join(source, name), "r", encoding="utf-8") as f:
+                    yield name, normalize_profile(json.load(f))
+        return
+    with open(source, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            profile = normalize_profile(json.loads(line))
+            customer_id = profile.get(id_field)
+            if customer_id is None:
+                customer_id = profile["customer_profile"].get(id_field)
+            if customer_id is None:
+                raise ValueError(f"{source}:{line_number}: no '{id_field}' field")
+            yield str(customer_id), profile
+
+
+def import_profiles(source: str, db_path: str, id_field: str = "customer_id", batch_size: int = 5000) -> int:
+    """
+    Inserts or replaces the profiles of `source` in the database, with their digests,
+    one transaction per batch.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    create_profile_table(connection)
+    count, batch, start = 0, [], time.perf_counter()
+
+    def write():
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)", batch)
+        batch.clear()
+
+    for customer_id, data in read_profiles(source, id_field):
+        batch.append((customer_id, json.dumps(data, ensure_ascii=False), profile_prompt_text(build_profile_digest(data)),
+                      DIGEST_VERSION, time.time()))
+        count += 1
+        if len(batch) >= batch_size:
+            write()
+            console.log(f"{count} profiles imported ({count / (time.perf_counter() - start):.0f}/s)")
+    if batch:
+        write()
+    connection.close()
+    return count
+
+
+_profile_store: Optional[ProfileStore] = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _profile_store
+    if _profile_store is None:
+        with _profile_store_lock:
+            if _profile_store is None:
+                reload_seconds = float(os.getenv("PROFILE_RELOAD_SECONDS", 2))
+                if os.getenv("PROFILE_BACKEND", "directory") == "sqlite":
+                    _profile_store = SqliteProfileStore(
+                        os.getenv("PROFILE_DB_PATH", "customer_profiles.sqlite"),
+                        cache_size=int(os.getenv("PROFILE_CACHE_SIZE", 10000)),
+                        reload_seconds=reload_seconds,
+                    )
+                else:
+                    _profile_store = DirectoryProfileStore(
+                        os.getenv("CUSTOMER_PROFILES_DIR", "customer_profiles"),
+                        reload_seconds=reload_seconds,
+                    )
+    return _profile_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("source", help="JSON-lines file of profiles, or a profile directory")
+    parser.add_argument("--db", default=os.getenv("PROFILE_DB_PATH", "customer_profiles.sqlite"))
+    parser.add_argument("--id-field", default="customer_id",
+                        help="customer id field of JSON-lines records, at the top level or in customer_profile")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = import_profiles(args.source, args.db, id_field=args.id_field, batch_size=args.batch_size)
+    console.log(f"Imported {count} profiles into {args.db} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
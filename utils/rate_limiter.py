@@ -0,0 +1,341 @@
+# utils/rate_limiter.py
+"""
+Client-side rate limiting for Azure OpenAI deployments.
+
+Every deployment gets a process-wide limiter with two token buckets, one for the
+tokens-per-minute (TPM) and one for the requests-per-minute (RPM) quota. Callers
+estimate the tokens of a request up front (`estimate_tokens`) and `acquire` them
+before sending it. Waiting callers are served by priority, so interactive search
+requests overtake background work.
+
+The limiter adapts to what the service reports:
+    - `x-ratelimit-remaining-tokens` / `x-ratelimit-remaining-requests` pull the buckets
+      down to the remaining quota, which also accounts for other clients of the deployment
+    - a 429 halves the refill rate and pauses the deployment for the `Retry-After` period;
+      every successful response restores part of the rate
+
+Quotas are configured per deployment (name upper-cased, non-alphanumerics replaced by `_`):
+    AZURE_OPENAI_TPM_<DEPLOYMENT>   e.g. AZURE_OPENAI_TPM_O3_MINI=450000
+    AZURE_OPENAI_RPM_<DEPLOYMENT>   defaults to 6 RPM per 1000 TPM, as assigned by Azure
+    AZURE_OPENAI_DEFAULT_TPM        fallback for deployments without their own setting (default 150000)
+
+The backend loads this file by path (backend/utils/rate_limiter.py), so besides the
+standard library, tiktoken and rich it may only import `utils.metrics`, which both
+apps provide with the same API.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Tuple
+
+from rich.console import Console
+console = Console()
+
+from utils.metrics import counter, histogram
+
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Longest single sleep while waiting, so changes in queue order are picked up quickly
+MAX_POLL_SECONDS = 0.25
+# Refill-rate multiplier bounds for the adaptive 429 backoff
+MIN_RATE_FACTOR = 0.1
+RATE_RECOVERY_STEP = 0.05
+
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", 1000))
+
+
+LLM_RATE_LIMIT_WAIT_SECONDS = histogram(
+    "llm_rate_limiter_wait_seconds",
+    "Time LLM calls waited for client-side TPM/RPM capacity.",
+    ("deployment", "priority")
+)
+LLM_THROTTLED = counter(
+    "llm_throttled_total",
+    "Number of 429 responses received from a deployment.",
+    ("deployment",)
+)
+
+
+class RateLimitTimeout(TimeoutError):
+    """
+    Raised when capacity does not become available before the caller's deadline.
+    """
+
+
+_priority = contextvars.ContextVar("llm_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Sets the priority of the LLM calls made within the block (INTERACTIVE or BACKGROUND).
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+_encoder = None
+_encoder_failed = False
+
+
+def _count_tokens(text: str) -> int:
+    global _encoder, _encoder_failed
+    if _encoder is None and not _encoder_failed:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The BPE file is downloaded on first use; without it fall back to ~4 chars per token
+            _encoder_failed = True
+            console.log(f"tiktoken unavailable, estimating tokens from text length: {e}")
+    if _encoder is not None:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_completion_tokens: Optional[int] = None) -> int:
+    """
+    Estimates the tokens a chat request counts against the TPM quota: the prompt plus
+    the completion budget (`max_tokens` if set, otherwise EXPECTED_COMPLETION_TOKENS).
+    """
+    prompt_tokens = 0
+    for message in messages or []:
+        content = message.get("content", "") if isinstance(message, dict) else str(message)
+        if isinstance(content, list):
+            text = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            # Images are billed separately; count a flat allowance for each
+            prompt_tokens += 85 * sum(1 for part in content if isinstance(part, dict) and part.get("type") == "image_url")
+        elif isinstance(content, str):
+            text = content
+        else:
+            text = json.dumps(content, default=str)
+        prompt_tokens += _count_tokens(text) + 4
+    completion_tokens = max_completion_tokens if max_completion_tokens is not None else EXPECTED_COMPLETION_TOKENS
+    return prompt_tokens + completion_tokens
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Reads the delay requested by the service from `retry-after-ms` or `retry-after` (seconds).
+    """
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) / scale)
+            except ValueError:
+                continue
+    return None
+
+
+class DeploymentRateLimiter:
+    """
+    Token-bucket scheduler for one deployment's TPM and RPM quotas.
+
+    `acquire` blocks the calling thread and `acquire_async` the calling coroutine; both
+    poll the shared buckets, so threaded and asyncio callers can share one limiter.
+    """
+
+    def __init__(self, deployment: str, tokens_per_minute: int, requests_per_minute: int):
+        self.deployment = deployment
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._rate_factor = 1.0
+        self._blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self._lock = threading.Lock()
+
+    @property
+    def rate_factor(self) -> float:
+        return self._rate_factor
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60.0 * self._rate_factor)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60.0 * self._rate_factor)
+
+    def _try_take(self, tokens: int, priority: int) -> float:
+        """
+        Takes capacity for one request if possible. Returns 0 on success, otherwise the
+        number of seconds after which it is worth trying again. Caller holds the lock.
+        """
+        now = time.monotonic()
+        self._refill(now)
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if any(count for p, count in self._waiting.items() if p < priority):
+            return MAX_POLL_SECONDS
+
+        # A request larger than the whole bucket would otherwise wait forever
+        tokens = min(tokens, self.tokens_per_minute)
+        if self._tokens >= tokens and self._requests >= 1.0:
+            self._tokens -= tokens
+            self._requests -= 1.0
+            return 0.0
+
+        token_rate = self.tokens_per_minute / 60.0 * self._rate_factor
+        request_rate = self.requests_per_minute / 60.0 * self._rate_factor
+        return max((tokens - self._tokens) / token_rate, (1.0 - self._requests) / request_rate, 0.001)
+
+    def _poll(self, tokens: int, priority: int, registered: bool):
+        with self._lock:
+            wait = self._try_take(tokens, priority)
+            if wait == 0.0:
+                if registered:
+                    self._waiting[priority] -= 1
+            elif not registered:
+                self._waiting[priority] += 1
+        return wait
+
+    def _unregister(self, priority: int):
+        with self._lock:
+            self._waiting[priority] -= 1
+
+    def _finish(self, start: float, priority: int) -> float:
+        waited = time.monotonic() - start
+        LLM_RATE_LIMIT_WAIT_SECONDS.observe(waited, deployment=self.deployment, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        return waited
+
+    def acquire(self, tokens: int, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """
+        Blocks until `tokens` and one request are available. Returns the seconds waited.
+        Raises RateLimitTimeout if that would take longer than `timeout`.
+        """
+        start = time.monotonic()
+        registered = False
+        while True:
+            wait = self._poll(tokens, priority, registered)
+            if wait == 0.0:
+                return self._finish(start, priority)
+            registered = True
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                self._unregister(priority)
+                raise RateLimitTimeout(f"No capacity on deployment {self.deployment} within {timeout:.1f}s")
+            time.sleep(min(wait, MAX_POLL_SECONDS))
+
+    async def acquire_async(self, tokens: int, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """
+        Asyncio variant of `acquire`.
+        """
+        start = time.monotonic()
+        registered = False
+        while True:
+            wait = self._poll(tokens, priority, registered)
+            if wait == 0.0:
+                return self._finish(start, priority)
+            registered = True
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                self._unregister(priority)
+                raise RateLimitTimeout(f"No capacity on deployment {self.deployment} within {timeout:.1f}s")
+            await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+
+    def update_from_headers(self, headers):
+        """
+        Aligns the buckets with the remaining quota reported by the service and
+        restores part of the refill rate after a successful response.
+        """
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens") if headers else None
+        remaining_requests = headers.get("x-ratelimit-remaining-requests") if headers else None
+        with self._lock:
+            self._refill(time.monotonic())
+            try:
+                if remaining_tokens is not None:
+                    self._tokens = min(self._tokens, float(remaining_tokens))
+                if remaining_requests is not None:
+                    self._requests = min(self._requests, float(remaining_requests))
+            except ValueError:
+                pass
+            self._rate_factor = min(1.0, self._rate_factor + RATE_RECOVERY_STEP)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """
+        Reacts to a 429: halves the refill rate, empties the buckets and pauses the deployment.
+        """
+        LLM_THROTTLED.inc(deployment=self.deployment)
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            self._rate_factor = max(MIN_RATE_FACTOR, self._rate_factor * 0.5)
+            self._tokens = 0.0
+            self._requests = 0.0
+            self._blocked_until = max(self._blocked_until, now + (retry_after if retry_after is not None else 1.0))
+
+
+def _env_key(deployment: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "_", deployment).upper()
+
+
+_limiters: Dict[Tuple[str, str], DeploymentRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(deployment: str, tokens_per_minute: Optional[int] = None, requests_per_minute: Optional[int] = None,
+                     endpoint: Optional[str] = None) -> DeploymentRateLimiter:
+    """
+    Returns the process-wide limiter of a deployment, creating it from the environment on first use.
+    Limiters are keyed by (endpoint, deployment): the secondary deployments of
+    utils.deployment_pool usually share the primary's deployment name but live in other
+    resources with their own quota, so each gets its own buckets (with the quota
+    configured for the deployment name).
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((endpoint or "", deployment))
+        if limiter is None:
+            key = _env_key(deployment)
+            if tokens_per_minute is None:
+                tokens_per_minute = int(os.getenv(f"AZURE_OPENAI_TPM_{key}", os.getenv("AZURE_OPENAI_DEFAULT_TPM", 150000)))
+            if requests_per_minute is None:
+                requests_per_minute = int(os.getenv(f"AZURE_OPENAI_RPM_{key}", max(1, tokens_per_minute * 6 // 1000)))
+            limiter = DeploymentRateLimiter(deployment, tokens_per_minute, requests_per_minute)
+            _limiters[(endpoint or "", deployment)] = limiter
+        return limiter
+
+
+_active_limiter = contextvars.ContextVar("active_rate_limiter", default=None)
+
+
+@contextmanager
+def active_limiter(limiter: DeploymentRateLimiter):
+    """
+    Marks the limiter that `observe_response` should update for HTTP responses in this block.
+    """
+    token = _active_limiter.set(limiter)
+    try:
+        yield limiter
+    finally:
+        _active_limiter.reset(token)
+
+
+def observe_response(response):
+    """
+    httpx response hook: feeds rate-limit headers and 429s back into the active limiter.
+    """
+    limiter = _active_limiter.get()
+    if limiter is None:
+        return
+    if response.status_code == 429:
+        limiter.on_throttled(parse_retry_after(response.headers))
+    elif response.status_code < 400:
+        limiter.update_from_headers(response.headers)
@@ -0,0 +1,287 @@
+# utils/retry_policy.py
+"""
+Centralized retry policy for LLM calls.
+
+Replaces the per-function `@retry(wait_random_exponential(max=30), stop_after_attempt(10))`
+with a single tenacity policy that:
+    - only retries errors that can succeed on a second try (429, 408, 409, 5xx, timeouts, connection errors)
+    - honors `Retry-After` / `retry-after-ms` headers sent with 429 and 503 responses
+    - never sleeps past the deadline of the current request (see `request_deadline`)
+    - draws every retry from a process-wide retry budget, so an outage does not multiply load
+
+Configuration (environment variables):
+    LLM_RETRY_MAX_ATTEMPTS      maximum attempts per call, including the first (default 6)
+    LLM_RETRY_MAX_SECONDS       total time per call when no request deadline is set (default 60)
+    LLM_RETRY_MAX_WAIT          cap of the exponential backoff in seconds (default 30)
+    LLM_RETRY_BUDGET_RATIO      retries earned per call (default 0.2, i.e. at most ~20% extra load)
+    LLM_RETRY_BUDGET_MIN_RATE   retries per second always allowed, so low traffic can still retry (default 1)
+"""
+import os
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import openai
+import requests
+from tenacity import retry, stop_never
+
+from rich.console import Console
+console = Console()
+
+from utils.metrics import counter, histogram
+from utils.tracing import current_span
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+LLM_RETRIES = counter(
+    "llm_retries_total",
+    "Number of LLM call retries, by function and error type.",
+    ("function", "reason")
+)
+LLM_RETRY_GIVEUPS = counter(
+    "llm_retry_giveups_total",
+    "Number of LLM calls that failed without a further retry, by function and cause.",
+    ("function", "reason")
+)
+LLM_RETRY_BACKOFF_SECONDS = histogram(
+    "llm_retry_backoff_seconds",
+    "Time spent sleeping between LLM call attempts.",
+    ("function",)
+)
+
+
+_deadline = contextvars.ContextVar("llm_request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Bounds the total time LLM calls may spend (attempts and backoff) within the block.
+    Nested deadlines can only shorten the enclosing one. Also usable as a decorator.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+_cancelled = contextvars.ContextVar("llm_call_cancelled", default=None)
+
+
+@contextmanager
+def cancellation_scope(event: threading.Event):
+    """
+    LLM calls within the block stop retrying once `event` is set, e.g. the losing leg of a hedged call.
+    """
+    token = _cancelled.set(event)
+    try:
+        yield
+    finally:
+        _cancelled.reset(token)
+
+
+def is_cancelled() -> bool:
+    event = _cancelled.get()
+    return event is not None and event.is_set()
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Seconds left before the current request deadline, or None if no deadline is set.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class RetryBudget:
+    """
+    Process-wide retry budget. Every call deposits `ratio` tokens and every retry
+    withdraws one, on top of a floor of `min_per_second` retries that refills over time.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    True for errors a second attempt can fix; False for 400/401/403/404/422 and client-side errors.
+    """
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Reads the server-requested delay from `retry-after-ms` or `Retry-After` (seconds or HTTP date).
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Decides whether and how long to wait before retrying a failed LLM call.
+
+    All decisions are taken in one place (`_should_retry`), so the planned sleep can be
+    checked against the deadline before committing to it and charged to the budget.
+    """
+
+    def __init__(self, max_attempts: int = 6, max_seconds: float = 60.0, max_wait: float = 30.0,
+                 budget: Optional[RetryBudget] = None):
+        self.max_attempts = max_attempts
+        self.max_seconds = max_seconds
+        self.max_wait = max_wait
+        self.budget = budget or RetryBudget()
+
+    def _backoff(self, attempt_number: int) -> float:
+        # Full jitter: uniform in [0, min(max_wait, 2^attempt)]
+        return random.uniform(0, min(self.max_wait, 2 ** attempt_number))
+
+    def _give_up(self, function: str, reason: str, exc: BaseException) -> bool:
+        LLM_RETRY_GIVEUPS.inc(function=function, reason=reason)
+        console.log(f"Not retrying {function} ({reason}): {exc.__class__.__name__}: {exc}")
+        return False
+
+    def _before(self, retry_state):
+        if retry_state.attempt_number == 1:
+            self.budget.deposit()
+
+    def _should_retry(self, retry_state) -> bool:
+        if not retry_state.outcome.failed:
+            return False
+
+        exc = retry_state.outcome.exception()
+        function = getattr(retry_state.fn, "__name__", "unknown")
+
+        if is_cancelled():
+            return self._give_up(function, "cancelled", exc)
+        if not is_retryable(exc):
+            return self._give_up(function, "non_retryable", exc)
+        if retry_state.attempt_number >= self.max_attempts:
+            return self._give_up(function, "attempts", exc)
+
+        sleep = self._backoff(retry_state.attempt_number)
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            sleep = max(sleep, retry_after)
+
+        remaining = self.max_seconds - (time.monotonic() - retry_state.start_time)
+        request_remaining = remaining_time()
+        if request_remaining is not None:
+            remaining = min(remaining, request_remaining)
+        # Leave at least a second for the next attempt itself
+        if sleep + 1.0 > remaining:
+            return self._give_up(function, "deadline", exc)
+
+        if not self.budget.try_withdraw():
+            return self._give_up(function, "budget", exc)
+
+        retry_state.policy_sleep = sleep
+        return True
+
+    def _wait(self, retry_state) -> float:
+        return getattr(retry_state, "policy_sleep", 0.0)
+
+    def _before_sleep(self, retry_state):
+        exc = retry_state.outcome.exception()
+        function = getattr(retry_state.fn, "__name__", "unknown")
+        sleep = retry_state.next_action.sleep
+        LLM_RETRIES.inc(function=function, reason=exc.__class__.__name__)
+        LLM_RETRY_BACKOFF_SECONDS.observe(sleep, function=function)
+        current_span().add_event("retry", {
+            "llm.function": function,
+            "llm.attempt": retry_state.attempt_number,
+            "retry.reason": exc.__class__.__name__,
+            "retry.sleep_seconds": round(sleep, 3),
+        })
+        console.log(f"Retrying {function} in {sleep:.1f}s after attempt {retry_state.attempt_number}: {exc.__class__.__name__}")
+
+    def decorator(self):
+        return retry(
+            retry=self._should_retry,
+            wait=self._wait,
+            stop=stop_never,
+            before=self._before,
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+
+
+llm_retry_policy = RetryPolicy(
+    max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", 6)),
+    max_seconds=float(os.getenv("LLM_RETRY_MAX_SECONDS", 60)),
+    max_wait=float(os.getenv("LLM_RETRY_MAX_WAIT", 30)),
+    budget=RetryBudget(
+        ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", 0.2)),
+        min_per_second=float(os.getenv("LLM_RETRY_BUDGET_MIN_RATE", 1.0)),
+    ),
+)
+
+llm_retry = llm_retry_policy.decorator()
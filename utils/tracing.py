@@ -0,0 +1,404 @@
+# utils/tracing.py
+"""
+Lightweight OpenTelemetry-style tracing for the search pipeline.
+
+Spans carry a trace id, a span id, a parent span id, attributes and a status,
+and are serialized in the OTLP/JSON span shape. The current span is tracked in a
+contextvar, so nested `start_span` blocks build a tree without passing spans around.
+
+Finished traces are handed to an exporter selected with environment variables:
+    TRACING_EXPORTER=file   -> append spans as JSON lines to TRACING_FILE (default traces/spans.jsonl)
+    TRACING_EXPORTER=otlp   -> POST OTLP/JSON to OTLP_ENDPOINT/v1/traces (default http://localhost:4318)
+                               from a background thread; at most OTLP_QUEUE_SIZE traces (default 1000)
+                               wait for it, further traces are dropped
+    unset                   -> tracing disabled, spans are no-ops
+
+Waterfalls of an exported file can be printed offline with:
+    python -m utils.tracing traces/spans.jsonl
+"""
+import os
+import sys
+import json
+import time
+import queue
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional, Callable
+
+import requests
+
+from rich.console import Console
+console = Console()
+
+from utils.metrics import counter
+
+
+SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "retail-search-with-ai")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+TRACES_DROPPED = counter(
+    "tracing_traces_dropped_total",
+    "Finished traces not exported because the export queue was full.",
+    ("exporter",)
+)
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value: Dict[str, Any]):
+    if "boolValue" in value:
+        return value["boolValue"]
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "doubleValue" in value:
+        return value["doubleValue"]
+    if "arrayValue" in value:
+        return [_from_otlp_value(v) for v in value["arrayValue"].get("values", [])]
+    return value.get("stringValue")
+
+
+class Span:
+    """
+    A single timed operation within a trace.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent is not None else ""
+        self.is_local_root = parent is None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status_code = "STATUS_CODE_UNSET"
+        self.status_message = ""
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self._child_counts: Dict[str, int] = {}
+
+    @property
+    def is_recording(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": dict(attributes or {})})
+
+    def record_exception(self, exc: BaseException):
+        self.status_code = "STATUS_CODE_ERROR"
+        self.status_message = f"{exc.__class__.__name__}: {exc}"
+        self.add_event("exception", {"exception.type": exc.__class__.__name__, "exception.message": str(exc)})
+
+    def next_child_index(self, name: str) -> int:
+        """
+        Counts children of this span with the given name, e.g. retry attempts of one LLM call.
+        """
+        self._child_counts[name] = self._child_counts.get(name, 0) + 1
+        return self._child_counts[name]
+
+    def end(self):
+        if self.end_time_ns is None:
+            self.end_time_ns = time.time_ns()
+            if self.status_code == "STATUS_CODE_UNSET":
+                self.status_code = "STATUS_CODE_OK"
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_time_ns or time.time_ns()
+        return (end - self.start_time_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "events": [
+                {"name": e["name"], "timeUnixNano": str(e["timeUnixNano"]),
+                 "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in e["attributes"].items()]}
+                for e in self.events
+            ],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    """
+    Stand-in returned while tracing is disabled, so call sites never need to check.
+    """
+    name = ""
+    trace_id = ""
+    span_id = ""
+    is_recording = False
+
+    def set_attribute(self, key, value): pass
+    def set_attributes(self, attributes): pass
+    def add_event(self, name, attributes=None): pass
+    def record_exception(self, exc): pass
+    def next_child_index(self, name): return 0
+    def end(self): pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _resource() -> Dict[str, Any]:
+    return {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]}
+
+
+class JsonFileSpanExporter:
+    """
+    Appends finished spans as one OTLP/JSON span per line to a local file.
+    """
+
+    def __init__(self, path: str = "traces/spans.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        lines = [json.dumps({"resource": _resource(), "span": s.to_otlp()}) for s in spans]
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """
+    Posts finished spans as OTLP/JSON to a collector (or any stand-in that accepts `/v1/traces`).
+    `export` only queues the spans; a background thread posts them, so a slow or unreachable
+    collector never delays the request path. When the queue is full the trace is dropped.
+    Export failures are logged and never propagate into the request path.
+    """
+
+    def __init__(self, endpoint: str = "http://localhost:4318", timeout: float = 2.0, queue_size: int = 1000):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=queue_size)
+        self._session = requests.Session()
+        self._worker = threading.Thread(target=self._run, name="otlp-export", daemon=True)
+        self._worker.start()
+
+    def export(self, spans: List[Span]):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            TRACES_DROPPED.inc(exporter="otlp")
+
+    def flush(self):
+        """
+        Blocks until every queued trace has been posted (or has failed).
+        """
+        self._queue.join()
+
+    def _post(self, spans: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": _resource(),
+                "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": [s.to_otlp() for s in spans]}]
+            }]
+        }
+        try:
+            self._session.post(self.url, json=payload, timeout=self.timeout)
+        except Exception as e:
+            console.log(f"Trace export to {self.url} failed: {e}")
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self._post(spans)
+            finally:
+                self._queue.task_done()
+
+
+class Tracer:
+    """
+    Creates spans and hands each trace to the exporter once its local root span ends.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self._pending: Dict[str, List[Span]] = {}
+        self._open_traces = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _on_end(self, span: Span):
+        with self._lock:
+            if span.is_local_root:
+                self._open_traces.discard(span.trace_id)
+                finished = self._pending.pop(span.trace_id, []) + [span]
+            elif span.trace_id in self._open_traces:
+                self._pending.setdefault(span.trace_id, []).append(span)
+                return
+            else:
+                # The root already ended (e.g. a background thread outlived the request)
+                finished = [span]
+        try:
+            self.exporter.export(finished)
+        except Exception as e:
+            console.log(f"Trace export failed: {e}")
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        if parent is None or not parent.is_recording:
+            span = Span(name, trace_id=secrets.token_hex(16), attributes=attributes)
+            with self._lock:
+                self._open_traces.add(span.trace_id)
+        else:
+            span = Span(name, trace_id=parent.trace_id, parent=parent, attributes=attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self._on_end(span)
+
+
+def _exporter_from_env():
+    exporter = os.getenv("TRACING_EXPORTER", "").strip().lower()
+    if exporter == "file":
+        return JsonFileSpanExporter(os.getenv("TRACING_FILE", "traces/spans.jsonl"))
+    if exporter == "otlp":
+        return OtlpHttpSpanExporter(os.getenv("OTLP_ENDPOINT", "http://localhost:4318"),
+                                    queue_size=int(os.getenv("OTLP_QUEUE_SIZE", 1000)))
+    return None
+
+
+tracer = Tracer(_exporter_from_env())
+
+
+def configure_tracing(exporter):
+    """
+    Replaces the exporter of the process-wide tracer; pass None to disable tracing.
+    """
+    tracer.exporter = exporter
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    return tracer.start_span(name, attributes)
+
+
+def current_span():
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def traced(name: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+    """
+    Decorator that runs every call of the function inside its own span.
+    """
+    def decorator(func: Callable):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name, attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line)["span"])
+    return spans
+
+
+def format_waterfall(spans: List[Dict[str, Any]], width: int = 40) -> str:
+    """
+    Renders the spans of one trace as an indented text waterfall.
+    """
+    if not spans:
+        return ""
+    by_parent: Dict[str, List[Dict[str, Any]]] = {}
+    ids = {s["spanId"] for s in spans}
+    for s in spans:
+        parent = s["parentSpanId"] if s["parentSpanId"] in ids else ""
+        by_parent.setdefault(parent, []).append(s)
+    for children in by_parent.values():
+        children.sort(key=lambda s: int(s["startTimeUnixNano"]))
+
+    t0 = min(int(s["startTimeUnixNano"]) for s in spans)
+    t1 = max(int(s["endTimeUnixNano"]) for s in spans)
+    total = max(t1 - t0, 1)
+
+    lines = [f"trace {spans[0]['traceId']}  total {(t1 - t0) / 1e6:.1f} ms"]
+
+    def walk(parent_id: str, depth: int):
+        for s in by_parent.get(parent_id, []):
+            start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+            offset = int((start - t0) / total * width)
+            length = max(1, int((end - start) / total * width))
+            bar = " " * offset + "#" * min(length, width - offset)
+            error = " !" if s["status"]["code"] == "STATUS_CODE_ERROR" else ""
+            attrs = {a["key"]: _from_otlp_value(a["value"]) for a in s["attributes"]}
+            attr_str = " ".join(f"{k}={v}" for k, v in attrs.items())
+            label = ("  " * depth + s["name"])[:40]
+            lines.append(f"{label:<40} |{bar:<{width}}| {(end - start) / 1e6:9.1f} ms{error}  {attr_str}")
+            walk(s["spanId"], depth + 1)
+
+    walk("", 0)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.tracing <spans.jsonl> [trace_id]")
+        sys.exit(1)
+
+    all_spans = load_spans(sys.argv[1])
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    for s in all_spans:
+        traces.setdefault(s["traceId"], []).append(s)
+
+    selected = [sys.argv[2]] if len(sys.argv) > 2 else list(traces)
+    for trace_id in selected:
+        print(format_waterfall(traces.get(trace_id, [])))
+        print()